@@ -0,0 +1,153 @@
+import logging
+import math
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+from metrics import ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1024 * 1024
+
+
+class InflightRegistry:
+    """
+    Host-wide list of requests being processed, one locked ticket file per
+    request. A worker killed mid-request (e.g. by gunicorn's timeout) no
+    longer holds its lock, so its ticket is recognized and removed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def register(self, nbytes):
+        name = f"{nbytes}-{os.getpid()}-{threading.get_ident()}-{time.time_ns()}"
+        # Locked before it becomes visible so it never looks abandoned
+        handle = open(os.path.join(self.directory, f".{name}"), 'w')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        os.rename(handle.name, os.path.join(self.directory, name))
+        return name, handle
+
+    def release(self, ticket):
+        name, handle = ticket
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+        handle.close()
+
+    def totals(self, verify=False):
+        """(requests, bytes) in flight; verify=True first drops abandoned tickets"""
+        count = total_bytes = 0
+        for name in os.listdir(self.directory):
+            if name.startswith('.'):
+                continue
+            if verify and self._is_abandoned(name):
+                continue
+            count += 1
+            total_bytes += int(name.split('-', 1)[0])
+        return count, total_bytes
+
+    def _is_abandoned(self, name):
+        if fcntl is None:
+            return False
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path) as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                os.remove(path)
+                logger.warning("Removed in-flight ticket of a dead request: %s", name)
+                return True
+        except FileNotFoundError:
+            return True
+
+
+class AdmissionController:
+    """
+    Decide from the request headers alone whether an upload can start.
+    Rejected uploads get a 503 before their body is read.
+    """
+
+    def __init__(self, directory, scheduler, max_requests, max_bytes, max_queued, retry_after=5):
+        self.registry = InflightRegistry(directory)
+        self.scheduler = scheduler
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+
+    def admit(self, content_length):
+        """Return (ticket, None) when admitted or (None, reason) when not"""
+        reason = self._over_limit(content_length, verify=False)
+        if reason:
+            # Re-check after dropping tickets left by killed workers
+            reason = self._over_limit(content_length, verify=True)
+        if reason:
+            ADMISSION_REJECTED.labels(reason).inc()
+            return None, reason
+        return self.registry.register(content_length), None
+
+    def release(self, ticket):
+        self.registry.release(ticket)
+
+    def _over_limit(self, content_length, verify):
+        requests, in_flight_bytes = self.registry.totals(verify)
+        if requests >= self.max_requests:
+            return 'requests'
+        if in_flight_bytes + content_length > self.max_bytes and requests:
+            return 'bytes'
+        if sum(self.scheduler.queue_depth().values()) >= self.max_queued:
+            return 'queue'
+        return None
+
+    def retry_after_seconds(self):
+        """Suggested wait, growing with the number of jobs already queued"""
+        queued = sum(self.scheduler.queue_depth().values())
+        slots = sum(lane.slots for lane in self.scheduler.lanes.values())
+        return min(120, self.retry_after * (1 + math.ceil(queued / max(1, slots))))
+
+    def status(self):
+        requests, in_flight_bytes = self.registry.totals()
+        queued = self.scheduler.queue_depth()
+        return {
+            'accepting': (requests < self.max_requests and in_flight_bytes < self.max_bytes
+                          and sum(queued.values()) < self.max_queued),
+            'in_flight_requests': requests,
+            'in_flight_mb': round(in_flight_bytes / MEGABYTE, 2),
+            'queued': queued,
+            'limits': {
+                'max_requests': self.max_requests,
+                'max_mb': round(self.max_bytes / MEGABYTE, 2),
+                'max_queued': self.max_queued,
+                'lane_slots': {name: lane.slots for name, lane in self.scheduler.lanes.items()},
+                'max_heavy_waiting': self.scheduler.lanes['heavy'].max_waiting,
+            },
+        }
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def create_admission(app, scheduler):
+    """Build the admission controller from app config and environment"""
+    return AdmissionController(
+        os.path.join(app.config['TEMP_FOLDER'], '.inflight'),
+        scheduler,
+        max_requests=int(_env_number('MAX_INFLIGHT_UPLOADS', 16)),
+        max_bytes=_env_number('MAX_INFLIGHT_MB', 512) * MEGABYTE,
+        max_queued=int(_env_number('MAX_QUEUED_JOBS', 16)),
+        retry_after=int(_env_number('RETRY_AFTER_SECONDS', 5)),
+    )
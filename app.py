@@ -3,15 +3,10 @@ import logging
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Set up enhanced logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+from logging_config import configure_logging
+
+# Structured logging written by a background thread, off the request path
+configure_logging()
 
 # Create the app
 app = Flask(__name__)
@@ -29,10 +24,23 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 43200  # 12 hours
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+# Bearer token for the /api/admin endpoints, which are disabled while it is unset
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
 
 # Ensure directories exist
 for folder in [app.config['UPLOAD_FOLDER'], app.config['CONVERTED_FOLDER'], app.config['TEMP_FOLDER']]:
     os.makedirs(folder, exist_ok=True)
 
+# LibreOffice profiles left by killed or older workers
+from converter import prune_libreoffice_profiles
+prune_libreoffice_profiles()
+
+# Background cleanup of uploads/converted/temp (one active sweeper per host)
+if os.environ.get('JANITOR_ENABLED', 'true').lower() == 'true':
+    from janitor import start_janitor
+    from storage import storage
+    from blobstore import create_blob_store
+    start_janitor(app, storage, create_blob_store(app))
+
 # Import routes after app creation
 from routes import *
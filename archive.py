@@ -0,0 +1,76 @@
+import io
+import os
+import time
+import zipfile
+
+BLOCK_SIZE = 1024 * 1024
+
+# Formats that are compressed already; deflating them again costs CPU for
+# a few bytes at best
+STORED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.docx', '.xlsx', '.pptx'}
+
+
+class _Buffer(io.RawIOBase):
+    """Write-only sink that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def unique_names(names):
+    """Make archive names unique: report.pdf, report (2).pdf, ..."""
+    seen = set()
+    result = []
+    for name in names:
+        candidate, counter = name, 1
+        stem, extension = os.path.splitext(name)
+        while candidate in seen:
+            counter += 1
+            candidate = f"{stem} ({counter}){extension}"
+        seen.add(candidate)
+        result.append(candidate)
+    return result
+
+
+def stream_zip(entries, block_size=BLOCK_SIZE):
+    """
+    Yield a ZIP archive of (archive name, path) entries as it is written.
+    Nothing is staged on disk and at most about one block is held in
+    memory, whatever the number or size of the files.
+    """
+    sink = _Buffer()
+    # An unseekable sink makes zipfile write sizes after each entry's data
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for arcname, path in entries:
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(arcname, time.localtime(stat.st_mtime)[:6])
+            info.file_size = stat.st_size
+            if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                while True:
+                    block = source.read(block_size)
+                    if not block:
+                        break
+                    target.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            # Entry trailer (data descriptor)
+            yield sink.drain()
+    # Central directory, written when the archive closes
+    yield sink.drain()
@@ -0,0 +1,456 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from scheduler import IMAGE_EXTENSIONS, LIBREOFFICE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.fily-manifest.jsonl'
+MEGABYTE = 1024 * 1024
+# A file whose worker died this many times is recorded as failed instead of retried
+MAX_ATTEMPTS = 2
+
+# Outputs of earlier runs by content key, set in each worker by _init_worker
+_previous_outputs = {}
+
+
+def file_type(extension, kind):
+    """Concurrency class of an input, as the scheduler's cost priors group them"""
+    if kind in LIBREOFFICE_EXTENSIONS:
+        return 'libreoffice'
+    if extension in IMAGE_EXTENSIONS:
+        return 'image'
+    if extension == 'pdf':
+        return 'pdf'
+    return 'text'
+
+
+class Manifest:
+    """
+    Append-only JSON-lines record of finished inputs in the output tree. An
+    input whose path, size and mtime match a converted entry is skipped
+    without being read; one whose content matches gets a copy of the
+    earlier output instead of a conversion.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # input path relative to the source -> latest entry
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # line cut short by an interrupted run
+                    self.entries[entry['path']] = entry
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, relative, stat, options_key, statuses=('converted', 'copied')):
+        entry = self.entries.get(relative)
+        return (entry is not None and entry['status'] in statuses
+                and entry.get('options') == options_key
+                and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns)
+
+    def outputs_by_content(self, output_root):
+        """{content key: absolute output path} of every converted entry"""
+        return {f"{entry['sha256']}:{entry['options']}": os.path.join(output_root, entry['output'])
+                for entry in self.entries.values() if entry['status'] in ('converted', 'copied')}
+
+    def record(self, entry):
+        # One line per file, flushed at once, so an interrupted run loses at most the files in flight
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.entries[entry['path']] = entry
+
+    def compact(self, keep):
+        """Rewrite the manifest with the latest entry of each path for which keep(entry) is true"""
+        self._file.close()
+        self.entries = {path: entry for path, entry in self.entries.items() if keep(entry)}
+        partial = f"{self.path}.part"
+        with open(partial, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(partial, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    """Counters of a run, printed as one live line"""
+
+    def __init__(self, total, total_bytes, stream=sys.stderr, interval=1.0):
+        self.total = total
+        self.total_bytes = total_bytes
+        self.stream = stream
+        self.live = stream.isatty()
+        # Without a terminal a line every ten seconds is enough for a log
+        self.interval = interval if self.live else 10.0
+        self.start = time.perf_counter()
+        self.counts = Counter()
+        self.done_bytes = 0
+        self._printed_at = 0.0
+
+    def add(self, status, size):
+        self.counts[status] += 1
+        self.done_bytes += size
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        done = sum(self.counts.values())
+        rate = done / elapsed
+        eta = (self.total - done) / rate if rate else 0
+        return (f"{done}/{self.total} files  {self.counts['failed']} failed  "
+                f"{self.counts['copied']} copied  {rate:.1f} files/s  "
+                f"{self.done_bytes / MEGABYTE / elapsed:.1f} MB/s  ETA {_duration(eta)}")
+
+    def show(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._printed_at < self.interval:
+            return
+        self._printed_at = now
+        if self.live:
+            self.stream.write('\r\033[K' + self.line())
+        else:
+            self.stream.write(self.line() + '\n')
+        self.stream.flush()
+
+    def finish(self):
+        self.show(force=True)
+        if self.live:
+            self.stream.write('\n')
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def find_inputs(source, output_root):
+    """
+    (absolute path, relative path, output relative path) of every
+    convertible file under source, skipping hidden entries and the output
+    tree. Outputs keep the input's place in the tree; two inputs of one
+    directory that share a stem keep their extension in the output name.
+    """
+    from converter import ALLOWED_EXTENSIONS
+
+    output_root = os.path.abspath(output_root)
+    for directory, subdirectories, filenames in os.walk(source):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith('.')
+                                   and os.path.abspath(os.path.join(directory, name)) != output_root)
+        names = sorted(name for name in filenames if not name.startswith('.')
+                       and os.path.splitext(name)[1].lower().lstrip('.') in ALLOWED_EXTENSIONS)
+        stems = Counter(os.path.splitext(name)[0] for name in names)
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, source)
+            stem = os.path.splitext(relative)[0]
+            yield path, relative, stem if stems[os.path.splitext(name)[0]] == 1 else relative
+
+
+def _init_worker(previous_outputs, log_level):
+    global _previous_outputs
+    _previous_outputs = previous_outputs
+    logging.getLogger().setLevel(log_level)
+    # Import the converters once per worker, not per file
+    import converter  # noqa: F401
+
+
+def convert_file(job):
+    """
+    Worker body: hash the input, reuse an earlier output of the same
+    content or convert it into a temporary name that is renamed into place
+    on success. Returns the manifest entry.
+    """
+    from converter import convert_image_format, convert_to_pdf
+
+    source, output, options = job['source'], job['output'], job['options']
+    entry = {key: job[key] for key in ('path', 'size', 'mtime_ns', 'type', 'options')}
+    entry['output'] = os.path.relpath(output, job['output_root'])
+    start = time.perf_counter()
+    with open(source, 'rb') as f:
+        entry['sha256'] = hashlib.file_digest(f, 'sha256').hexdigest()
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    previous = _previous_outputs.get(f"{entry['sha256']}:{options}")
+    if previous and previous != output and os.path.exists(previous):
+        shutil.copyfile(previous, output)
+        entry.update(status='copied', seconds=round(time.perf_counter() - start, 4))
+        return entry
+
+    stem, suffix = os.path.splitext(output)
+    partial = os.path.join(os.path.dirname(output), f".{os.getpid()}-{os.path.basename(stem)}.part{suffix}")
+    stats = {}
+    try:
+        if job['image_format']:
+            success, partial = convert_image_format(source, partial, job['image_format'],
+                                                    quality=job['image_quality'])
+        else:
+            success = convert_to_pdf(source, partial, os.path.basename(source), quality=job['quality'],
+                                     stats=stats)
+        if success and partial and os.path.exists(partial):
+            os.replace(partial, output)
+            entry.update(status='converted', output_size=os.path.getsize(output))
+        else:
+            entry.update(status='failed', error=stats.get('failure', 'error'))
+    except Exception as e:
+        entry.update(status='failed', error=str(e))
+    finally:
+        if partial and os.path.exists(partial):
+            os.remove(partial)
+    entry['seconds'] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+def parse_limits(values, jobs):
+    """{type or extension: slots} from NAME=N options; LibreOffice defaults to half the workers"""
+    limits = {'libreoffice': max(1, jobs // 2)}
+    for value in values or []:
+        for item in value.split(','):
+            name, _, count = item.partition('=')
+            if not count.strip().isdigit() or int(count) < 1:
+                raise ValueError(f"Bad limit '{item}', expected NAME=N with N >= 1")
+            limits[name.strip().lower()] = int(count)
+    return limits
+
+
+def make_job(path, relative, output_path, output_root, stat, limits, quality='high', image_format=None,
+             image_quality=95):
+    """(limit key, job) for convert_file; image_format applies to images only"""
+    from converter import conversion_kind
+
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    converts_image = bool(image_format) and extension in IMAGE_EXTENSIONS
+    job_type = file_type(extension, conversion_kind(path))
+    return extension if extension in limits else job_type, {
+        'source': path, 'path': relative, 'output': output_path, 'output_root': output_root,
+        'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'type': job_type,
+        'options': f"{quality}:{image_format}" if image_format else quality, 'quality': quality,
+        'image_format': image_format if converts_image else None, 'image_quality': image_quality, 'attempts': 0,
+    }
+
+
+def output_suffix(path, image_format=None):
+    if image_format and os.path.splitext(path)[1].lower().lstrip('.') in IMAGE_EXTENSIONS:
+        return '.jpg' if image_format.lower() == 'jpeg' else f".{image_format.lower()}"
+    return '.pdf'
+
+
+class Dispatcher:
+    """
+    Runs convert_file jobs on a pool of `jobs` processes, at most
+    limits[key] of one limit key at a time; jobs over their limit wait in
+    the parent instead of occupying a worker. If a worker dies, the pool is
+    replaced and the jobs in flight are tried again.
+    """
+
+    def __init__(self, jobs, limits, previous_outputs=None):
+        self.jobs = jobs
+        self.limits = limits
+        self.previous_outputs = previous_outputs or {}
+        self.queues = defaultdict(deque)  # limit key -> jobs waiting
+        self.running = {}  # future -> (limit key, job, executor it was submitted to)
+        self.active = Counter()
+        self.executor = self._pool()
+
+    def _pool(self):
+        return ProcessPoolExecutor(self.jobs, initializer=_init_worker,
+                                   initargs=(self.previous_outputs, logging.WARNING))
+
+    def add(self, key, job):
+        self.queues[key].append(job)
+
+    def busy(self):
+        return bool(self.running) or any(self.queues.values())
+
+    def drop_waiting(self):
+        """Forget the jobs not started yet, so a shutdown only waits for the running ones"""
+        self.queues.clear()
+
+    def collect(self, timeout):
+        """Start what the limits allow, wait up to timeout; returns [(job, entry)] of finished jobs"""
+        # Fill free workers, taking the waiting types in turn
+        submitted = True
+        while submitted and len(self.running) < self.jobs:
+            submitted = False
+            for key, queue in self.queues.items():
+                if queue and self.active[key] < self.limits.get(key, self.jobs) and len(self.running) < self.jobs:
+                    job = queue.popleft()
+                    self.running[self.executor.submit(convert_file, job)] = (key, job, self.executor)
+                    self.active[key] += 1
+                    submitted = True
+
+        if not self.running:
+            return []
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        finished, broken = [], False
+        for future in done:
+            key, job, executor = self.running.pop(future)
+            self.active[key] -= 1
+            try:
+                entry = future.result()
+            except CancelledError:
+                # Still queued in a pool that was replaced; it never ran
+                self.queues[key].appendleft(job)
+                continue
+            except BrokenProcessPool:
+                # Futures of an already replaced pool fail late; they must not replace the new one
+                broken = broken or executor is self.executor
+                # Which job killed its worker is unknown, so each one in flight gets another try
+                job['attempts'] += 1
+                if job['attempts'] < MAX_ATTEMPTS:
+                    self.queues[key].appendleft(job)
+                    continue
+                entry = _failed_entry(job, 'worker process died')
+            except Exception as e:
+                entry = _failed_entry(job, str(e))
+            finished.append((job, entry))
+        if broken:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._pool()
+        return finished
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _failed_entry(job, error):
+    entry = {key: job[key] for key in ('path', 'size', 'mtime_ns', 'type', 'options')}
+    entry.update(status='failed', error=error)
+    return entry
+
+
+def run(source, output_root, jobs, limits, quality='high', image_format=None, image_quality=95,
+        manifest_path=None, progress_stream=sys.stderr):
+    """
+    Convert every supported file under source into output_root on a pool
+    of `jobs` processes, at most limits[type] of one type at a time (an
+    extension may have its own limit). Returns the manifest entries of this
+    run.
+    """
+    options = f"{quality}:{image_format}" if image_format else quality
+    os.makedirs(output_root, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(output_root, MANIFEST_NAME))
+    queued = []
+    skipped = 0
+    for path, relative, output_stem in find_inputs(source, output_root):
+        stat = os.stat(path)
+        if manifest.is_done(relative, stat, options):
+            skipped += 1
+            continue
+        output_path = os.path.join(output_root, output_stem + output_suffix(path, image_format))
+        queued.append(make_job(path, relative, output_path, output_root, stat, limits, quality, image_format,
+                               image_quality))
+    if skipped:
+        progress_stream.write(f"{skipped} file(s) already converted by an earlier run\n")
+    if not queued:
+        manifest.close()
+        return []
+
+    progress = Progress(len(queued), sum(job['size'] for _, job in queued), progress_stream)
+    dispatcher = Dispatcher(jobs, limits, manifest.outputs_by_content(output_root))
+    for key, job in queued:
+        dispatcher.add(key, job)
+    results = []
+    try:
+        while dispatcher.busy():
+            for job, entry in dispatcher.collect(progress.interval):
+                manifest.record(entry)
+                results.append(entry)
+                progress.add(entry['status'], job['size'])
+            progress.show()
+    finally:
+        dispatcher.close()
+        manifest.close()
+        progress.finish()
+    return results
+
+
+def summarize(results, elapsed, stream=sys.stdout, slowest=5):
+    """Print totals, per-type timings and the slowest and failed files"""
+    counts = Counter(entry['status'] for entry in results)
+    total_bytes = sum(entry['size'] for entry in results)
+    stream.write(f"\n{len(results)} file(s) in {_duration(elapsed)} ({elapsed:.1f}s): "
+                 f"{counts['converted']} converted, {counts['copied']} copied from earlier outputs, "
+                 f"{counts['failed']} failed\n")
+    if elapsed > 0 and results:
+        stream.write(f"throughput {len(results) / elapsed:.1f} files/s, {total_bytes / MEGABYTE / elapsed:.1f} MB/s\n")
+
+    by_type = defaultdict(list)
+    for entry in results:
+        if 'seconds' in entry:
+            by_type[entry['type']].append(entry['seconds'])
+    if by_type:
+        stream.write(f"\n{'type':12} {'files':>7} {'total s':>9} {'mean s':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8}\n")
+        for name, seconds in sorted(by_type.items()):
+            ordered = sorted(seconds)
+            stream.write(f"{name:12} {len(seconds):7d} {sum(seconds):9.1f} {statistics.fmean(seconds):8.3f} "
+                         f"{ordered[len(ordered) // 2]:8.3f} {ordered[int(len(ordered) * 0.95)]:8.3f} "
+                         f"{ordered[-1]:8.3f}\n")
+
+    timed = sorted((entry for entry in results if 'seconds' in entry), key=lambda entry: -entry['seconds'])
+    if timed[:slowest]:
+        stream.write("\nslowest:\n")
+        for entry in timed[:slowest]:
+            stream.write(f"  {entry['seconds']:8.2f}s  {entry['path']}\n")
+    failed = [entry for entry in results if entry['status'] == 'failed']
+    if failed:
+        stream.write(f"\nfailed ({len(failed)}):\n")
+        for entry in failed[:20]:
+            stream.write(f"  {entry['path']}: {entry.get('error')}\n")
+        if len(failed) > 20:
+            stream.write(f"  ... see the manifest for the other {len(failed) - 20}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert a directory tree with the converters of the web app, in parallel and resumably')
+    parser.add_argument('source', help='directory to convert')
+    parser.add_argument('output', help='directory for the outputs, mirroring the source tree')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--limit', action='append', metavar='TYPE=N',
+                        help='most files of a type converted at once; types are libreoffice, image, pdf, text '
+                             'or an extension (repeatable, default libreoffice=jobs/2)')
+    parser.add_argument('--quality', default='high', choices=['high', 'medium', 'low'])
+    parser.add_argument('--image-format', help='convert images to this format (jpg, png, webp, ...) instead of PDF')
+    parser.add_argument('--image-quality', type=int, default=95)
+    parser.add_argument('--manifest', help=f'resume manifest (default OUTPUT/{MANIFEST_NAME})')
+    parser.add_argument('--verbose', action='store_true', help='log converter warnings')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR,
+                        format='%(levelname)s %(name)s: %(message)s')
+    if not os.path.isdir(args.source):
+        parser.error(f"{args.source} is not a directory")
+    try:
+        limits = parse_limits(args.limit, args.jobs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    try:
+        results = run(args.source, args.output, max(1, args.jobs), limits, quality=args.quality,
+                      image_format=args.image_format, image_quality=args.image_quality,
+                      manifest_path=args.manifest)
+    except KeyboardInterrupt:
+        sys.stderr.write("\nInterrupted; run the same command again to resume\n")
+        return 130
+    summarize(results, time.perf_counter() - start)
+    return 1 if any(entry['status'] == 'failed' for entry in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
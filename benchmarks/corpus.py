@@ -0,0 +1,178 @@
+import csv
+import json
+import os
+import random
+
+# Scale factor per size name; each generator multiplies its base unit by it
+SIZES = {'small': 1, 'medium': 10, 'large': 50}
+
+WORDS = (
+    "invoice statement account balance payment period customer service "
+    "quarter report revenue total amount due reference summary schedule "
+    "contract delivery order review approved pending closed open notes"
+).split()
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _paragraphs(rng, count):
+    return [' '.join(_sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+def make_text(path, scale, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(_paragraphs(rng, 40 * scale)))
+
+
+def make_markdown(path, scale, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        for section in range(8 * scale):
+            f.write(f"## Section {section}\n\n")
+            for para in _paragraphs(rng, 5):
+                f.write(f"{para} **{rng.choice(WORDS)}** and `{rng.choice(WORDS)}`\n\n")
+
+
+def make_html(path, scale, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<html><body>\n")
+        for para in _paragraphs(rng, 40 * scale):
+            f.write(f"<p>{para}</p>\n\n")
+        f.write("</body></html>\n")
+
+
+def make_csv(path, scale, rng):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'customer', 'status', 'amount', 'reference'])
+        for row in range(100 * scale):
+            writer.writerow([row, rng.choice(WORDS), rng.choice(WORDS),
+                             round(rng.uniform(1, 10000), 2), rng.randint(10000, 99999)])
+
+
+def make_json(path, scale, rng):
+    records = [{'id': i, 'customer': rng.choice(WORDS), 'amount': round(rng.uniform(1, 10000), 2),
+                'tags': [rng.choice(WORDS) for _ in range(3)]} for i in range(60 * scale)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'records': records}, f)
+
+
+def make_xml(path, scale, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0'?>\n<records>\n")
+        for i in range(80 * scale):
+            f.write(f"  <record id='{i}'><customer>{rng.choice(WORDS)}</customer>"
+                    f"<amount>{rng.uniform(1, 10000):.2f}</amount></record>\n")
+        f.write("</records>\n")
+
+
+def make_code(path, scale, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(30 * scale):
+            f.write(f"def {rng.choice(WORDS)}_{i}(value):\n")
+            f.write(f"    \"\"\"{_sentence(rng, 6)}\"\"\"\n")
+            f.write(f"    return value * {rng.randint(1, 100)}\n\n")
+
+
+def make_docx(path, scale, rng):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading('Benchmark document', 0)
+    for para in _paragraphs(rng, 30 * scale):
+        doc.add_paragraph(para)
+    table = doc.add_table(rows=10, cols=4)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = rng.choice(WORDS)
+    doc.save(path)
+
+
+def make_xlsx(path, scale, rng):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['id', 'customer', 'status', 'amount'])
+    for row in range(100 * scale):
+        ws.append([row, rng.choice(WORDS), rng.choice(WORDS), round(rng.uniform(1, 10000), 2)])
+    wb.save(path)
+
+
+def make_pptx(path, scale, rng):
+    from pptx import Presentation
+
+    prs = Presentation()
+    for _ in range(5 * scale):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = _sentence(rng, 4)
+        slide.placeholders[1].text = _sentence(rng)
+    prs.save(path)
+
+
+def _photo(scale, rng):
+    """Smooth photo-like image: random colour tiles upscaled with bicubic"""
+    from PIL import Image
+
+    side = int(400 * scale ** 0.5)
+    tile = max(2, side // 16)
+    img = Image.frombytes('RGB', (tile, tile), rng.randbytes(tile * tile * 3))
+    return img.resize((side, side), Image.BICUBIC)
+
+
+def make_png(path, scale, rng):
+    _photo(scale, rng).save(path, 'PNG')
+
+
+def make_jpg(path, scale, rng):
+    _photo(scale, rng).save(path, 'JPEG', quality=90)
+
+
+def make_pdf(path, scale, rng):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path, pagesize=A4)
+    for page in range(5 * scale):
+        text = c.beginText(50, 780)
+        for _ in range(40):
+            text.textLine(_sentence(rng, 10))
+        c.drawText(text)
+        c.showPage()
+    c.save()
+
+
+GENERATORS = {
+    'txt': make_text,
+    'md': make_markdown,
+    'html': make_html,
+    'csv': make_csv,
+    'json': make_json,
+    'xml': make_xml,
+    'py': make_code,
+    'docx': make_docx,
+    'xlsx': make_xlsx,
+    'pptx': make_pptx,
+    'png': make_png,
+    'jpg': make_jpg,
+    'pdf': make_pdf,
+}
+
+
+def build_corpus(directory, sizes=None, seed=1234):
+    """
+    Generate one file per (extension, size) into directory and return
+    {(extension, size): path}. Files that already exist are reused, so the
+    corpus is only built once per directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = {}
+    for size in sizes or SIZES:
+        for extension, generator in GENERATORS.items():
+            path = os.path.join(directory, f"{size}.{extension}")
+            if not os.path.exists(path):
+                # Seed per file so adding a format does not change the others
+                generator(path, SIZES[size], random.Random(f"{seed}-{size}-{extension}"))
+            corpus[(extension, size)] = path
+    return corpus
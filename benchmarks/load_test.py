@@ -0,0 +1,361 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import SIZES, build_corpus  # noqa: E402
+from benchmarks.run import _percentile  # noqa: E402
+
+# weight per request kind; uploads are 'upload:<extension>:<size>'
+DEFAULT_MIX = {
+    'upload:txt:small': 4,
+    'upload:csv:small': 2,
+    'upload:docx:small': 2,
+    'upload:png:medium': 2,
+    'upload:pdf:medium': 1,
+    'download': 4,
+    'stats': 2,
+}
+
+CONTENT_TYPES = {
+    'txt': 'text/plain', 'csv': 'text/csv', 'md': 'text/markdown', 'html': 'text/html',
+    'json': 'application/json', 'xml': 'application/xml', 'pdf': 'application/pdf',
+    'png': 'image/png', 'jpg': 'image/jpeg',
+}
+
+
+def parse_mix(text):
+    """Parse 'kind=weight,kind=weight' into a dict"""
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.strip().partition('=')
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, timeout, workdir, extra_args=(), env=None):
+    """Start gunicorn with main:app in workdir and wait until it accepts requests"""
+    port = _free_port()
+    for folder in ('uploads', 'converted', 'temp', 'data'):
+        os.makedirs(os.path.join(workdir, folder), exist_ok=True)
+    cmd = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--timeout', str(timeout),
+        '--chdir', workdir,
+        '--config', os.path.join(REPO_ROOT, 'gunicorn.conf.py'),
+        '--pythonpath', REPO_ROOT,
+        '--log-level', 'warning',
+        *extra_args,
+        'main:app',
+    ]
+    env = dict(os.environ, SESSION_SECRET='load-test', JANITOR_ENABLED='false',
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'), **(env or {}))
+    log = open(os.path.join(workdir, 'gunicorn.log'), 'w')
+    process = subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited early, see {log.name}")
+        try:
+            urllib.request.urlopen(f'{base_url}/api/supported-formats', timeout=2).read()
+            return process, base_url
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 60s")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _multipart(path, extension, fields):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    with open(path, 'rb') as f:
+        data = f.read()
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files[]"; filename="load.{extension}"\r\n'
+        f'Content-Type: {CONTENT_TYPES.get(extension, "application/octet-stream")}\r\n\r\n'.encode()
+        + data + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class WorkerSampler:
+    """Sample CPU time of the gunicorn workers to estimate how busy they are"""
+
+    def __init__(self, master_pid, interval=0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.samples = []  # (wall time, {pid: cpu seconds})
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf('SC_CLK_TCK')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _workers(self):
+        try:
+            with open(f'/proc/{self.master_pid}/task/{self.master_pid}/children') as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def _cpu_seconds(self, pid):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime + stime (+ waited-for children, e.g. LibreOffice)
+            return sum(int(value) for value in fields[11:15]) / self._ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            usage = {pid: self._cpu_seconds(pid) for pid in self._workers()}
+            self.samples.append((time.monotonic(), {pid: cpu for pid, cpu in usage.items() if cpu is not None}))
+            self._stop.wait(self.interval)
+
+    def utilization(self):
+        """Fraction of wall time each worker spent on CPU over the run"""
+        if len(self.samples) < 2:
+            return {}
+        (start, first), (end, last) = self.samples[0], self.samples[-1]
+        return {
+            str(pid): round((last[pid] - first[pid]) / (end - start), 3)
+            for pid in last if pid in first
+        }
+
+
+class LoadTest:
+    def __init__(self, base_url, corpus, mix, rate, duration, concurrency, request_timeout, seed=42):
+        self.base_url = base_url
+        self.corpus = corpus
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.rate = rate
+        self.duration = duration
+        self.request_timeout = request_timeout
+        self.rng = random.Random(seed)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.lock = threading.Lock()
+        self.records = []  # (kind, latency seconds, status or error)
+        self.file_ids = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.dropped = 0
+        self.concurrency = concurrency
+
+    def run(self):
+        """Open-loop load: requests are issued on schedule whether or not earlier ones finished"""
+        start = time.monotonic()
+        interval = 1.0 / self.rate
+        issued = 0
+        while True:
+            now = time.monotonic()
+            if now - start >= self.duration:
+                break
+            target = start + issued * interval
+            if target > now:
+                time.sleep(target - now)
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            with self.lock:
+                if self.in_flight >= self.concurrency:
+                    # Client-side saturation: count it rather than queueing unboundedly
+                    self.dropped += 1
+                    issued += 1
+                    continue
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.pool.submit(self._request, kind)
+            issued += 1
+        self.pool.shutdown(wait=True)
+        return time.monotonic() - start
+
+    def _request(self, kind):
+        started = time.monotonic()
+        try:
+            status = self._send(kind)
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, socket.timeout, ConnectionError, TimeoutError) as e:
+            status = f'error:{type(getattr(e, "reason", e)).__name__}'
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.records.append((kind, elapsed, status))
+            self.in_flight -= 1
+
+    def _send(self, kind):
+        if kind.startswith('upload:'):
+            _, extension, size = kind.split(':')
+            body, content_type = _multipart(self.corpus[(extension, size)], extension,
+                                            {'conversion_type': 'document-to-pdf', 'quality': 'high'})
+            request = urllib.request.Request(f'{self.base_url}/upload', data=body,
+                                             headers={'Content-Type': content_type})
+            with urllib.request.urlopen(request, timeout=self.request_timeout) as response:
+                payload = json.loads(response.read())
+            results = payload.get('results', [])
+            if not results or not results[0].get('success'):
+                return 'conversion_failed'
+            with self.lock:
+                self.file_ids.append(results[0]['file_id'])
+            return response.status
+
+        if kind == 'download':
+            with self.lock:
+                file_id = self.rng.choice(self.file_ids) if self.file_ids else None
+            if file_id is None:
+                return 'skipped'
+            with urllib.request.urlopen(f'{self.base_url}/download/{file_id}', timeout=self.request_timeout) as r:
+                r.read()
+                return r.status
+
+        with urllib.request.urlopen(f'{self.base_url}/api/stats', timeout=self.request_timeout) as response:
+            response.read()
+            return response.status
+
+    def report(self, elapsed, utilization, workers):
+        by_kind = {}
+        for kind, latency, status in self.records:
+            if status == 'skipped':
+                continue
+            by_kind.setdefault(kind, []).append((latency, status))
+
+        def summarize(entries):
+            latencies = [latency for latency, _ in entries]
+            errors = [status for _, status in entries if not (isinstance(status, int) and status < 400)]
+            # Fast refusals from admission control (see admission.py)
+            rejected = [latency for latency, status in entries if status == 503]
+            return {
+                'requests': len(entries),
+                'throughput_rps': round(len(entries) / elapsed, 2),
+                'error_rate': round(len(errors) / len(entries), 4) if entries else 0,
+                'errors': sorted({str(status) for status in errors}),
+                'p50_ms': round(_percentile(latencies, 50) * 1000, 1),
+                'p95_ms': round(_percentile(latencies, 95) * 1000, 1),
+                'p99_ms': round(_percentile(latencies, 99) * 1000, 1),
+                'max_ms': round(max(latencies) * 1000, 1),
+                'rejected_503': len(rejected),
+                'rejected_p95_ms': round(_percentile(rejected, 95) * 1000, 1) if rejected else None,
+            }
+
+        everything = [entry for entries in by_kind.values() for entry in entries]
+        return {
+            'duration_s': round(elapsed, 2),
+            'target_rps': self.rate,
+            'workers': workers,
+            'overall': summarize(everything) if everything else {},
+            'by_kind': {kind: summarize(entries) for kind, entries in sorted(by_kind.items())},
+            'saturation': {
+                'max_in_flight': self.max_in_flight,
+                'dropped_at_client': self.dropped,
+                'worker_cpu_utilization': utilization,
+                'mean_worker_cpu_utilization': round(sum(utilization.values()) / len(utilization), 3)
+                if utilization else None,
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test /upload, /download and /api/stats under gunicorn')
+    parser.add_argument('--url', help='test an already running server instead of starting gunicorn')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--timeout', type=int, default=120, help='gunicorn worker timeout')
+    parser.add_argument('--gunicorn-args', default='', help='extra arguments passed to gunicorn')
+    parser.add_argument('--rate', type=float, default=5.0, help='requests per second to issue')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to generate load')
+    parser.add_argument('--concurrency', type=int, default=64, help='max requests in flight from the client')
+    parser.add_argument('--request-timeout', type=float, default=150.0)
+    parser.add_argument('--mix', default='', help=f"kind=weight list, sizes: {','.join(SIZES)} "
+                                                 f"(default {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'fily-bench-corpus'))
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    sizes = sorted({kind.split(':')[2] for kind in mix if kind.startswith('upload:')})
+    corpus = build_corpus(args.corpus_dir, sizes)
+
+    process = None
+    workdir = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            workdir = tempfile.mkdtemp(prefix='fily-load-')
+            process, base_url = start_server(args.workers, args.timeout, workdir, args.gunicorn_args.split())
+            print(f"gunicorn ({args.workers} workers) listening on {base_url}, data in {workdir}")
+
+        sampler = WorkerSampler(process.pid) if process else None
+        if sampler:
+            sampler.start()
+        test = LoadTest(base_url, corpus, mix, args.rate, args.duration, args.concurrency, args.request_timeout)
+        elapsed = test.run()
+        if sampler:
+            sampler.stop()
+
+        report = test.report(elapsed, sampler.utilization() if sampler else {}, args.workers)
+    finally:
+        if process:
+            stop_server(process)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    overall = report['overall']
+    print(f"{overall.get('requests', 0)} requests in {report['duration_s']}s "
+          f"({overall.get('throughput_rps', 0)} req/s), error rate {overall.get('error_rate', 0):.2%}")
+    for kind, summary in report['by_kind'].items():
+        print(f"  {kind:24} n={summary['requests']:5}  p50 {summary['p50_ms']:8.1f}ms  "
+              f"p95 {summary['p95_ms']:8.1f}ms  p99 {summary['p99_ms']:8.1f}ms  errors {summary['error_rate']:.1%}")
+    saturation = report['saturation']
+    print(f"  max in flight {saturation['max_in_flight']}, dropped at client {saturation['dropped_at_client']}, "
+          f"mean worker CPU {saturation['mean_worker_cpu_utilization']}")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SIZES, build_corpus  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _single(function_name, **kwargs):
+    """Case that calls converter.<function_name>(input, output)"""
+    def run(inputs, workdir):
+        import converter
+        output = os.path.join(workdir, 'out.pdf')
+        return getattr(converter, function_name)(inputs[0], output, **kwargs)
+    return run
+
+
+def _image_format(inputs, workdir):
+    from converter import convert_image_format
+    success, _ = convert_image_format(inputs[0], os.path.join(workdir, 'out'), 'jpg', quality=85)
+    return success
+
+
+def _multiple_images(inputs, workdir):
+    from converter import convert_multiple_images_to_pdf
+    return convert_multiple_images_to_pdf(inputs, os.path.join(workdir, 'out.pdf'))
+
+
+def _merge(inputs, workdir):
+    from converter import merge_pdfs
+    return merge_pdfs(inputs, os.path.join(workdir, 'out.pdf'))
+
+
+def _optimize(quality):
+    def run(inputs, workdir):
+        from converter import convert_to_pdf
+        return convert_to_pdf(inputs[0], os.path.join(workdir, 'out.pdf'), 'bench.pdf', quality=quality)
+    return run
+
+
+# name -> (input extension, number of inputs, callable, needs LibreOffice)
+CASES = {
+    'convert_text_to_pdf': ('txt', 1, _single('convert_text_to_pdf'), False),
+    'convert_markdown_to_pdf': ('md', 1, _single('convert_markdown_to_pdf'), False),
+    'convert_html_to_pdf': ('html', 1, _single('convert_html_to_pdf'), False),
+    'convert_csv_to_pdf': ('csv', 1, _single('convert_csv_to_pdf'), False),
+    'convert_json_to_pdf': ('json', 1, _single('convert_json_to_pdf'), False),
+    'convert_xml_to_pdf': ('xml', 1, _single('convert_xml_to_pdf'), False),
+    'convert_code_to_pdf': ('py', 1, _single('convert_code_to_pdf'), False),
+    'convert_word_to_pdf': ('docx', 1, _single('convert_word_to_pdf'), True),
+    # convert_word_fallback tries the native renderer first, so its two paths are measured apart
+    'convert_docx_native': ('docx', 1, _single('convert_docx_native'), False),
+    'convert_word_text_only': ('docx', 1, _single('convert_word_text_only'), False),
+    'convert_excel_to_pdf': ('xlsx', 1, _single('convert_excel_to_pdf'), True),
+    'convert_excel_fallback': ('xlsx', 1, _single('convert_excel_fallback'), False),
+    'convert_powerpoint_to_pdf': ('pptx', 1, _single('convert_powerpoint_to_pdf'), True),
+    'convert_image_to_pdf': ('png', 1, _single('convert_image_to_pdf'), False),
+    'convert_image_format': ('png', 1, _image_format, False),
+    'convert_multiple_images_to_pdf': ('jpg', 5, _multiple_images, False),
+    'merge_pdfs': ('pdf', 5, _merge, False),
+    'optimize_pdf_low': ('pdf', 1, _optimize('low'), False),
+}
+
+
+def _current_rss_kb():
+    """Resident set size of this process in KB (Linux), or None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _measure(case_name, inputs, iterations, queue):
+    """Child process body: warm up once, then time each iteration"""
+    _, _, run, _ = CASES[case_name]
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir:
+        ok = bool(run(inputs, workdir))
+        # Measured after the warm-up so lazy imports are not counted as growth
+        rss_start = _current_rss_kb()
+        for _ in range(iterations):
+            shutil.rmtree(workdir)
+            os.makedirs(workdir)
+            start = time.perf_counter()
+            ok = bool(run(inputs, workdir)) and ok
+            timings.append(time.perf_counter() - start)
+    # ru_maxrss is in KB on Linux
+    queue.put({
+        'ok': ok,
+        'timings': timings,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'rss_start_kb': rss_start,
+    })
+
+
+def run_case(case_name, inputs, iterations):
+    """Run one case in a fresh process so peak RSS is attributable to it"""
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(case_name, inputs, iterations, queue))
+    process.start()
+    raw = queue.get()
+    process.join()
+
+    timings = raw['timings']
+    input_bytes = sum(os.path.getsize(path) for path in inputs)
+    p50 = _percentile(timings, 50)
+    growth = (raw['peak_rss_kb'] - raw['rss_start_kb']) if raw['rss_start_kb'] is not None else None
+    return {
+        'ok': raw['ok'],
+        'iterations': len(timings),
+        'input_bytes': input_bytes,
+        'mean_s': statistics.fmean(timings),
+        'p50_s': p50,
+        'p90_s': _percentile(timings, 90),
+        'p95_s': _percentile(timings, 95),
+        'p99_s': _percentile(timings, 99),
+        'max_s': max(timings),
+        'files_per_s': len(inputs) / p50 if p50 else None,
+        'mb_per_s': input_bytes / 1024 / 1024 / p50 if p50 else None,
+        'peak_rss_mb': raw['peak_rss_kb'] / 1024,
+        'rss_growth_mb': growth / 1024 if growth is not None else None,
+    }
+
+
+def compare(results, baseline, latency_threshold, memory_threshold):
+    """Return a list of human readable regressions against baseline"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if previous['p50_s'] and current['p50_s'] > previous['p50_s'] * (1 + latency_threshold):
+            regressions.append(
+                f"{key}: p50 {previous['p50_s'] * 1000:.1f}ms -> {current['p50_s'] * 1000:.1f}ms")
+        old_mem, new_mem = previous.get('rss_growth_mb'), current.get('rss_growth_mb')
+        # Ignore allocator noise on cases that barely allocate
+        if old_mem is not None and new_mem is not None and new_mem - old_mem > 5 \
+                and new_mem > old_mem * (1 + memory_threshold):
+            regressions.append(f"{key}: RSS growth {old_mem:.1f}MB -> {new_mem:.1f}MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the converter functions on a synthetic corpus')
+    parser.add_argument('--sizes', default='small,medium', help=f"comma separated subset of {','.join(SIZES)}")
+    parser.add_argument('--cases', default='.*', help='regex selecting case names')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'fily-bench-corpus'))
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--latency-threshold', type=float, default=0.20, help='allowed p50 slowdown (0.2 = 20%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='allowed RSS growth increase')
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    has_libreoffice = shutil.which('libreoffice') is not None
+    corpus = build_corpus(args.corpus_dir, sizes)
+    pattern = re.compile(args.cases)
+
+    results = {}
+    for case_name, (extension, count, _, needs_libreoffice) in CASES.items():
+        if not pattern.search(case_name):
+            continue
+        if needs_libreoffice and not has_libreoffice:
+            print(f"skip  {case_name:32} (LibreOffice not installed)")
+            continue
+        for size in sizes:
+            inputs = [corpus[(extension, size)]] * count
+            key = f"{case_name}/{size}"
+            result = run_case(case_name, inputs, args.iterations)
+            results[key] = result
+            status = 'ok  ' if result['ok'] else 'FAIL'
+            print(f"{status}  {key:40} p50 {result['p50_s'] * 1000:9.1f}ms  "
+                  f"p95 {result['p95_s'] * 1000:9.1f}ms  peak RSS {result['peak_rss_mb']:7.1f}MB")
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'libreoffice': has_libreoffice,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f).get('results', {})
+    regressions = compare(results, baseline, args.latency_threshold, args.memory_threshold)
+    failures = [key for key, result in results.items() if not result['ok']]
+    for line in regressions:
+        print(f"REGRESSION  {line}")
+    for key in failures:
+        print(f"FAILED      {key}")
+    if not regressions and not failures:
+        print("No regressions against baseline")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import build_corpus  # noqa: E402
+from benchmarks.load_test import _multipart, start_server, stop_server  # noqa: E402
+
+# Server configurations compared; see gunicorn.conf.py
+MODES = {
+    'cold': {'GUNICORN_PRELOAD': 'false', 'WARMUP_ENABLED': 'false'},
+    'warm-per-worker': {'GUNICORN_PRELOAD': 'false', 'WARMUP_ENABLED': 'true'},
+    'preload': {'GUNICORN_PRELOAD': 'true', 'WARMUP_ENABLED': 'true'},
+}
+
+DEFAULT_KINDS = 'txt,csv,md,docx,xlsx,png,pdf'
+
+
+def _worker_pids(master_pid):
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_kb(pid):
+    """(Pss, private) in KB from smaps_rollup; Pss splits shared pages fairly"""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if rest.strip().endswith('kB'):
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        return 0, 0
+    return values.get('Pss', 0), values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+
+
+def _upload(base_url, path, extension):
+    body, content_type = _multipart(path, extension, {})
+    request = urllib.request.Request(f'{base_url}/upload', data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    urllib.request.urlopen(request, timeout=120).read()
+    return time.perf_counter() - start
+
+
+def measure_mode(name, env, workers, kinds, corpus, repeats):
+    with tempfile.TemporaryDirectory(prefix='fily-startup-') as workdir:
+        start = time.perf_counter()
+        process, base_url = start_server(workers, 120, workdir, env=env)
+        ready_s = time.perf_counter() - start
+        try:
+            latencies = {}
+            for extension in kinds:
+                samples = [_upload(base_url, corpus[(extension, 'small')], extension) for _ in range(repeats)]
+                latencies[extension] = {
+                    'first_ms': samples[0] * 1000,
+                    'rest_p50_ms': statistics.median(samples[1:]) * 1000 if len(samples) > 1 else None,
+                }
+            memory = [_memory_kb(pid) for pid in _worker_pids(process.pid)]
+        finally:
+            stop_server(process)
+
+    return {
+        'mode': name,
+        'ready_s': ready_s,
+        'latency': latencies,
+        'workers_pss_mb': sum(pss for pss, _ in memory) / 1024,
+        'workers_private_mb': sum(private for _, private in memory) / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare start-up time, first-request latency and worker memory '
+                    'with and without preload and warm-up')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='with more than one worker, later requests may still hit a cold worker')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--kinds', default=DEFAULT_KINDS, help='file extensions to upload, in order')
+    parser.add_argument('--repeats', type=int, default=4, help='uploads per extension')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'fily-bench-corpus'))
+    parser.add_argument('--output', default='startup_results.json')
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.corpus_dir, ['small'])
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    results = []
+    for name in args.modes.split(','):
+        result = measure_mode(name, MODES[name], args.workers, kinds, corpus, args.repeats)
+        results.append(result)
+        print(f"{name:16} ready {result['ready_s']:6.2f}s  workers PSS {result['workers_pss_mb']:7.1f}MB  "
+              f"private {result['workers_private_mb']:7.1f}MB")
+        for extension, latency in result['latency'].items():
+            rest = f"{latency['rest_p50_ms']:8.1f}ms" if latency['rest_p50_ms'] is not None else '       -'
+            print(f"    {extension:6} first {latency['first_ms']:8.1f}ms  then p50 {rest}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'workers': args.workers, 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
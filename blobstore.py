@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+
+from metrics import UPLOAD_BLOBS, UPLOAD_BYTES_DEDUPLICATED
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+COPY_BUFFER = 1024 * 1024
+
+
+class BlobStore:
+    """
+    Content-addressed store for uploads. Each distinct content is kept once
+    as <directory>/ab/cd/<sha256>, and every upload name is a hardlink to
+    its blob, so a repeated upload costs a directory entry instead of a
+    copy. A blob's reference count is its link count: once only the blob's
+    own entry is left, no upload refers to it and it can be removed.
+    Names stay ordinary files, so readers, in_use() and the janitor need
+    not know about the store.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def blob_path(self, digest):
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f'Not a SHA-256 digest: {digest!r}')
+        return os.path.join(self.directory, digest[:2], digest[2:4], digest)
+
+    def store(self, stream, path):
+        """
+        Save an upload stream as path; returns (digest, duplicate). A
+        seekable stream (Werkzeug spools large uploads to a temp file) is
+        hashed first, so content already stored is linked without being
+        written again.
+        """
+        if stream.seekable():
+            start = stream.tell()
+            digest = hashlib.file_digest(stream, 'sha256').hexdigest()
+            if self._link(digest, path):
+                return digest, True
+            stream.seek(start)
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(stream, f, COPY_BUFFER)
+        else:
+            hasher = hashlib.sha256()
+            with open(path, 'wb') as f:
+                while chunk := stream.read(COPY_BUFFER):
+                    hasher.update(chunk)
+                    f.write(chunk)
+            digest = hasher.hexdigest()
+        return digest, self._publish(path, digest)
+
+    def adopt(self, path):
+        """Bring a file written elsewhere (an assembled chunked upload) into the store"""
+        with open(path, 'rb') as f:
+            digest = hashlib.file_digest(f, 'sha256').hexdigest()
+        return digest, self._publish(path, digest)
+
+    def release(self, digest):
+        """Remove the blob of digest if no upload name refers to it; True if removed"""
+        blob = self.blob_path(digest)
+        try:
+            if os.stat(blob).st_nlink > 1:
+                return False
+            os.remove(blob)
+        except FileNotFoundError:
+            return False
+        logger.info("Released upload blob %s", digest)
+        return True
+
+    def collect(self):
+        """Remove blobs left without upload names (expired or deleted uploads); returns count"""
+        removed = 0
+        for first in _subdirectories(self.directory):
+            for second in _subdirectories(first):
+                with os.scandir(second) as it:
+                    for entry in it:
+                        if DIGEST_PATTERN.match(entry.name) and entry.stat(follow_symlinks=False).st_nlink == 1:
+                            try:
+                                os.remove(entry.path)
+                                removed += 1
+                            except FileNotFoundError:
+                                pass
+        if removed:
+            logger.info("Removed %s unreferenced upload blob(s)", removed)
+        return removed
+
+    def _link(self, digest, path):
+        """Make path a name of the existing blob of digest; False if there is none"""
+        try:
+            os.link(self.blob_path(digest), path)
+        except FileNotFoundError:
+            return False
+        # Names share the blob's times, and the janitor ages uploads by them
+        os.utime(path)
+        size = os.path.getsize(path)
+        UPLOAD_BLOBS.labels('duplicate').inc()
+        UPLOAD_BYTES_DEDUPLICATED.inc(size)
+        logger.info("Upload %s matches stored blob %s (%s bytes not written)", os.path.basename(path), digest, size)
+        return True
+
+    def _publish(self, path, digest):
+        """
+        Make the freshly written file at path the blob of digest, or, if
+        that content is already stored, swap path for a link to the stored
+        blob and free the copy. Returns True in the second case.
+        """
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            link = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.link")
+            try:
+                os.link(blob, link)
+            except FileNotFoundError:
+                # Released between the two calls; keep the copy unshared
+                return False
+            os.replace(link, path)
+            os.utime(path)
+            UPLOAD_BLOBS.labels('duplicate').inc()
+            UPLOAD_BYTES_DEDUPLICATED.inc(os.path.getsize(path))
+            return True
+        UPLOAD_BLOBS.labels('new').inc()
+        return False
+
+
+def _subdirectories(path):
+    try:
+        with os.scandir(path) as it:
+            return [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+
+def create_blob_store(app):
+    """Build the upload blob store inside the upload folder (hardlinks need one filesystem)"""
+    # The dot keeps the janitor, which sweeps upload names, out of the store
+    return BlobStore(os.path.join(app.config['UPLOAD_FOLDER'], '.blobs'))
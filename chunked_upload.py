@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1024 * 1024
+DIGEST_SIZE = hashlib.sha256().digest_size
+READ_BLOCK = 1024 * 1024
+
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadError(Exception):
+    """A chunked upload request that cannot be served; status is the HTTP code"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkedUploads:
+    """
+    Resumable uploads sent as fixed-size chunks that may arrive in any order
+    and from any worker process. Each session directory holds:
+
+    - data: the file itself, preallocated; chunk i is written at i * chunk_size
+    - received: one byte per chunk, set once that chunk is fully written
+    - digests: the SHA-256 of each chunk, computed while it is written
+
+    The upload's checksum is the SHA-256 of the chunk digests in order, so
+    finalizing never has to read the file back.
+    """
+
+    def __init__(self, directory, max_bytes, chunk_size, max_chunk_size, quota_bytes, ttl_seconds):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, filename, size, chunk_size=None):
+        chunk_size = int(chunk_size or self.chunk_size)
+        if size <= 0:
+            raise ChunkedUploadError('File is empty')
+        if size > self.max_bytes:
+            raise ChunkedUploadError(f'File too large. Maximum size is {self.max_bytes // MEGABYTE}MB', 413)
+        if not 64 * 1024 <= chunk_size <= self.max_chunk_size:
+            raise ChunkedUploadError(f'chunk_size must be between 64KB and {self.max_chunk_size // MEGABYTE}MB')
+
+        self.sweep()
+        if self.reserved_bytes() + size > self.quota_bytes:
+            raise ChunkedUploadError('Too much upload data pending, please retry later', 503)
+
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self.directory, upload_id)
+        os.makedirs(session_dir)
+        chunk_count = -(-size // chunk_size)
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': chunk_size,
+            'chunk_count': chunk_count,
+            'created_at': time.time(),
+        }
+        with open(os.path.join(session_dir, 'data'), 'wb') as f:
+            _preallocate(f.fileno(), size)
+        with open(os.path.join(session_dir, 'received'), 'wb') as f:
+            f.truncate(chunk_count)
+        with open(os.path.join(session_dir, 'digests'), 'wb') as f:
+            f.truncate(chunk_count * DIGEST_SIZE)
+        # Written last: a session without meta.json is never served
+        with open(os.path.join(session_dir, '.meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(os.path.join(session_dir, '.meta.json'), os.path.join(session_dir, 'meta.json'))
+        logger.info("Chunked upload %s created: %s, %s bytes in %s chunks", upload_id, filename, size, chunk_count)
+        return meta
+
+    def load(self, upload_id):
+        if not UPLOAD_ID.match(upload_id or ''):
+            raise ChunkedUploadError('Upload not found', 404)
+        try:
+            with open(os.path.join(self.directory, upload_id, 'meta.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise ChunkedUploadError('Upload not found', 404)
+
+    def write_chunk(self, upload_id, index, stream, length, expected_sha256=None):
+        """Write chunk `index` from stream; length must be that chunk's exact size"""
+        meta = self.load(upload_id)
+        if not 0 <= index < meta['chunk_count']:
+            raise ChunkedUploadError(f"Chunk index must be between 0 and {meta['chunk_count'] - 1}")
+        offset = index * meta['chunk_size']
+        expected_length = min(meta['chunk_size'], meta['size'] - offset)
+        if length != expected_length:
+            raise ChunkedUploadError(f'Chunk {index} must be {expected_length} bytes, got {length}')
+
+        session_dir = os.path.join(self.directory, upload_id)
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            fd = os.open(os.path.join(session_dir, 'data'), os.O_WRONLY)
+        except FileNotFoundError:
+            raise ChunkedUploadError('Upload not found', 404)
+        try:
+            while written < expected_length:
+                block = stream.read(min(READ_BLOCK, expected_length - written))
+                if not block:
+                    break
+                digest.update(block)
+                os.pwrite(fd, block, offset + written)
+                written += len(block)
+        finally:
+            os.close(fd)
+        if written != expected_length:
+            raise ChunkedUploadError(f'Chunk {index} ended after {written} of {expected_length} bytes')
+        if expected_sha256 and expected_sha256.lower() != digest.hexdigest():
+            raise ChunkedUploadError(f'Chunk {index} checksum mismatch', 422)
+
+        self._set(session_dir, 'digests', index * DIGEST_SIZE, digest.digest())
+        # Marked last, so a chunk cut off part-way is never counted as received
+        self._set(session_dir, 'received', index, b'\x01')
+        return {'index': index, 'offset': offset, 'size': written, 'sha256': digest.hexdigest()}
+
+    def status(self, upload_id):
+        meta = self.load(upload_id)
+        received = self._received(upload_id)
+        missing = [index for index, flag in enumerate(received) if not flag]
+        chunk_size, size = meta['chunk_size'], meta['size']
+        bytes_received = sum(min(chunk_size, size - index * chunk_size)
+                             for index, flag in enumerate(received) if flag)
+        return {
+            **meta,
+            'received_chunks': meta['chunk_count'] - len(missing),
+            'missing': missing,
+            'bytes_received': bytes_received,
+            'complete': not missing,
+        }
+
+    def data_path(self, upload_id):
+        """(path, filename) of a fully received upload that is not finalized yet"""
+        meta = self.load(upload_id)
+        if not all(self._received(upload_id)):
+            raise ChunkedUploadError('Upload is not complete', 409)
+        return os.path.join(self.directory, upload_id, 'data'), meta['filename']
+
+    def finalize(self, upload_id, destination):
+        """Move the completed file to destination and return its checksum"""
+        meta = self.load(upload_id)
+        missing = [index for index, flag in enumerate(self._received(upload_id)) if not flag]
+        if missing:
+            raise ChunkedUploadError(f'{len(missing)} chunk(s) missing, first is {missing[0]}', 409)
+
+        session_dir = os.path.join(self.directory, upload_id)
+        with open(os.path.join(session_dir, 'digests'), 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        try:
+            os.replace(os.path.join(session_dir, 'data'), destination)
+        except FileNotFoundError:
+            raise ChunkedUploadError('Upload is already being finalized', 409)
+        shutil.rmtree(session_dir, ignore_errors=True)
+        logger.info("Chunked upload %s finalized (%s bytes)", upload_id, meta['size'])
+        return checksum
+
+    def abort(self, upload_id):
+        self.load(upload_id)
+        shutil.rmtree(os.path.join(self.directory, upload_id), ignore_errors=True)
+
+    def reserved_bytes(self):
+        """Disk space held by open sessions"""
+        total = 0
+        for upload_id in os.listdir(self.directory):
+            try:
+                total += self.load(upload_id)['size']
+            except ChunkedUploadError:
+                continue
+        return total
+
+    def sweep(self, now=None):
+        """Remove sessions with no chunk written for ttl_seconds"""
+        now = time.time() if now is None else now
+        for upload_id in os.listdir(self.directory):
+            session_dir = os.path.join(self.directory, upload_id)
+            try:
+                last_write = os.path.getmtime(os.path.join(session_dir, 'received'))
+            except FileNotFoundError:
+                last_write = os.path.getmtime(session_dir)
+            if now - last_write > self.ttl_seconds:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                logger.info("Expired chunked upload %s", upload_id)
+
+    def _received(self, upload_id):
+        try:
+            with open(os.path.join(self.directory, upload_id, 'received'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ChunkedUploadError('Upload not found', 404)
+
+    @staticmethod
+    def _set(session_dir, name, offset, data):
+        fd = os.open(os.path.join(session_dir, name), os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+
+
+def _preallocate(fd, size):
+    """Reserve the blocks up front where supported, else just set the size"""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def create_chunked_uploads(app):
+    """Build the chunked upload store from app config and environment"""
+    # A chunk is one request, so it must stay under MAX_CONTENT_LENGTH
+    max_chunk_size = min(32 * MEGABYTE, app.config['MAX_CONTENT_LENGTH'])
+    return ChunkedUploads(
+        os.path.join(app.config['TEMP_FOLDER'], '.chunked'),
+        max_bytes=int(_env_number('CHUNKED_UPLOAD_MAX_MB', 1024) * MEGABYTE),
+        chunk_size=min(int(_env_number('CHUNK_SIZE_MB', 8) * MEGABYTE), max_chunk_size),
+        max_chunk_size=max_chunk_size,
+        quota_bytes=int(_env_number('CHUNKED_UPLOAD_QUOTA_MB', 4096) * MEGABYTE),
+        ttl_seconds=_env_number('CHUNKED_UPLOAD_TTL_HOURS', 24) * 3600,
+    )
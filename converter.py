@@ -1,108 +1,418 @@
 import os
+import contextvars
+import functools
+import json
 import logging
+import re
+import shutil
+from contextlib import contextmanager
 from pathlib import Path
 import subprocess
+import tempfile
+import time
 
-def convert_to_pdf(input_path, output_path, original_filename, password=None, quality='high'):
+from metrics import DOCX_COMPLEX, FALLBACKS, instrument, track_libreoffice
+from sandbox import ResourceLimitExceeded, run_sandboxed
+from scheduler import current_slot
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Extensions accepted for conversion, by the upload form and the batch CLI
+ALLOWED_EXTENSIONS = {
+    'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 
+    'txt', 'rtf', 'odt', 'ods', 'odp', 'csv',
+    'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'tif', 'webp', 
+    'ico', 'tga', 'jp2', 'jpeg2000', 'eps', 'svg', 'psd',
+    'md', 'html', 'pdf'
+}
+
+# Render simple .docx files with python-docx + reportlab instead of LibreOffice
+DOCX_FAST_PATH = os.environ.get('DOCX_FAST_PATH', 'true').lower() == 'true'
+
+# Words seen by the converters of the running convert_to_pdf call (see count_words)
+_word_count = contextvars.ContextVar('fily_word_count', default=None)
+
+# Output size/fidelity trade-offs selected by the 'quality' option.
+# 'high' leaves the producer's output untouched; the others run
+# optimize_pdf_output to downsample images and drop unused objects.
+QUALITY_PROFILES = {
+    'high': {'optimize': False, 'image_dpi': None, 'jpeg_quality': 85},
+    'medium': {'optimize': True, 'image_dpi': 150, 'jpeg_quality': 75},
+    'low': {'optimize': True, 'image_dpi': 96, 'jpeg_quality': 60},
+}
+
+def get_quality_profile(quality):
+    """Return the profile for a quality name, defaulting to 'high'"""
+    return QUALITY_PROFILES.get(quality, QUALITY_PROFILES['high'])
+
+PAGE_RANGE_PART = re.compile(r'^(\d+)(?:-(\d+))?$')
+# Upper bound on table rows per page: body rows are at least 18pt high
+# (10pt text plus padding) and an A4 frame is 686pt
+TABLE_ROWS_PER_PAGE = 40
+
+class PageRangeError(ValueError):
+    """The requested pages are not in the document"""
+
+def parse_page_range(spec):
     """
-    Convert various file formats to PDF with optional password protection
+    Parse '1,3-5' into ((1, 1), (3, 5)): 1-based and inclusive. Returns None
+    for an empty spec; raises ValueError if it is malformed.
     """
+    if spec is None or not str(spec).strip():
+        return None
+    ranges = []
+    for part in str(spec).replace(' ', '').split(','):
+        match = PAGE_RANGE_PART.match(part)
+        if not match:
+            raise ValueError(f"Invalid page range '{part}', use e.g. 1,3-5")
+        start, end = int(match.group(1)), int(match.group(2) or match.group(1))
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid page range '{part}'")
+        ranges.append((start, end))
+    if len(ranges) > 100:
+        raise ValueError('Too many page ranges')
+    return tuple(ranges)
+
+def format_page_range(pages):
+    """Inverse of parse_page_range, in LibreOffice's PageRange syntax"""
+    return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in pages)
+
+def page_indices(pages, count):
+    """0-based indices of the requested pages that exist among count, in document order"""
+    wanted = set()
+    for start, end in pages:
+        wanted.update(range(start - 1, min(end, count)))
+    return sorted(wanted)
+
+def table_rows(pages):
+    """Rows a table converter must read to fill the last requested page"""
+    return max(end for _, end in pages) * TABLE_ROWS_PER_PAGE if pages else None
+
+def convert_then_select(convert, input_path, output_path, quality, password, pages, **kwargs):
+    """
+    Run a converter that lays out every page, then keep only the requested
+    pages. The cut writes the final file, so it is the step that encrypts.
+    """
+    if not pages:
+        return convert(input_path, output_path, quality, password, **kwargs)
+    return convert(input_path, output_path, quality, None, **kwargs) and keep_pdf_pages(output_path, pages, password)
+
+@functools.lru_cache(maxsize=None)
+def get_styles():
+    """reportlab sample stylesheet, built once per process; do not modify it"""
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+@functools.lru_cache(maxsize=None)
+def get_table_style():
+    """Header row and grid style shared by the spreadsheet converters"""
+    from reportlab.platypus import TableStyle
+    from reportlab.lib import colors
+    
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+@traced
+def convert_to_pdf(input_path, output_path, original_filename, password=None, quality='high', stats=None,
+                   page_range=None, sheet=None):
+    """
+    Convert various file formats to PDF with optional password protection.
+    The password is handed to whichever step writes the final file so the
+    output is encrypted in the same pass; only LibreOffice output is
+    re-opened to be encrypted. If stats is a dict it receives the output
+    size before and after the quality profile's optimization, or on a
+    timeout, sandbox limit or missing pages the failure class under
+    'failure', and the word count of text-based inputs under 'word_count',
+    tallied while the converter holds the text so no input is re-read.
+    There is no word count with a page_range: the converters read more of
+    the input than the pages kept, so it would not describe the output.
+
+    page_range ('1,3-5') limits the output to those pages, slides or image
+    frames, and sheet (name or 1-based position) to one worksheet of a
+    spreadsheet. LibreOffice exports only those pages, PDFs and images
+    read only those pages or frames, and CSV/Excel read only the rows up
+    to the last page; the other reportlab converters still lay out the
+    whole document and the pages are cut out afterwards.
+    """
+    words = {}
+    token = _word_count.set(None if page_range else words)
+    try:
+        success = _convert_to_pdf(input_path, output_path, password, quality, stats, page_range, sheet)
+    finally:
+        _word_count.reset(token)
+    if success and stats is not None and 'count' in words:
+        stats['word_count'] = words['count']
+    return success
+
+def count_words(text):
+    """Add text's words to the running conversion's word count, if any"""
+    add_word_count(len(text.split()))
+
+def add_word_count(count):
+    words = _word_count.get()
+    if words is not None:
+        words['count'] = words.get('count', 0) + count
+
+def _convert_to_pdf(input_path, output_path, password, quality, stats, page_range, sheet):
     try:
         file_extension = Path(input_path).suffix.lower()
+        profile = get_quality_profile(quality)
+        pages = parse_page_range(page_range)
+        
+        # When the optimizer runs it writes the final file, so it encrypts
+        source_path = output_path
+        if profile['optimize']:
+            final_password, password = password, None
         
         if file_extension in ['.docx', '.doc']:
-            success = convert_word_to_pdf(input_path, output_path, quality)
+            success = convert_word_to_pdf(input_path, output_path, quality, password, pages=pages)
         elif file_extension in ['.xlsx', '.xls']:
-            success = convert_excel_to_pdf(input_path, output_path, quality)
+            success = convert_excel_to_pdf(input_path, output_path, quality, password, pages=pages, sheet=sheet)
         elif file_extension in ['.pptx', '.ppt']:
-            success = convert_powerpoint_to_pdf(input_path, output_path, quality)
+            success = convert_powerpoint_to_pdf(input_path, output_path, quality, password, pages=pages)
         elif file_extension in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff']:
-            success = convert_image_to_pdf(input_path, output_path, quality)
+            success = convert_image_to_pdf(input_path, output_path, quality, password, pages=pages)
         elif file_extension == '.txt':
-            success = convert_text_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_text_to_pdf, input_path, output_path, quality, password, pages)
         elif file_extension == '.csv':
-            success = convert_csv_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_csv_to_pdf, input_path, output_path, quality, password, pages,
+                                          max_rows=table_rows(pages))
         elif file_extension in ['.rtf', '.odt', '.ods', '.odp']:
-            success = convert_office_format_to_pdf(input_path, output_path, quality)
+            success = convert_office_format_to_pdf(input_path, output_path, quality, password, pages=pages)
         elif file_extension in ['.html', '.htm']:
-            success = convert_html_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_html_to_pdf, input_path, output_path, quality, password, pages)
         elif file_extension == '.xml':
-            success = convert_xml_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_xml_to_pdf, input_path, output_path, quality, password, pages)
         elif file_extension == '.json':
-            success = convert_json_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_json_to_pdf, input_path, output_path, quality, password, pages)
         elif file_extension == '.md':
-            success = convert_markdown_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_markdown_to_pdf, input_path, output_path, quality, password,
+                                          pages)
         elif file_extension in ['.py', '.js', '.css']:
-            success = convert_code_to_pdf(input_path, output_path, quality)
+            success = convert_then_select(convert_code_to_pdf, input_path, output_path, quality, password, pages)
         elif file_extension == '.pdf':
-            # If already PDF, just copy and optionally add password
-            import shutil
-            shutil.copy2(input_path, output_path)
-            success = True
+            if pages:
+                # Only the requested pages are read and written
+                success = copy_pdf_pages(input_path, output_path, pages, password)
+            elif profile['optimize']:
+                # The optimizer reads the upload directly, no copy needed
+                source_path = input_path
+                success = True
+            elif password:
+                # Encrypt while copying rather than copying and re-reading
+                success = encrypt_pdf_copy(input_path, output_path, password)
+            else:
+                import shutil
+                shutil.copy2(input_path, output_path)
+                success = True
         else:
-            logging.error(f"Unsupported file format: {file_extension}")
+            logger.error(f"Unsupported file format: {file_extension}")
             return False
         
-        # Add password protection if requested and conversion was successful
-        if success and password:
-            return add_password_to_pdf(output_path, password)
+        if success and profile['optimize']:
+            success = optimize_pdf_output(source_path, output_path, quality, final_password, stats)
+        elif success and stats is not None:
+            stats['unoptimized_size'] = stats['output_size'] = os.path.getsize(output_path)
         
         return success
     
+    except PageRangeError as e:
+        logger.warning("Conversion not possible: %s", e)
+        if stats is not None:
+            stats['failure'] = 'page_range'
+        return False
+    except ResourceLimitExceeded as e:
+        logger.warning("Conversion stopped by the sandbox: %s", e)
+        if stats is not None:
+            stats['failure'] = f"limit:{e.limit}"
+        return False
+    except subprocess.TimeoutExpired:
+        logger.error("Conversion timed out")
+        if stats is not None:
+            stats['failure'] = 'timeout'
+        return False
     except Exception as e:
-        logging.error(f"Conversion error: {str(e)}")
+        logger.error(f"Conversion error: {str(e)}")
         return False
 
-def convert_word_to_pdf(input_path, output_path, quality='high'):
-    """Convert Word documents to PDF using LibreOffice"""
+@contextmanager
+def libreoffice_profile():
+    """
+    Profile directory for one LibreOffice run. With a shared profile a second
+    soffice hands its job to the running one, outside its sandbox, so inside
+    a scheduler slot the slot's own profile is reused (one per slot, so the
+    pool is fixed and the startup cost is paid once); elsewhere a throwaway
+    profile is created and removed afterwards. A profile whose run was killed
+    is discarded, as LibreOffice may have left it half written.
+    """
+    slot = current_slot()
+    if slot is None:
+        path = tempfile.mkdtemp(prefix='run-', dir=_profile_root())
+    else:
+        path = os.path.abspath(slot + '.profile')
     try:
-        # Use LibreOffice headless mode for conversion
+        yield path
+    except (subprocess.TimeoutExpired, ResourceLimitExceeded):
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    finally:
+        if slot is None:
+            shutil.rmtree(path, ignore_errors=True)
+
+def _profile_root():
+    root = os.path.join(tempfile.gettempdir(), 'fily-libreoffice')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+def prune_libreoffice_profiles():
+    """
+    Remove throwaway profiles left by killed workers, and the per-thread
+    ones (<pid>-<thread id>) older versions made whose process is gone.
+    """
+    root = _profile_root()
+    for name in os.listdir(root):
+        match = re.match(r'^(\d+)-\d+$', name)
+        if match and _process_alive(int(match.group(1))):
+            continue
+        if name.startswith('run-') and time.time() - os.path.getmtime(os.path.join(root, name)) < 3600:
+            # Removed by its run unless the worker was killed; runs time out long before an hour
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def run_libreoffice(input_path, output_path, timeout=60, page_range=None):
+    """
+    Convert a file with headless LibreOffice and move the PDF to output_path.
+    page_range ('1', '3-5', ...) limits the export to those pages or slides.
+    Returns False if LibreOffice failed; raises subprocess.TimeoutExpired or
+    ResourceLimitExceeded (see sandbox.py).
+    """
+    target = 'pdf'
+    if page_range:
+        target = 'pdf:writer_pdf_Export:' + json.dumps({'PageRange': {'type': 'string', 'value': page_range}})
+    with libreoffice_profile() as profile, track_libreoffice():
         cmd = [
             'libreoffice',
+            f"-env:UserInstallation={Path(profile).as_uri()}",
             '--headless',
-            '--convert-to', 'pdf',
+            '--convert-to', target,
             '--outdir', os.path.dirname(output_path),
             input_path
         ]
+        result = run_sandboxed(cmd, timeout)
+    
+    if result.returncode == 0:
+        # LibreOffice creates PDF with same name as input file
+        input_name = Path(input_path).stem
+        generated_pdf = os.path.join(os.path.dirname(output_path), f"{input_name}.pdf")
+        
+        if os.path.exists(generated_pdf):
+            os.rename(generated_pdf, output_path)
+            return True
+    
+    logger.error(f"LibreOffice conversion failed: {result.stderr}")
+    return False
+
+def docx_fast_path_reason(input_path):
+    """None if a Word file can skip LibreOffice, else why not"""
+    if not DOCX_FAST_PATH:
+        return 'disabled'
+    if Path(input_path).suffix.lower() != '.docx':
+        return 'not docx'
+    from docx_renderer import unsupported_feature
+    return unsupported_feature(input_path)
+
+def conversion_kind(input_path):
+    """Scheduler/cost-model key: the extension, or 'docx-native' for the fast path"""
+    extension = Path(input_path).suffix.lower().lstrip('.')
+    if extension == 'docx' and docx_fast_path_reason(input_path) is None:
+        return 'docx-native'
+    return extension
+
+@instrument
+def convert_docx_native(input_path, output_path, quality='high', password=None):
+    """Render a .docx with python-docx + reportlab (see docx_renderer.py)"""
+    try:
+        from docx_renderer import render_docx
+        info = {}
+        render_docx(input_path, output_path, encrypt=pdf_encryption(password), stats=info)
+        add_word_count(info['word_count'])
+        return True
+    except Exception as e:
+        logger.warning("Native DOCX rendering failed: %s", e)
+        return False
+
+@instrument
+def convert_word_to_pdf(input_path, output_path, quality='high', password=None, pages=None):
+    """Convert Word documents to PDF: simple .docx natively, the rest with LibreOffice"""
+    reason = docx_fast_path_reason(input_path)
+    if reason is None:
+        if convert_then_select(convert_docx_native, input_path, output_path, quality, password, pages):
+            return True
+    elif DOCX_FAST_PATH and Path(input_path).suffix.lower() == '.docx':
+        logger.info("%s needs LibreOffice: %s", os.path.basename(input_path), reason)
+        DOCX_COMPLEX.labels(reason.split(' (')[0]).inc()
+    
+    try:
+        # Use LibreOffice headless mode for conversion
+        if run_libreoffice(input_path, output_path, page_range=format_page_range(pages) if pages else None):
+            # LibreOffice cannot encrypt, so protect its output afterwards
+            return add_password_to_pdf(output_path, password) if password else True
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        if result.returncode == 0:
-            # LibreOffice creates PDF with same name as input file
-            input_name = Path(input_path).stem
-            generated_pdf = os.path.join(os.path.dirname(output_path), f"{input_name}.pdf")
-            
-            if os.path.exists(generated_pdf):
-                os.rename(generated_pdf, output_path)
-                return True
-        
-        logging.error(f"LibreOffice conversion failed: {result.stderr}")
-        return convert_word_fallback(input_path, output_path, quality)
+        return convert_then_select(convert_word_fallback, input_path, output_path, quality, password, pages)
     
-    except subprocess.TimeoutExpired:
-        logging.error("LibreOffice conversion timed out")
-        return convert_word_fallback(input_path, output_path, quality)
+    except (ResourceLimitExceeded, subprocess.TimeoutExpired, PageRangeError):
+        # Not retried in-process: the fallback has no limits
+        raise
     except Exception as e:
-        logging.error(f"LibreOffice conversion error: {str(e)}")
-        return convert_word_fallback(input_path, output_path, quality)
+        logger.error(f"LibreOffice conversion error: {str(e)}")
+        return convert_then_select(convert_word_fallback, input_path, output_path, quality, password, pages)
 
-def convert_word_fallback(input_path, output_path, quality='high'):
+@instrument
+def convert_word_fallback(input_path, output_path, quality='high', password=None):
     """Fallback Word to PDF conversion using python-docx and reportlab"""
+    FALLBACKS.labels('convert_word_fallback').inc()
+    # The native renderer keeps tables, images and styles even for documents
+    # it would not take on the fast path; plain text is the last resort
+    if Path(input_path).suffix.lower() == '.docx' and convert_docx_native(input_path, output_path, quality, password):
+        return True
+    return convert_word_text_only(input_path, output_path, quality, password)
+
+@instrument
+def convert_word_text_only(input_path, output_path, quality='high', password=None):
+    """Paragraph text of a Word document, without formatting, tables or images"""
     try:
         from docx import Document
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
         
         # Read Word document
         doc = Document(input_path)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         for paragraph in doc.paragraphs:
+            count_words(paragraph.text)
             if paragraph.text.strip():
                 p = Paragraph(paragraph.text, styles['Normal'])
                 story.append(p)
@@ -112,134 +422,142 @@ def convert_word_fallback(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"Word fallback conversion error: {str(e)}")
+        logger.error(f"Word fallback conversion error: {str(e)}")
         return False
 
-def convert_excel_to_pdf(input_path, output_path, quality='high'):
-    """Convert Excel files to PDF"""
+@instrument
+def convert_excel_to_pdf(input_path, output_path, quality='high', password=None, pages=None, sheet=None):
+    """Convert Excel files to PDF; one sheet, if given, is read with pandas"""
+    if sheet is not None and str(sheet).strip():
+        # LibreOffice cannot export a single sheet from the command line
+        return convert_then_select(convert_sheet_to_pdf, input_path, output_path, quality, password, pages,
+                                   sheet=sheet, max_rows=table_rows(pages))
     try:
         # Try LibreOffice first
-        cmd = [
-            'libreoffice',
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', os.path.dirname(output_path),
-            input_path
-        ]
+        if run_libreoffice(input_path, output_path, page_range=format_page_range(pages) if pages else None):
+            # LibreOffice cannot encrypt, so protect its output afterwards
+            return add_password_to_pdf(output_path, password) if password else True
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        if result.returncode == 0:
-            input_name = Path(input_path).stem
-            generated_pdf = os.path.join(os.path.dirname(output_path), f"{input_name}.pdf")
-            
-            if os.path.exists(generated_pdf):
-                os.rename(generated_pdf, output_path)
-                return True
-        
-        return convert_excel_fallback(input_path, output_path, quality)
+        return convert_then_select(convert_excel_fallback, input_path, output_path, quality, password, pages,
+                                   max_rows=table_rows(pages))
     
+    except (ResourceLimitExceeded, subprocess.TimeoutExpired, PageRangeError):
+        # Not retried in-process: the fallback has no limits
+        raise
     except Exception as e:
-        logging.error(f"Excel LibreOffice conversion error: {str(e)}")
-        return convert_excel_fallback(input_path, output_path, quality)
+        logger.error(f"Excel LibreOffice conversion error: {str(e)}")
+        return convert_then_select(convert_excel_fallback, input_path, output_path, quality, password, pages,
+                                   max_rows=table_rows(pages))
+
+@instrument
+def convert_excel_fallback(input_path, output_path, quality='high', password=None, max_rows=None):
+    """Fallback Excel to PDF conversion (first sheet); max_rows reads only the first rows"""
+    FALLBACKS.labels('convert_excel_fallback').inc()
+    return convert_sheet_to_pdf(input_path, output_path, quality, password, max_rows=max_rows)
 
-def convert_excel_fallback(input_path, output_path, quality='high'):
-    """Fallback Excel to PDF conversion"""
+@instrument
+def convert_sheet_to_pdf(input_path, output_path, quality='high', password=None, sheet=0, max_rows=None):
+    """One worksheet as a table with pandas and reportlab; sheet is a name or 1-based position"""
     try:
         import pandas as pd
         from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Table
         
-        # Read Excel file
-        df = pd.read_excel(input_path)
+        if isinstance(sheet, str) and sheet.strip().isdigit():
+            sheet = int(sheet) - 1
+        # Only the requested sheet is parsed (openpyxl read-only mode), and only max_rows of it
+        df = pd.read_excel(input_path, sheet_name=sheet, nrows=max_rows)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=A4)
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=A4, encrypt=pdf_encryption(password))
         
         # Convert DataFrame to list of lists
         data = [df.columns.tolist()] + df.values.tolist()
         
         # Create table
         table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table.setStyle(get_table_style())
         
         pdf_doc.build([table])
         return True
     
     except Exception as e:
-        logging.error(f"Excel fallback conversion error: {str(e)}")
+        logger.error(f"Excel sheet conversion error: {str(e)}")
         return False
 
-def convert_powerpoint_to_pdf(input_path, output_path, quality='high'):
-    """Convert PowerPoint files to PDF using LibreOffice"""
+@instrument
+def convert_powerpoint_to_pdf(input_path, output_path, quality='high', password=None, pages=None):
+    """Convert PowerPoint files to PDF using LibreOffice; pages selects slides"""
     try:
-        cmd = [
-            'libreoffice',
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', os.path.dirname(output_path),
-            input_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if run_libreoffice(input_path, output_path, page_range=format_page_range(pages) if pages else None):
+            # LibreOffice cannot encrypt, so protect its output afterwards
+            return add_password_to_pdf(output_path, password) if password else True
         
-        if result.returncode == 0:
-            input_name = Path(input_path).stem
-            generated_pdf = os.path.join(os.path.dirname(output_path), f"{input_name}.pdf")
-            
-            if os.path.exists(generated_pdf):
-                os.rename(generated_pdf, output_path)
-                return True
-        
-        logging.error(f"PowerPoint conversion failed: {result.stderr}")
         return False
     
+    except (ResourceLimitExceeded, subprocess.TimeoutExpired):
+        raise
     except Exception as e:
-        logging.error(f"PowerPoint conversion error: {str(e)}")
+        logger.error(f"PowerPoint conversion error: {str(e)}")
         return False
 
-def convert_image_to_pdf(input_path, output_path, quality='high'):
-    """Convert images to PDF using Pillow"""
+@instrument
+def convert_image_to_pdf(input_path, output_path, quality='high', password=None, pages=None):
+    """
+    Convert images to PDF using Pillow: the first frame, or with pages one
+    PDF page per requested frame of a multi-frame GIF/TIFF. Other frames
+    are never decoded.
+    """
     try:
         from PIL import Image
         
         with Image.open(input_path) as img:
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
+            indices = page_indices(pages, getattr(img, 'n_frames', 1)) if pages else [0]
+            if not indices:
+                raise PageRangeError(f"Image has {getattr(img, 'n_frames', 1)} frame(s)")
+            frames = []
+            for index in indices:
+                img.seek(index)
+                # Convert to RGB if necessary (this also detaches the frame from the file)
+                frames.append(img.convert('RGB') if img.mode != 'RGB' or len(indices) > 1 else img)
             
-            img.save(output_path, 'PDF')
+            if password:
+                # Pillow cannot encrypt PDFs, reportlab can while writing
+                from reportlab.pdfgen import canvas
+                from reportlab.lib.utils import ImageReader
+                
+                c = canvas.Canvas(output_path, pagesize=frames[0].size, encrypt=pdf_encryption(password))
+                for frame in frames:
+                    c.setPageSize(frame.size)
+                    c.drawImage(ImageReader(frame), 0, 0, width=frame.width, height=frame.height)
+                    c.showPage()
+                c.save()
+            else:
+                frames[0].save(output_path, 'PDF', save_all=True, append_images=frames[1:])
         
         return True
     
+    except PageRangeError:
+        raise
     except Exception as e:
-        logging.error(f"Image conversion error: {str(e)}")
+        logger.error(f"Image conversion error: {str(e)}")
         return False
 
-def convert_text_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_text_to_pdf(input_path, output_path, quality='high', password=None):
     """Convert text files to PDF using reportlab"""
     try:
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
         
         # Read text file
         with open(input_path, 'r', encoding='utf-8') as f:
             content = f.read()
+        count_words(content)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         # Split content into paragraphs
@@ -254,80 +572,60 @@ def convert_text_to_pdf(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"Text conversion error: {str(e)}")
+        logger.error(f"Text conversion error: {str(e)}")
         return False
 
-def convert_csv_to_pdf(input_path, output_path, quality='high'):
-    """Convert CSV files to PDF using pandas and reportlab"""
+@instrument
+def convert_csv_to_pdf(input_path, output_path, quality='high', password=None, max_rows=None):
+    """Convert CSV files to PDF using pandas and reportlab; max_rows reads only the first rows"""
     try:
         import pandas as pd
         from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Table
         
         # Read CSV file
-        df = pd.read_csv(input_path)
+        df = pd.read_csv(input_path, nrows=max_rows)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=A4)
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=A4, encrypt=pdf_encryption(password))
         
         # Convert DataFrame to list of lists
         data = [df.columns.tolist()] + df.values.tolist()
+        count_words(' '.join(str(value) for row in data for value in row))
         
         # Create table
         table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table.setStyle(get_table_style())
         
         pdf_doc.build([table])
         return True
     
     except Exception as e:
-        logging.error(f"CSV conversion error: {str(e)}")
+        logger.error(f"CSV conversion error: {str(e)}")
         return False
 
-def convert_office_format_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_office_format_to_pdf(input_path, output_path, quality='high', password=None, pages=None):
     """Convert RTF, ODT, ODS, ODP files to PDF using LibreOffice"""
     try:
-        cmd = [
-            'libreoffice',
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', os.path.dirname(output_path),
-            input_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if run_libreoffice(input_path, output_path, page_range=format_page_range(pages) if pages else None):
+            # LibreOffice cannot encrypt, so protect its output afterwards
+            return add_password_to_pdf(output_path, password) if password else True
         
-        if result.returncode == 0:
-            input_name = Path(input_path).stem
-            generated_pdf = os.path.join(os.path.dirname(output_path), f"{input_name}.pdf")
-            
-            if os.path.exists(generated_pdf):
-                os.rename(generated_pdf, output_path)
-                return True
-        
-        logging.error(f"Office format conversion failed: {result.stderr}")
         return False
     
+    except (ResourceLimitExceeded, subprocess.TimeoutExpired):
+        raise
     except Exception as e:
-        logging.error(f"Office format conversion error: {str(e)}")
+        logger.error(f"Office format conversion error: {str(e)}")
         return False
 
-def convert_html_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_html_to_pdf(input_path, output_path, quality='high', password=None):
     """Convert HTML files to PDF"""
     try:
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
         import html
         
         # Read HTML file
@@ -339,10 +637,11 @@ def convert_html_to_pdf(input_path, output_path, quality='high'):
         # Remove HTML tags (basic approach)
         import re
         content = re.sub('<[^<]+?>', '', content)
+        count_words(content)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         # Split content into paragraphs
@@ -357,23 +656,24 @@ def convert_html_to_pdf(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"HTML conversion error: {str(e)}")
+        logger.error(f"HTML conversion error: {str(e)}")
         return False
 
-def convert_xml_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_xml_to_pdf(input_path, output_path, quality='high', password=None):
     """Convert XML files to PDF"""
     try:
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
-        from reportlab.lib.styles import getSampleStyleSheet
         
         # Read XML file
         with open(input_path, 'r', encoding='utf-8') as f:
             content = f.read()
+        count_words(content)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         # Add XML content as preformatted text
@@ -384,26 +684,27 @@ def convert_xml_to_pdf(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"XML conversion error: {str(e)}")
+        logger.error(f"XML conversion error: {str(e)}")
         return False
 
-def convert_json_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_json_to_pdf(input_path, output_path, quality='high', password=None):
     """Convert JSON files to PDF"""
     try:
         import json
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
-        from reportlab.lib.styles import getSampleStyleSheet
         
         # Read and format JSON file
         with open(input_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
         formatted_json = json.dumps(data, indent=2, ensure_ascii=False)
+        count_words(formatted_json)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         # Add formatted JSON as preformatted text
@@ -414,15 +715,15 @@ def convert_json_to_pdf(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"JSON conversion error: {str(e)}")
+        logger.error(f"JSON conversion error: {str(e)}")
         return False
 
-def convert_markdown_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_markdown_to_pdf(input_path, output_path, quality='high', password=None):
     """Convert Markdown files to PDF"""
     try:
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
         import re
         
         # Read Markdown file
@@ -435,10 +736,11 @@ def convert_markdown_to_pdf(input_path, output_path, quality='high'):
         content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)  # Bold
         content = re.sub(r'\*(.*?)\*', r'\1', content)  # Italic
         content = re.sub(r'`(.*?)`', r'\1', content)  # Code
+        count_words(content)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         # Split content into paragraphs
@@ -453,23 +755,24 @@ def convert_markdown_to_pdf(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"Markdown conversion error: {str(e)}")
+        logger.error(f"Markdown conversion error: {str(e)}")
         return False
 
-def convert_code_to_pdf(input_path, output_path, quality='high'):
+@instrument
+def convert_code_to_pdf(input_path, output_path, quality='high', password=None):
     """Convert code files (Python, JavaScript, CSS) to PDF"""
     try:
         from reportlab.lib.pagesizes import letter
         from reportlab.platypus import SimpleDocTemplate, Preformatted, Spacer, Paragraph
-        from reportlab.lib.styles import getSampleStyleSheet
         
         # Read code file
         with open(input_path, 'r', encoding='utf-8') as f:
             content = f.read()
+        count_words(content)
         
         # Create PDF
-        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        pdf_doc = SimpleDocTemplate(output_path, pagesize=letter, encrypt=pdf_encryption(password))
+        styles = get_styles()
         story = []
         
         # Add filename as header
@@ -486,11 +789,68 @@ def convert_code_to_pdf(input_path, output_path, quality='high'):
         return True
     
     except Exception as e:
-        logging.error(f"Code conversion error: {str(e)}")
+        logger.error(f"Code conversion error: {str(e)}")
+        return False
+
+def pdf_encryption(password):
+    """Build a reportlab encryption setting matching PyPDF2's 128-bit default"""
+    if not password:
+        return None
+    from reportlab.lib.pdfencrypt import StandardEncryption
+    return StandardEncryption(password, strength=128)
+
+@traced
+def encrypt_pdf_copy(input_path, output_path, password):
+    """Write an encrypted copy of an existing PDF in a single pass"""
+    return copy_pdf_pages(input_path, output_path, None, password)
+
+@traced
+def copy_pdf_pages(input_path, output_path, pages=None, password=None):
+    """
+    Copy the requested pages (all if pages is None) of a PDF, encrypting
+    while writing if a password is given. Pages that are not copied are
+    never parsed. Raises PageRangeError if none of the pages exist.
+    """
+    writer = None
+    try:
+        from PyPDF2 import PdfReader
+        from pdf_tools import StreamingPdfWriter
+        
+        with open(input_path, 'rb') as pdf_file:
+            reader = PdfReader(pdf_file)
+            indices = None
+            if pages:
+                indices = page_indices(pages, len(reader.pages))
+                if not indices:
+                    raise PageRangeError(f"Document has {len(reader.pages)} page(s)")
+            writer = StreamingPdfWriter(output_path, password=password, deduplicate=False)
+            writer.add_reader(reader, indices)
+        writer.close()
+        return True
+    
+    except PageRangeError:
+        raise
+    except Exception as e:
+        logger.error(f"PDF copy error: {str(e)}")
+        if writer:
+            writer.abort()
         return False
 
+def keep_pdf_pages(pdf_path, pages, password=None):
+    """Cut a finished PDF down to the requested pages, in place"""
+    temp_path = f"{pdf_path}.pages"
+    try:
+        if not copy_pdf_pages(pdf_path, temp_path, pages, password):
+            return False
+        os.replace(temp_path, pdf_path)
+        return True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@traced
 def add_password_to_pdf(pdf_path, password):
-    """Add password protection to PDF using PyPDF2"""
+    """Add password protection to a finished PDF (LibreOffice output) using PyPDF2"""
     try:
         from PyPDF2 import PdfReader, PdfWriter
         import os
@@ -517,13 +877,60 @@ def add_password_to_pdf(pdf_path, password):
         # Replace original with encrypted version
         os.replace(temp_path, pdf_path)
         
-        logging.info(f"Successfully added password protection to PDF")
+        logger.info("Successfully added password protection to PDF")
         return True
     
     except Exception as e:
-        logging.error(f"Password protection error: {str(e)}")
+        logger.error(f"Password protection error: {str(e)}")
         return False
 
+@traced
+def optimize_pdf_output(source_path, output_path, quality='high', password=None, stats=None):
+    """
+    Run the quality profile's optimization pass over a finished PDF.
+    Falls back to the unoptimized file if optimization fails or does not
+    make it smaller.
+    """
+    import shutil
+    
+    profile = get_quality_profile(quality)
+    temp_path = f"{output_path}.opt"
+    size_before = os.path.getsize(source_path)
+    try:
+        from pdf_tools import optimize_pdf
+        
+        result = optimize_pdf(source_path, temp_path, profile['image_dpi'], profile['jpeg_quality'], password)
+        size_after = os.path.getsize(temp_path)
+        
+        if size_after >= size_before and not password:
+            os.remove(temp_path)
+            if source_path != output_path:
+                shutil.copy2(source_path, output_path)
+            size_after = size_before
+        else:
+            os.replace(temp_path, output_path)
+        
+        logger.info("Optimized PDF (%s): %s -> %s bytes, %s images downsampled",
+                    quality, size_before, size_after, result['images_downsampled'])
+        if stats is not None:
+            stats.update({
+                'unoptimized_size': size_before,
+                'output_size': size_after,
+                'images_downsampled': result['images_downsampled'],
+            })
+        return True
+    
+    except Exception as e:
+        logger.error(f"PDF optimization error: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if source_path != output_path:
+            shutil.copy2(source_path, output_path)
+        if stats is not None:
+            stats['unoptimized_size'] = stats['output_size'] = size_before
+        return add_password_to_pdf(output_path, password) if password else True
+
+@instrument
 def convert_image_format(input_path, output_path, target_format='jpg', quality=95):
     """
     Convert between different image formats - IMPROVED VERSION
@@ -548,13 +955,13 @@ def convert_image_format(input_path, output_path, target_format='jpg', quality=9
         elif target_format.lower() in ['tiff', 'tif']:
             output_path = os.path.join(output_dir, f"{output_name}.tiff")
         else:
-            logging.error(f"Unsupported target format: {target_format}")
+            logger.error(f"Unsupported target format: {target_format}")
             return False, None
         
         # Open and convert the image
         with Image.open(input_path) as img:
             # Log original format and mode for debugging
-            logging.info(f"Converting from {img.format} ({img.mode}) to {target_format.upper()}")
+            logger.info("Converting from %s (%s) to %s", img.format, img.mode, target_format.upper())
             
             # Handle transparency and mode conversion based on target format
             if target_format.lower() in ['jpg', 'jpeg']:
@@ -671,14 +1078,16 @@ def convert_image_format(input_path, output_path, target_format='jpg', quality=9
                     img = img.convert('RGB')
                 img.save(output_path, 'PDF', resolution=100.0)
             
-        logging.info(f"Successfully converted image to {target_format.upper()} format: {output_path}")
+        logger.info("Successfully converted image to %s format: %s", target_format.upper(), output_path)
         return True, output_path
         
     except Exception as e:
-        logging.error(f"Image format conversion error: {str(e)}")
+        logger.error(f"Image format conversion error: {str(e)}")
         return False, None
 
-def merge_pdfs(input_paths, output_path, file_order=None, passwords=None):
+@instrument
+def merge_pdfs(input_paths, output_path, file_order=None, passwords=None, streaming=True, stats=None,
+               password=None, pages=None):
     """
     Merge multiple PDF files into one with advanced settings
     Args:
@@ -686,12 +1095,24 @@ def merge_pdfs(input_paths, output_path, file_order=None, passwords=None):
         output_path: Output merged PDF path
         file_order: Optional list of indices to specify order (0-based)
         passwords: Optional dict of {file_path: password} for protected PDFs
+        streaming: Write each input to disk as soon as it is added and store
+            identical fonts/images shared between inputs only once
+        stats: Optional dict that receives pages, pages_per_second and bytes_saved
+        password: Optional password used to encrypt the merged output
+        pages: Optional parse_page_range() result, numbered over the merged
+            document; inputs after the last requested page are not opened
     """
+    merger = None
     try:
         from PyPDF2 import PdfReader, PdfWriter
-        import PyPDF2
+        from pdf_tools import StreamingPdfWriter
         
-        writer = PdfWriter()
+        if streaming:
+            merger = StreamingPdfWriter(output_path, password=password)
+        else:
+            writer = PdfWriter()
+            if password:
+                writer.encrypt(password)
         processed_files = []
         
         # Use custom order if specified, otherwise use original order
@@ -701,61 +1122,195 @@ def merge_pdfs(input_paths, output_path, file_order=None, passwords=None):
                 ordered_paths = [input_paths[i] for i in file_order if i < len(input_paths)]
                 input_paths = ordered_paths
             except (IndexError, TypeError):
-                logging.warning("Invalid file order specified, using original order")
+                logger.warning("Invalid file order specified, using original order")
         
+        # Pages of the merged document before the current input
+        offset = 0
+        last_page = max(end for _, end in pages) if pages else None
         for i, path in enumerate(input_paths):
+            if last_page is not None and offset >= last_page:
+                break
             if not os.path.exists(path):
-                logging.warning(f"PDF file not found: {path}")
+                logger.warning(f"PDF file not found: {path}")
                 continue
                 
             try:
                 # Get password for this file if provided
                 password = passwords.get(path) if passwords else None
                 
-                # Try to open the PDF
-                reader = PdfReader(path)
-                
-                # Handle password-protected PDFs
-                if reader.is_encrypted:
-                    if password:
-                        try:
-                            reader.decrypt(password)
-                            logging.info(f"Successfully decrypted PDF: {os.path.basename(path)}")
-                        except Exception as e:
-                            logging.error(f"Failed to decrypt PDF {path} with provided password: {str(e)}")
+                with open(path, 'rb') as pdf_file:
+                    # Try to open the PDF
+                    reader = PdfReader(pdf_file)
+                    
+                    # Handle password-protected PDFs
+                    if reader.is_encrypted:
+                        if password:
+                            try:
+                                reader.decrypt(password)
+                                logger.info("Successfully decrypted PDF: %s", os.path.basename(path))
+                            except Exception as e:
+                                logger.error(f"Failed to decrypt PDF {path} with provided password: {str(e)}")
+                                continue
+                        else:
+                            logger.warning(f"PDF {path} is password-protected but no password provided")
                             continue
-                    else:
-                        logging.warning(f"PDF {path} is password-protected but no password provided")
+                    
+                    # Add all pages from this PDF, or those in the requested range
+                    page_count = len(reader.pages)
+                    indices = range(page_count)
+                    if pages:
+                        shifted = [(start - offset, end - offset) for start, end in pages if end > offset]
+                        indices = page_indices([(max(start, 1), end) for start, end in shifted], page_count)
+                    offset += page_count
+                    if not indices:
                         continue
-                
-                # Add all pages from this PDF
-                for page_num in range(len(reader.pages)):
-                    page = reader.pages[page_num]
-                    writer.add_page(page)
+                    if merger:
+                        merger.add_reader(reader, indices)
+                    else:
+                        for page_num in indices:
+                            page = reader.pages[page_num]
+                            writer.add_page(page)
                 
                 processed_files.append(os.path.basename(path))
-                logging.info(f"Added {len(reader.pages)} pages from {os.path.basename(path)}")
+                logger.info("Added %s pages from %s", len(indices), os.path.basename(path))
                 
             except Exception as e:
-                logging.error(f"Error processing PDF {path}: {str(e)}")
+                logger.error(f"Error processing PDF {path}: {str(e)}")
                 continue
         
         if not processed_files:
-            logging.error("No valid PDF files were processed")
+            logger.error("No valid PDF files were processed")
+            if merger:
+                merger.abort()
             return False
         
         # Write the merged PDF
-        with open(output_path, 'wb') as output_file:
-            writer.write(output_file)
+        if merger:
+            merger.close()
+            merge_stats = merger.get_stats()
+            logger.info(
+                "Merged %s pages at %s pages/sec, %s bytes saved by sharing %s objects",
+                merge_stats['pages'], merge_stats['pages_per_second'],
+                merge_stats['bytes_saved'], merge_stats['objects_deduplicated']
+            )
+            if stats is not None:
+                stats.update(merge_stats)
+        else:
+            with open(output_path, 'wb') as output_file:
+                writer.write(output_file)
         
-        logging.info(f"Successfully merged {len(processed_files)} PDFs: {', '.join(processed_files)}")
+        logger.info("Successfully merged %s PDFs: %s", len(processed_files), ', '.join(processed_files))
         return True
         
     except Exception as e:
-        logging.error(f"PDF merge error: {str(e)}")
+        logger.error(f"PDF merge error: {str(e)}")
+        if merger:
+            merger.abort()
         return False
 
-def convert_multiple_images_to_pdf(input_paths, output_path, quality='high'):
+SPLIT_MODES = ('pages', 'every', 'ranges', 'bookmarks', 'extract')
+
+def split_plan(reader, mode, every=None, pages=None):
+    """
+    [(label, 0-based page indices)] for splitting a PDF:
+    'pages' one part per page, 'every' one part per `every` pages, 'ranges'
+    one part per range of parse_page_range() `pages`, 'bookmarks' one part
+    per top-level bookmark (from its page to the next one's) and 'extract'
+    a single part with all of `pages`. Raises ValueError for options that
+    do not fit the mode and PageRangeError for pages the document lacks.
+    """
+    count = len(reader.pages)
+    width = len(str(count))
+
+    def label(first, last):
+        return f"p{first:0{width}d}" if first == last else f"p{first:0{width}d}-{last:0{width}d}"
+
+    if mode == 'pages':
+        every = 1
+    if mode in ('pages', 'every'):
+        if not every or every < 1:
+            raise ValueError('every must be a positive number of pages')
+        return [(label(start + 1, min(start + every, count)), list(range(start, min(start + every, count))))
+                for start in range(0, count, every)]
+    if mode in ('ranges', 'extract'):
+        if not pages:
+            raise ValueError(f"{mode} needs page_range, e.g. 1-3,7")
+        if mode == 'extract':
+            indices = page_indices(pages, count)
+            if not indices:
+                raise PageRangeError(f"Document has {count} page(s)")
+            return [(format_page_range(pages).replace(',', '_'), indices)]
+        parts = []
+        for start, end in pages:
+            if start > count:
+                raise PageRangeError(f"Page {start} is beyond the document's {count} page(s)")
+            parts.append((label(start, min(end, count)), list(range(start - 1, min(end, count)))))
+        return parts
+    if mode == 'bookmarks':
+        starts = []
+        for item in reader.outline:
+            # Nested lists hold the children of the entry before them
+            if isinstance(item, list):
+                continue
+            page = reader.get_destination_page_number(item)
+            if page >= 0:
+                title = re.sub(r'[^\w\- ]+', '', str(item.title)).strip()[:60] or 'untitled'
+                starts.append((page, title))
+        if not starts:
+            raise PageRangeError('Document has no bookmarks')
+        starts.sort(key=lambda start: start[0])
+        if starts[0][0] > 0:
+            starts.insert(0, (0, 'front matter'))
+        parts = []
+        for i, (page, title) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else count
+            if end > page:
+                parts.append((f"{len(parts) + 1:02d} {title}", list(range(page, end))))
+        return parts
+    raise ValueError(f"Unknown split mode '{mode}', use one of {', '.join(SPLIT_MODES)}")
+
+@traced
+def split_pdf(input_path, output_dir, mode, name='part', every=None, pages=None, password=None,
+              input_password=None, stats=None):
+    """
+    Split a PDF into the parts of split_plan(), each written to output_dir
+    by its own StreamingPdfWriter; returns [(file name, path)] in document
+    order. Pages are parsed only when their part is written and the
+    reader's parsed objects are dropped after each part, so memory follows
+    the largest part rather than the document. password encrypts every
+    part, input_password opens an encrypted input. If stats is a dict it
+    receives pages, parts and seconds.
+    """
+    from PyPDF2 import PdfReader
+    from pdf_tools import StreamingPdfWriter, forget_parsed_objects
+    
+    start = time.perf_counter()
+    parts = []
+    with open(input_path, 'rb') as pdf_file:
+        reader = PdfReader(pdf_file)
+        if reader.is_encrypted and not (input_password and reader.decrypt(input_password)):
+            raise ValueError('PDF is password protected' if not input_password else 'Wrong input_password')
+        plan = split_plan(reader, mode, every, pages)
+        for label, indices in plan:
+            path = os.path.join(output_dir, f"part-{len(parts):06d}.pdf")
+            writer = StreamingPdfWriter(path, password=password)
+            try:
+                writer.add_reader(reader, indices)
+            except Exception:
+                writer.abort()
+                raise
+            writer.close()
+            parts.append((f"{name}_{label}.pdf", path))
+            forget_parsed_objects(reader)
+    
+    if stats is not None:
+        stats.update(pages=sum(len(indices) for _, indices in plan), parts=len(parts),
+                     seconds=round(time.perf_counter() - start, 4))
+    logger.info("Split %s into %s part(s) (%s)", os.path.basename(input_path), len(parts), mode)
+    return parts
+
+@instrument
+def convert_multiple_images_to_pdf(input_paths, output_path, quality='high', password=None):
     """
     Convert multiple images into a single PDF
     """
@@ -769,13 +1324,14 @@ def convert_multiple_images_to_pdf(input_paths, output_path, quality='high'):
             page_size = A4
         else:
             page_size = letter
+        profile = get_quality_profile(quality)
         
-        c = canvas.Canvas(output_path, pagesize=page_size)
+        c = canvas.Canvas(output_path, pagesize=page_size, encrypt=pdf_encryption(password))
         page_width, page_height = page_size
         
         for img_path in input_paths:
             if not os.path.exists(img_path):
-                logging.warning(f"Image file not found: {img_path}")
+                logger.warning(f"Image file not found: {img_path}")
                 continue
                 
             try:
@@ -799,9 +1355,14 @@ def convert_multiple_images_to_pdf(input_paths, output_path, quality='high'):
                     x = (page_width - new_width) / 2
                     y = (page_height - new_height) / 2
                     
+                    # Drop pixels beyond what the profile's DPI can show
+                    if profile['image_dpi']:
+                        target_dpi = profile['image_dpi'] / 72
+                        img.thumbnail((max(1, int(new_width * target_dpi)), max(1, int(new_height * target_dpi))))
+                    
                     # Save temporary file for reportlab
                     temp_img_path = f"{img_path}_temp.jpg"
-                    img.save(temp_img_path, 'JPEG', quality=85)
+                    img.save(temp_img_path, 'JPEG', quality=profile['jpeg_quality'])
                     
                     # Add image to PDF
                     c.drawImage(temp_img_path, x, y, width=new_width, height=new_height)
@@ -812,13 +1373,13 @@ def convert_multiple_images_to_pdf(input_paths, output_path, quality='high'):
                         os.remove(temp_img_path)
                         
             except Exception as e:
-                logging.error(f"Error processing image {img_path}: {str(e)}")
+                logger.error(f"Error processing image {img_path}: {str(e)}")
                 continue
         
         c.save()
-        logging.info(f"Successfully converted {len(input_paths)} images to PDF")
+        logger.info("Successfully converted %s images to PDF", len(input_paths))
         return True
         
     except Exception as e:
-        logging.error(f"Multiple images to PDF conversion error: {str(e)}")
+        logger.error(f"Multiple images to PDF conversion error: {str(e)}")
         return False
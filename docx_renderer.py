@@ -0,0 +1,600 @@
+import html
+import logging
+import re
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+# Markup in word/document.xml that the native renderer cannot draw
+# faithfully; documents containing any of it go to LibreOffice
+BODY_MARKERS = [
+    (b'<w:txbxContent', 'text box'),
+    (b'<wp:anchor', 'floating drawing'),
+    (b'<mc:AlternateContent', 'shape'),
+    (b'<w:pict', 'legacy drawing'),
+    (b'<w:object', 'embedded object'),
+    (b'<m:oMath', 'equation'),
+    (b'<w:footnoteReference', 'footnotes'),
+    (b'<w:endnoteReference', 'endnotes'),
+    (b'<w:commentReference', 'comments'),
+    (b'<w:ins ', 'tracked changes'),
+    (b'<w:del ', 'tracked changes'),
+    (b'<w:sdt>', 'content control'),
+    (b'<w:fldSimple', 'field'),
+    (b'<w:smartTag', 'smart tag'),
+    (b'<w:customXml', 'custom XML'),
+    (b'<w:framePr', 'frame'),
+    (b'<w:gridSpan', 'merged cells'),
+    (b'<w:vMerge', 'merged cells'),
+    (b'<w:bidi', 'right-to-left text'),
+    (b'<w:rtl', 'right-to-left text'),
+]
+MULTIPLE_COLUMNS = re.compile(rb'<w:cols [^>]*w:num="([2-9]|\d\d)"')
+TABLE_TAGS = re.compile(rb'<w:tbl>|</w:tbl>')
+TEXT_RUNS = re.compile(rb'<w:t(?: [^>]*)?>([^<]*)</w:t>')
+HEADER_FOOTER = re.compile(r'^word/(header|footer)\d*\.xml$')
+FIELD_INSTRUCTIONS = re.compile(rb'w:instr="\s*([A-Z]+)|<w:instrText[^>]*>\s*([A-Z]+)')
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+WP = '{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}'
+
+EMU_PER_POINT = 12700
+TWIPS_PER_POINT = 20
+
+# Word fonts mapped to the PDF standard fonts, by family
+SERIF_FONTS = {'times new roman', 'cambria', 'georgia', 'garamond', 'book antiqua', 'palatino linotype',
+               'century schoolbook', 'times'}
+MONOSPACE_FONTS = {'courier new', 'consolas', 'courier', 'lucida console', 'menlo', 'monaco'}
+
+# Placeholder for the PAGE field in headers and footers, filled in per page
+PAGE_NUMBER = '\ue000'
+
+
+class UnsupportedDocument(Exception):
+    """The document uses a feature the native renderer does not draw"""
+
+
+def unsupported_feature(path):
+    """
+    Return why a .docx should go to LibreOffice, or None if the native
+    renderer handles it. Only scans the package XML; the document itself
+    is not loaded.
+    """
+    try:
+        with zipfile.ZipFile(path) as package:
+            names = package.namelist()
+            body = package.read('word/document.xml')
+            for marker, reason in BODY_MARKERS:
+                if marker in body:
+                    return reason
+            if MULTIPLE_COLUMNS.search(body):
+                return 'multiple columns'
+            if body.count(b'<w:sectPr') > 1:
+                return 'multiple sections'
+            depth = 0
+            for tag in TABLE_TAGS.finditer(body):
+                depth += 1 if tag.group() == b'<w:tbl>' else -1
+                if depth > 1:
+                    return 'nested table'
+            # The standard PDF fonts only cover Latin-1 (cp1252)
+            text = html.unescape(b''.join(TEXT_RUNS.findall(body)).decode('utf-8'))
+            try:
+                text.encode('cp1252')
+            except UnicodeEncodeError:
+                return 'non-Latin text'
+            for name in names:
+                if name.startswith('word/media/') and name.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+                    return 'unsupported image format'
+                if HEADER_FOOTER.match(name):
+                    part = package.read(name)
+                    if b'<w:drawing' in part or b'<w:pict' in part or b'<mc:AlternateContent' in part:
+                        return 'graphic in header or footer'
+                    for simple, complex_field in FIELD_INSTRUCTIONS.findall(part):
+                        if (simple or complex_field) != b'PAGE':
+                            return 'field in header or footer'
+            if 'word/settings.xml' in names and b'<w:evenAndOddHeaders' in package.read('word/settings.xml'):
+                return 'odd and even headers'
+    except (zipfile.BadZipFile, KeyError, UnicodeDecodeError) as e:
+        return f'unreadable package ({e})'
+    return None
+
+
+def _points(length):
+    """python-docx Length (EMU) to points"""
+    return length / EMU_PER_POINT if length is not None else None
+
+
+def _font_family(name):
+    name = (name or '').lower()
+    if name in SERIF_FONTS:
+        return 'Times-Roman'
+    if name in MONOSPACE_FONTS:
+        return 'Courier'
+    return 'Helvetica'
+
+
+def _style_chain(style):
+    while style is not None:
+        yield style
+        style = style.base_style
+
+
+def _roman(number):
+    numerals = [(1000, 'm'), (900, 'cm'), (500, 'd'), (400, 'cd'), (100, 'c'), (90, 'xc'), (50, 'l'), (40, 'xl'),
+                (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i')]
+    result = ''
+    for value, numeral in numerals:
+        while number >= value:
+            result += numeral
+            number -= value
+    return result
+
+
+def _format_number(number, fmt):
+    if fmt == 'lowerLetter':
+        return chr(ord('a') + (number - 1) % 26)
+    if fmt == 'upperLetter':
+        return chr(ord('A') + (number - 1) % 26)
+    if fmt == 'lowerRoman':
+        return _roman(number)
+    if fmt == 'upperRoman':
+        return _roman(number).upper()
+    return str(number)
+
+
+class _Numbering:
+    """List labels for numbered and bulleted paragraphs, in document order"""
+
+    def __init__(self, document):
+        self.levels = {}  # (numId, ilvl) -> (format, level text, indent in points)
+        self.counters = {}
+        try:
+            numbering = document.part.numbering_part.element
+        except (KeyError, NotImplementedError):
+            return
+        abstract = {a.get(f'{W}abstractNumId'): a for a in numbering.findall(f'{W}abstractNum')}
+        for num in numbering.findall(f'{W}num'):
+            abstract_id = num.find(f'{W}abstractNumId')
+            definition = abstract.get(abstract_id.get(f'{W}val')) if abstract_id is not None else None
+            if definition is None:
+                continue
+            for level in definition.findall(f'{W}lvl'):
+                fmt = level.find(f'{W}numFmt')
+                text = level.find(f'{W}lvlText')
+                indent = level.find(f'{W}pPr/{W}ind')
+                left = indent.get(f'{W}left') or indent.get(f'{W}start') if indent is not None else None
+                self.levels[(num.get(f'{W}numId'), int(level.get(f'{W}ilvl')))] = (
+                    fmt.get(f'{W}val') if fmt is not None else 'decimal',
+                    text.get(f'{W}val') if text is not None else '',
+                    int(left) / TWIPS_PER_POINT if left else 18.0 * (int(level.get(f'{W}ilvl')) + 1),
+                )
+
+    def label(self, num_id, ilvl):
+        """(label text, indent in points) for the next item of a list level"""
+        level = self.levels.get((num_id, ilvl))
+        if level is None:
+            return None, None
+        fmt, text, indent = level
+        counts = self.counters.setdefault(num_id, [0] * 9)
+        counts[ilvl] += 1
+        for deeper in range(ilvl + 1, 9):
+            counts[deeper] = 0
+        if fmt == 'bullet':
+            return '•', indent
+        if fmt == 'none':
+            return '', indent
+        label = text
+        for index in range(ilvl + 1):
+            other_fmt = self.levels.get((num_id, index), ('decimal',))[0]
+            label = label.replace(f'%{index + 1}', _format_number(max(counts[index], 1), other_fmt))
+        return label, indent
+
+
+class _Renderer:
+    def __init__(self, document, width):
+        from docx.enum.style import WD_STYLE_TYPE
+        from reportlab.lib.styles import ParagraphStyle
+
+        self.document = document
+        self.width = width
+        self.numbering = _Numbering(document)
+        self.styles = {}
+        self.ParagraphStyle = ParagraphStyle
+        # python-docx resolves paragraph.style / run.style by scanning every
+        # style in the document on each access; resolve each chain once here
+        self.style_ids = {style.style_id: style for style in document.styles}
+        self.default_paragraph_style = next(
+            (style for style in document.styles
+             if style.type == WD_STYLE_TYPE.PARAGRAPH and style.element.default), None)
+        self.chains = {}
+        self.words = 0
+        self.default_size, self.default_font = self._document_defaults()
+        self.paragraph_defaults = self._paragraph_defaults()
+
+    def _paragraph_defaults(self):
+        """Spacing from docDefaults, where Word 2013+ keeps 'after 8pt, 1.08 lines'"""
+        defaults = {}
+        spacing = self.document.styles.element.find(f'{W}docDefaults/{W}pPrDefault/{W}pPr/{W}spacing')
+        if spacing is None:
+            return defaults
+        for attribute, key in ((f'{W}before', 'space_before'), (f'{W}after', 'space_after')):
+            if spacing.get(attribute) is not None:
+                defaults[key] = int(spacing.get(attribute)) * EMU_PER_POINT // TWIPS_PER_POINT
+        line = spacing.get(f'{W}line')
+        if line is not None:
+            if spacing.get(f'{W}lineRule', 'auto') == 'auto':
+                defaults['line_spacing'] = int(line) / 240
+            else:
+                defaults['line_spacing'] = int(line) * EMU_PER_POINT // TWIPS_PER_POINT
+        return defaults
+
+    def _document_defaults(self):
+        size, font = 11.0, 'Helvetica'
+        defaults = self.document.styles.element.find(f'{W}docDefaults/{W}rPrDefault/{W}rPr')
+        if defaults is not None:
+            sz = defaults.find(f'{W}sz')
+            if sz is not None:
+                size = int(sz.get(f'{W}val')) / 2
+            fonts = defaults.find(f'{W}rFonts')
+            if fonts is not None and fonts.get(f'{W}ascii'):
+                font = _font_family(fonts.get(f'{W}ascii'))
+        return size, font
+
+    def _chain(self, style_id, default=None):
+        key = (style_id, default is None)
+        chain = self.chains.get(key)
+        if chain is None:
+            chain = self.chains[key] = list(_style_chain(self.style_ids.get(style_id, default)))
+        return chain
+
+    def _paragraph_styles(self, paragraph):
+        pPr = paragraph._p.pPr
+        style_id = pPr.pStyle.val if pPr is not None and pPr.pStyle is not None else None
+        return self._chain(style_id, self.default_paragraph_style)
+
+    def _run_styles(self, run):
+        rPr = run._r.rPr
+        style_id = rPr.rStyle.val if rPr is not None and rPr.rStyle is not None else None
+        return self._chain(style_id) if style_id else []
+
+    # Effective formatting: direct, then character style, then paragraph style chain
+
+    def _run_value(self, run, paragraph, attribute):
+        value = getattr(run.font, attribute)
+        if value is not None:
+            return value
+        for style in self._run_styles(run) + self._paragraph_styles(paragraph):
+            value = getattr(style.font, attribute)
+            if value is not None:
+                return value
+        return None
+
+    def _paragraph_value(self, paragraph, attribute):
+        value = getattr(paragraph.paragraph_format, attribute)
+        if value is not None:
+            return value
+        for style in self._paragraph_styles(paragraph):
+            value = getattr(style.paragraph_format, attribute)
+            if value is not None:
+                return value
+        return self.paragraph_defaults.get(attribute)
+
+    def _paragraph_font(self, paragraph):
+        size = font = None
+        for style in self._paragraph_styles(paragraph):
+            size = size or _points(style.font.size)
+            font = font or style.font.name
+        return size or self.default_size, _font_family(font) if font else self.default_font
+
+    def _run_markup(self, run, paragraph, text):
+        markup = escape(text).replace('\t', '&nbsp;' * 4).replace('\n', '<br/>')
+        if not markup:
+            return ''
+        size = _points(self._run_value(run, paragraph, 'size'))
+        name = self._run_value(run, paragraph, 'name')
+        color = run.font.color.rgb if run.font.color is not None and run.font.color.type is not None else None
+        if color is None:
+            for style in self._paragraph_styles(paragraph):
+                if style.font.color is not None and style.font.color.type is not None and style.font.color.rgb:
+                    color = style.font.color.rgb
+                    break
+        attributes = []
+        if name:
+            attributes.append(f'name="{_font_family(name)}"')
+        if size:
+            attributes.append(f'size="{size:g}"')
+        if color is not None:
+            attributes.append(f'color="#{color}"')
+        if attributes:
+            markup = f'<font {" ".join(attributes)}>{markup}</font>'
+        if self._run_value(run, paragraph, 'bold'):
+            markup = f'<b>{markup}</b>'
+        if self._run_value(run, paragraph, 'italic'):
+            markup = f'<i>{markup}</i>'
+        if self._run_value(run, paragraph, 'underline'):
+            markup = f'<u>{markup}</u>'
+        if self._run_value(run, paragraph, 'strike'):
+            markup = f'<strike>{markup}</strike>'
+        if self._run_value(run, paragraph, 'superscript'):
+            markup = f'<super>{markup}</super>'
+        elif self._run_value(run, paragraph, 'subscript'):
+            markup = f'<sub>{markup}</sub>'
+        return markup
+
+    def _style(self, paragraph, indent=None):
+        from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+        size, font = self._paragraph_font(paragraph)
+        alignment = {
+            WD_ALIGN_PARAGRAPH.CENTER: TA_CENTER,
+            WD_ALIGN_PARAGRAPH.RIGHT: TA_RIGHT,
+            WD_ALIGN_PARAGRAPH.JUSTIFY: TA_JUSTIFY,
+        }.get(self._paragraph_value(paragraph, 'alignment'), TA_LEFT)
+        line_spacing = self._paragraph_value(paragraph, 'line_spacing')
+        if line_spacing is None:
+            leading = size * 1.2
+        elif isinstance(line_spacing, float):
+            leading = size * 1.2 * line_spacing
+        else:
+            leading = _points(line_spacing)
+        left = _points(self._paragraph_value(paragraph, 'left_indent')) or 0
+        first_line = _points(self._paragraph_value(paragraph, 'first_line_indent')) or 0
+        if indent is not None:
+            left, first_line = indent, 0
+        key = (font, size, alignment, round(leading, 2), left, first_line,
+               _points(self._paragraph_value(paragraph, 'space_before')) or 0,
+               _points(self._paragraph_value(paragraph, 'space_after')) or 0,
+               bool(self._paragraph_value(paragraph, 'keep_with_next')))
+        style = self.styles.get(key)
+        if style is None:
+            style = self.styles[key] = self.ParagraphStyle(
+                f'docx{len(self.styles)}', fontName=key[0], fontSize=size, leading=leading, autoLeading='max',
+                alignment=alignment, leftIndent=left, firstLineIndent=first_line,
+                spaceBefore=key[6], spaceAfter=key[7], keepWithNext=key[8], bulletFontName=font,
+                bulletFontSize=size, bulletIndent=max(left - 14, 0))
+        return style
+
+    def _num_pr(self, paragraph):
+        """(numId, ilvl) from the paragraph or its style, or None"""
+        sources = [paragraph._p.pPr] + [style.element.pPr for style in self._paragraph_styles(paragraph)]
+        for pPr in sources:
+            if pPr is not None and pPr.numPr is not None and pPr.numPr.numId is not None:
+                ilvl = pPr.numPr.ilvl.val if pPr.numPr.ilvl is not None else 0
+                return str(pPr.numPr.numId.val), ilvl
+        return None
+
+    def _image(self, drawing, part):
+        from reportlab.platypus import Image
+
+        blip = drawing.find(f'.//{A}blip')
+        extent = drawing.find(f'.//{WP}extent')
+        if blip is None or extent is None:
+            return None
+        image_part = part.related_parts[blip.get(f'{R}embed')]
+        width = int(extent.get('cx')) / EMU_PER_POINT
+        height = int(extent.get('cy')) / EMU_PER_POINT
+        if width > self.width:
+            width, height = self.width, height * self.width / width
+        return Image(BytesIO(image_part.blob), width=width, height=height)
+
+    def paragraph(self, paragraph, part):
+        """Flowables for one paragraph: text, inline images and page breaks in order"""
+        from docx.text.hyperlink import Hyperlink
+        from reportlab.platypus import PageBreak, Paragraph
+
+        flowables = []
+        self.words += len(paragraph.text.split())
+        if self._paragraph_value(paragraph, 'page_break_before'):
+            flowables.append(PageBreak())
+
+        label, indent = None, None
+        num_pr = self._num_pr(paragraph)
+        if num_pr is not None:
+            label, indent = self.numbering.label(*num_pr)
+        style = self._style(paragraph, indent)
+
+        pieces = []
+
+        def flush():
+            if pieces or label is not None:
+                text = ''.join(pieces) or '&nbsp;'
+                flowables.append(Paragraph(text, style, bulletText=label) if label else Paragraph(text, style))
+                pieces.clear()
+
+        def add_run(run, link=None):
+            text = []
+            for child in run._r:
+                tag = child.tag
+                if tag == f'{W}t':
+                    text.append(child.text or '')
+                elif tag == f'{W}tab':
+                    text.append('\t')
+                elif tag in (f'{W}br', f'{W}cr'):
+                    if child.get(f'{W}type') == 'page':
+                        pieces.append(self._run_markup(run, paragraph, ''.join(text)))
+                        text.clear()
+                        flush()
+                        flowables.append(PageBreak())
+                    else:
+                        text.append('\n')
+                elif tag == f'{W}noBreakHyphen':
+                    text.append('-')
+                elif tag == f'{W}drawing':
+                    pieces.append(self._run_markup(run, paragraph, ''.join(text)))
+                    text.clear()
+                    image = self._image(child, part)
+                    if image is not None:
+                        if pieces and any(pieces):
+                            flush()
+                        flowables.append(image)
+                        pieces.clear()
+            markup = self._run_markup(run, paragraph, ''.join(text))
+            if link and markup:
+                markup = f'<a href="{escape(link)}" color="blue"><u>{markup}</u></a>'
+            pieces.append(markup)
+
+        for item in paragraph.iter_inner_content():
+            if isinstance(item, Hyperlink):
+                for run in item.runs:
+                    add_run(run, item.address)
+            else:
+                add_run(item)
+
+        if any(pieces) or label is not None:
+            flush()
+        elif not any(not isinstance(f, PageBreak) for f in flowables):
+            # Empty paragraphs are vertical space in Word
+            flowables.append(Paragraph('&nbsp;', style))
+        return flowables
+
+    def table(self, table, part):
+        from reportlab.lib import colors
+        from reportlab.platypus import Table, TableStyle
+
+        rows = []
+        for row in table.rows:
+            cells = []
+            for cell in row.cells:
+                if cell.tables:
+                    raise UnsupportedDocument('nested table')
+                content = []
+                for paragraph in cell.paragraphs:
+                    content.extend(self.paragraph(paragraph, part))
+                cells.append(content)
+            rows.append(cells)
+        if not rows:
+            return []
+
+        widths = [_points(column.width) for column in table.columns]
+        if None in widths or not widths:
+            widths = [self.width / len(rows[0])] * len(rows[0])
+        total = sum(widths)
+        if total > self.width:
+            widths = [width * self.width / total for width in widths]
+
+        commands = [('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                    ('LEFTPADDING', (0, 0), (-1, -1), 5.4), ('RIGHTPADDING', (0, 0), (-1, -1), 5.4)]
+        if self._has_borders(table):
+            commands.append(('GRID', (0, 0), (-1, -1), 0.5, colors.black))
+        for row_index, row in enumerate(table.rows):
+            for column_index, cell in enumerate(row.cells):
+                shading = cell._tc.find(f'{W}tcPr/{W}shd')
+                fill = shading.get(f'{W}fill') if shading is not None else None
+                if fill and fill != 'auto':
+                    commands.append(('BACKGROUND', (column_index, row_index), (column_index, row_index),
+                                     colors.HexColor(f'#{fill}')))
+        return [Table(rows, colWidths=widths, style=TableStyle(commands), hAlign='LEFT', repeatRows=0)]
+
+    def _has_borders(self, table):
+        tblPr = table._tbl.tblPr
+        style = tblPr.find(f'{W}tblStyle') if tblPr is not None else None
+        elements = [tblPr]
+        if style is not None:
+            elements += [style.element.find(f'{W}tblPr') for style in self._chain(style.get(f'{W}val'))]
+        for element in elements:
+            borders = element.find(f'{W}tblBorders') if element is not None else None
+            if borders is not None:
+                return any(border.get(f'{W}val') not in ('nil', 'none') for border in borders)
+        return False
+
+    def header_footer_markup(self, header):
+        """(style, markup) per paragraph of a header or footer, PAGE fields as placeholders"""
+        if header is None or header.is_linked_to_previous:
+            return []
+        paragraphs = []
+        for paragraph in header.paragraphs:
+            pieces = []
+            in_field_result = False
+            for element in paragraph._p.iter(f'{W}r', f'{W}fldSimple'):
+                if element.tag == f'{W}fldSimple':
+                    pieces.append(PAGE_NUMBER)
+                    continue
+                if element.getparent().tag == f'{W}fldSimple':
+                    continue
+                # Field codes and their results may share a run with text
+                for child in element:
+                    if child.tag == f'{W}fldChar':
+                        in_field_result = child.get(f'{W}fldCharType') == 'separate'
+                    elif child.tag == f'{W}instrText' and pieces[-1:] != [PAGE_NUMBER]:
+                        pieces.append(PAGE_NUMBER)
+                    elif child.tag == f'{W}t' and not in_field_result:
+                        pieces.append(escape(child.text or ''))
+                    elif child.tag == f'{W}tab' and not in_field_result:
+                        pieces.append('&nbsp;' * 4)
+            markup = ''.join(pieces)
+            if markup.strip():
+                paragraphs.append((self._style(paragraph), markup))
+        return paragraphs
+
+
+def render_docx(input_path, output_path, encrypt=None, max_blocks=None, stats=None):
+    """
+    Draw a .docx with reportlab: paragraphs with run formatting, headings,
+    lists, tables, inline images, page breaks and text headers/footers.
+    Check unsupported_feature() first; raises UnsupportedDocument for
+    anything it finds that only LibreOffice can lay out. max_blocks stops
+    after that many flowables, for previews. If stats is a dict it receives
+    the word count of the rendered paragraphs.
+    """
+    from docx import Document
+    from docx.table import Table as DocxTable
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    document = Document(input_path)
+    section = document.sections[0]
+    page_width, page_height = _points(section.page_width) or 612, _points(section.page_height) or 792
+    left, right = _points(section.left_margin) or 72, _points(section.right_margin) or 72
+    top, bottom = _points(section.top_margin) or 72, _points(section.bottom_margin) or 72
+
+    renderer = _Renderer(document, page_width - left - right)
+    story = []
+    for item in document.iter_inner_content():
+        if max_blocks is not None and len(story) >= max_blocks:
+            break
+        if isinstance(item, DocxTable):
+            story.extend(renderer.table(item, document.part))
+        else:
+            story.extend(renderer.paragraph(item, document.part))
+
+    header = renderer.header_footer_markup(section.header)
+    footer = renderer.header_footer_markup(section.footer)
+    first_header, first_footer = header, footer
+    if section.different_first_page_header_footer:
+        first_header = renderer.header_footer_markup(section.first_page_header)
+        first_footer = renderer.header_footer_markup(section.first_page_footer)
+    header_distance = _points(section.header_distance) or 36
+    footer_distance = _points(section.footer_distance) or 36
+
+    def draw_block(canvas, paragraphs, page, y, from_top):
+        for style, markup in paragraphs:
+            flowable = Paragraph(markup.replace(PAGE_NUMBER, str(page)), style)
+            _, height = flowable.wrapOn(canvas, page_width - left - right, page_height)
+            if from_top:
+                y -= height
+                flowable.drawOn(canvas, left, y)
+            else:
+                flowable.drawOn(canvas, left, y)
+                y += height
+
+    def decorate(header_paragraphs, footer_paragraphs):
+        def on_page(canvas, doc):
+            canvas.saveState()
+            draw_block(canvas, header_paragraphs, doc.page, page_height - header_distance, True)
+            draw_block(canvas, list(reversed(footer_paragraphs)), doc.page, footer_distance, False)
+            canvas.restoreState()
+        return on_page
+
+    core = document.core_properties
+    pdf = SimpleDocTemplate(output_path, pagesize=(page_width, page_height), leftMargin=left, rightMargin=right,
+                            topMargin=top, bottomMargin=bottom, encrypt=encrypt,
+                            title=core.title or '', author=core.author or '', subject=core.subject or '')
+    pdf.build(story, onFirstPage=decorate(first_header, first_footer), onLaterPages=decorate(header, footer))
+    if stats is not None:
+        stats['word_count'] = renderer.words
+    return True
@@ -0,0 +1,52 @@
+# Loaded automatically by gunicorn from the working directory (or with -c).
+# Command line options such as --bind and --workers still take precedence.
+import gc
+import os
+import shutil
+import tempfile
+
+# prometheus_client reads this when first imported, so it is set before the
+# app is loaded and every worker shares one metrics directory
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'fily-metrics'))
+# With --preload the app (and metrics) are imported before on_starting runs
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# Import the app and warm it up once in the master; workers inherit the
+# loaded libraries and caches through copy-on-write instead of each
+# paying for them on their first request
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+warmup_enabled = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+
+# Threads let a worker keep serving light jobs while another of its
+# requests waits for a heavy scheduler slot (see scheduler.py)
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    """Start each server run with empty metrics, not the last run's totals"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    """Runs in the master after the preload and before the first fork"""
+    if server.cfg.preload_app and warmup_enabled:
+        from warmup import warm_up
+        warm_up()
+    if server.cfg.preload_app:
+        # Keep the collector from writing to (and so copying) shared objects
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    """Without --preload each worker warms itself up before serving"""
+    if not worker.cfg.preload_app and warmup_enabled:
+        from warmup import warm_up
+        warm_up()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges (counters and histograms are kept)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,310 @@
+import argparse
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import shutil
+import signal
+import struct
+import sys
+import time
+
+from batch_convert import Dispatcher, Manifest, make_job, parse_limits
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = '.hotfolder-manifest.jsonl'
+# Names writers commonly give a file until it is complete
+PARTIAL_SUFFIXES = ('.part', '.partial', '.tmp', '.crdownload', '.download')
+# Entries kept as the cursor: a file in one of these states is not picked up again until it changes
+FINISHED_STATUSES = ('converted', 'copied', 'failed')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+class InotifyWatcher:
+    """Reports the folders in which a file was created, written or moved in"""
+
+    def __init__(self, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = {}
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f'Cannot watch {folder}')
+            self.folders[wd] = folder
+
+    def wait(self, timeout):
+        """Folders with events within timeout seconds; every folder after a queue overflow"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        changed = set()
+        while ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.folders.values())
+                elif wd in self.folders:
+                    changed.add(self.folders[wd])
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Fallback without inotify, and for network shares, where inotify does
+    not see writes made by other hosts. A folder is listed only when its
+    mtime moved, which any create, rename or delete in it does.
+    """
+
+    def __init__(self, folders, interval):
+        self.interval = interval
+        self.mtimes = dict.fromkeys(folders)
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        changed = set()
+        for folder, previous in self.mtimes.items():
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if mtime != previous:
+                self.mtimes[folder] = mtime
+                changed.add(folder)
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(folders, poll_interval, polling=False):
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify unavailable (%s), polling every %ss", e, poll_interval)
+    return PollingWatcher(folders, poll_interval)
+
+
+def _atomic_copy(source, destination):
+    partial = os.path.join(os.path.dirname(destination), f".{os.path.basename(destination)}.part")
+    shutil.copyfile(source, partial)
+    os.replace(partial, destination)
+
+
+def _atomic_write_json(data, destination):
+    partial = os.path.join(os.path.dirname(destination), f".{os.path.basename(destination)}.part")
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(partial, destination)
+
+
+class HotFolder:
+    """
+    Converts each file dropped into an input folder once it has stopped
+    changing for `settle` seconds. PDFs are published into
+    OUTPUT/done/<folder>/, inputs that failed are copied with an error
+    report into OUTPUT/failed/<folder>/, both by rename so readers never
+    see a partial file. The manifest in OUTPUT is the cursor: a file whose
+    size and mtime match its entry is not processed again, across
+    restarts included.
+    """
+
+    def __init__(self, inputs, output_root, jobs, limits, quality='high', settle=2.0, poll_interval=2.0,
+                 rescan_interval=60.0, polling=False):
+        self.folders = {}  # folder name in the output tree -> input folder
+        for folder in inputs:
+            name = os.path.basename(os.path.normpath(folder))
+            if name in self.folders:
+                raise ValueError(f"Input folders {self.folders[name]} and {folder} share the name '{name}'")
+            self.folders[name] = os.path.abspath(folder)
+        self.done_root = os.path.join(output_root, 'done')
+        self.failed_root = os.path.join(output_root, 'failed')
+        for name in self.folders:
+            os.makedirs(os.path.join(self.done_root, name), exist_ok=True)
+            os.makedirs(os.path.join(self.failed_root, name), exist_ok=True)
+        self.limits = limits
+        self.quality = quality
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.manifest = Manifest(os.path.join(output_root, STATE_NAME))
+        # Entries of deleted inputs would only grow the cursor; those of folders not watched now are kept
+        self.manifest.compact(lambda entry: entry['path'].partition('/')[0] not in self.folders
+                              or os.path.exists(self._source(entry['path'])))
+        self.dispatcher = Dispatcher(jobs, limits, self.manifest.outputs_by_content(self.done_root))
+        self.watcher = create_watcher(list(self.folders.values()), poll_interval, polling)
+        self.candidates = {}  # key -> ((size, mtime_ns), unchanged since)
+        self.queued = {}  # key -> output path of the files handed to the dispatcher
+        self.stopping = False
+        self._scanned_at = 0.0
+
+    def _source(self, key):
+        name, _, filename = key.partition('/')
+        return os.path.join(self.folders[name], filename)
+
+    def scan(self, name):
+        """Note the new or changed files of one input folder as candidates"""
+        from converter import ALLOWED_EXTENSIONS
+
+        try:
+            with os.scandir(self.folders[name]) as it:
+                entries = [entry for entry in it if not entry.name.startswith(('.', '~$'))
+                           and not entry.name.lower().endswith(PARTIAL_SUFFIXES)
+                           and os.path.splitext(entry.name)[1].lower().lstrip('.') in ALLOWED_EXTENSIONS
+                           and entry.is_file(follow_symlinks=False)]
+        except FileNotFoundError:
+            logger.warning("Input folder %s is missing", self.folders[name])
+            return
+        now = time.monotonic()
+        for entry in entries:
+            key = f"{name}/{entry.name}"
+            if key in self.queued:
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if self.manifest.is_done(key, stat, self.quality, FINISHED_STATUSES):
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if key not in self.candidates or self.candidates[key][0] != signature:
+                self.candidates[key] = (signature, now)
+
+    def dispatch_settled(self):
+        """Queue the candidates whose size and mtime held still for settle seconds"""
+        now = time.monotonic()
+        for key, (signature, since) in list(self.candidates.items()):
+            path = self._source(key)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.candidates[key]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != signature:
+                self.candidates[key] = ((stat.st_size, stat.st_mtime_ns), now)
+            elif now - since >= self.settle:
+                del self.candidates[key]
+                self.queued[key] = self._output_path(key)
+                self.dispatcher.add(*make_job(path, key, self.queued[key], self.done_root, stat,
+                                              self.limits, self.quality))
+
+    def _output_path(self, key):
+        name, _, filename = key.partition('/')
+        output = os.path.join(self.done_root, name, os.path.splitext(filename)[0] + '.pdf')
+        owned = self.manifest.entries.get(key, {}).get('output') == os.path.relpath(output, self.done_root)
+        # Keep the extension when the stem's PDF belongs to another input (report.docx and report.txt)
+        if not owned and (os.path.exists(output) or output in self.queued.values()):
+            output = os.path.join(self.done_root, name, filename + '.pdf')
+        return output
+
+    def finish(self, job, entry):
+        key = entry['path']
+        self.queued.pop(key, None)
+        if entry['status'] == 'failed':
+            name, _, filename = key.partition('/')
+            failed = os.path.join(self.failed_root, name, filename)
+            try:
+                _atomic_copy(job['source'], failed)
+                _atomic_write_json(entry, failed + '.error.json')
+            except OSError as e:
+                logger.error("Could not move failed input %s aside: %s", key, e)
+            logger.warning("Conversion of %s failed: %s", key, entry.get('error'))
+        else:
+            logger.info("Published %s as done/%s (%s)", key, entry['output'], entry['status'])
+        self.manifest.record(entry)
+
+    def run_once(self):
+        if self.dispatcher.busy():
+            timeout = 0.2
+        elif self.candidates:
+            timeout = min(self.poll_interval, max(self.settle / 4, 0.05))
+        else:
+            timeout = self.poll_interval
+        changed = self.watcher.wait(timeout)
+        names = {name for name, folder in self.folders.items() if folder in changed}
+        if time.monotonic() - self._scanned_at >= self.rescan_interval:
+            # Safety net for events a watcher cannot see, such as writes on a network share
+            names = set(self.folders)
+            self._scanned_at = time.monotonic()
+        for name in names:
+            self.scan(name)
+        self.dispatch_settled()
+        for job, entry in self.dispatcher.collect(0):
+            self.finish(job, entry)
+
+    def serve(self):
+        logger.info("Watching %s", ', '.join(self.folders.values()))
+        try:
+            while not self.stopping:
+                self.run_once()
+            # Finish what the workers started; waiting jobs are picked up again after a restart
+            self.dispatcher.drop_waiting()
+            while self.dispatcher.busy():
+                for job, entry in self.dispatcher.collect(1.0):
+                    self.finish(job, entry)
+        finally:
+            self.close()
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def close(self):
+        self.watcher.close()
+        self.dispatcher.close()
+        self.manifest.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Watch input folders and convert every file dropped into them to PDF')
+    parser.add_argument('--input', action='append', required=True, help='folder to watch (repeatable)')
+    parser.add_argument('--output', required=True, help='folder that receives done/ and failed/')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--limit', action='append', metavar='TYPE=N',
+                        help='most files of a type converted at once, as for batch_convert.py')
+    parser.add_argument('--quality', default='high', choices=['high', 'medium', 'low'])
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='seconds a file must stay unchanged before it is converted')
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--polling', action='store_true', help='poll even where inotify is available')
+    args = parser.parse_args(argv)
+
+    from logging_config import configure_logging
+    configure_logging()
+    for folder in args.input:
+        if not os.path.isdir(folder):
+            parser.error(f"{folder} is not a directory")
+    try:
+        limits = parse_limits(args.limit, args.jobs)
+        hotfolder = HotFolder(args.input, args.output, max(1, args.jobs), limits, quality=args.quality,
+                              settle=args.settle, poll_interval=args.poll_interval, polling=args.polling)
+    except ValueError as e:
+        parser.error(str(e))
+    signal.signal(signal.SIGTERM, hotfolder.stop)
+    signal.signal(signal.SIGINT, hotfolder.stop)
+    hotfolder.serve()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_PATTERN = re.compile(r'^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})')
+# Directory of each swept folder holding the reservations of running jobs
+RESERVATIONS_DIR = '.reserved'
+
+
+@contextmanager
+def in_use(*paths):
+    """
+    Hold a shared lock on files for the duration of a job. The janitor
+    takes an exclusive non-blocking lock before deleting, so a file held
+    here by any worker process is never removed. Missing paths are ignored.
+    """
+    handles = []
+    try:
+        for path in paths:
+            if fcntl is None or not path or not os.path.exists(path):
+                continue
+            handle = open(path, 'rb')
+            fcntl.flock(handle, fcntl.LOCK_SH)
+            handles.append(handle)
+        yield
+    finally:
+        for handle in handles:
+            handle.close()
+
+
+@contextmanager
+def reserve(*prefixes):
+    """
+    Keep the janitor away from files a job is about to create: every file
+    of a prefix's folder whose name starts with the prefix's basename, until
+    the block exits. in_use() locks an inode, so it cannot cover a file
+    before it is written, nor after a rename replaces it (LibreOffice
+    output, the .opt and .pages passes). Enter it before the first file
+    is created and leave it once the conversion record is stored.
+    """
+    handles = []
+    try:
+        for prefix in prefixes:
+            if fcntl is None or not prefix:
+                continue
+            directory, name = os.path.split(prefix)
+            directory = os.path.join(directory, RESERVATIONS_DIR)
+            os.makedirs(directory, exist_ok=True)
+            token = uuid.uuid4().hex
+            # Locked before it becomes visible, so the janitor never takes it for a dead job's
+            handle = open(os.path.join(directory, f".{token}"), 'w')
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            visible = os.path.join(directory, f"{token}~{name}")
+            os.rename(handle.name, visible)
+            handles.append((handle, visible))
+        yield
+    finally:
+        for handle, visible in handles:
+            try:
+                os.remove(visible)
+            except FileNotFoundError:
+                pass
+            handle.close()
+
+
+def _held_reservations(folder):
+    """Name prefixes reserved by running jobs in folder; reservations of dead processes are removed"""
+    directory = os.path.join(folder, RESERVATIONS_DIR)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    prefixes = []
+    for name in names:
+        _, separator, prefix = name.partition('~')
+        if not separator or name.startswith('.'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'rb') as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    prefixes.append(prefix)
+                    continue
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+    return prefixes
+
+
+def touch(path):
+    """Record a download by bumping the file's access time (keeps mtime)"""
+    try:
+        stat = os.stat(path)
+        os.utime(path, (time.time(), stat.st_mtime))
+    except OSError as e:
+        logger.warning(f"Could not update access time for {path}: {e}")
+
+
+class FolderIndex:
+    """
+    Size and last-use index of one folder, ordered least-recently-used
+    first. Hardlinked names (deduplicated uploads) share one inode, so its
+    size counts once and is only freed when its last name goes.
+    """
+
+    def __init__(self, path, max_age_seconds, max_bytes):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.entries = {}  # file name -> (last_used, size, (st_ino, st_dev))
+        self.links = Counter()  # (st_ino, st_dev) -> names indexed
+        self.heap = []  # (last_used, file name), may hold stale entries
+        self.total_bytes = 0
+        self._dir_mtime = None
+        self._deferred = []  # in-use files pushed back after a sweep
+
+    def refresh(self):
+        """Rescan the folder, but only when entries were added or removed"""
+        try:
+            dir_mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if dir_mtime == self._dir_mtime:
+            return
+        self._dir_mtime = dir_mtime
+
+        entries = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.name in self.entries:
+                    # Known file: its heap entry is revalidated when it reaches the top
+                    entries[entry.name] = self.entries[entry.name]
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                entries[entry.name] = (max(stat.st_atime, stat.st_mtime), stat.st_size, (stat.st_ino, stat.st_dev))
+                heapq.heappush(self.heap, (entries[entry.name][0], entry.name))
+
+        self.entries = entries
+        self.links = Counter(inode for _, _, inode in entries.values())
+        self.total_bytes = sum({inode: size for _, size, inode in entries.values()}.values())
+
+    def sweep(self, now, on_delete):
+        """Delete expired files, then least-recently-used ones until under quota"""
+        deleted = 0
+        # Listed after refresh(): a reservation is taken before its files exist, so it is seen here
+        reserved = None
+        while self.heap:
+            last_used, name = self.heap[0]
+            expired = self.max_age_seconds is not None and last_used < now - self.max_age_seconds
+            over_quota = self.max_bytes is not None and self.total_bytes > self.max_bytes
+            if not expired and not over_quota:
+                break
+
+            heapq.heappop(self.heap)
+            current = self.entries.get(name)
+            if current is None or current[0] != last_used:
+                continue  # stale heap entry
+
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._forget(name)
+                continue
+
+            # A download may have touched it since it was indexed
+            actual_last_used = max(stat.st_atime, stat.st_mtime)
+            if actual_last_used > last_used:
+                self.total_bytes += stat.st_size - current[1]
+                self.entries[name] = (actual_last_used, stat.st_size, current[2])
+                heapq.heappush(self.heap, (actual_last_used, name))
+                continue
+
+            if reserved is None:
+                reserved = _held_reservations(self.path) if fcntl is not None else []
+            if any(name.startswith(prefix) for prefix in reserved) or not _delete_if_unused(path):
+                # In use by a job; look at it again on the next sweep
+                self._deferred.append((last_used, name))
+                continue
+
+            self._forget(name)
+            deleted += 1
+            on_delete(path, 'expired' if expired else 'quota')
+
+        for item in self._deferred:
+            heapq.heappush(self.heap, item)
+        self._deferred.clear()
+        return deleted
+
+    def _forget(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+        _, size, inode = entry
+        self.links[inode] -= 1
+        if not self.links[inode]:
+            del self.links[inode]
+            self.total_bytes -= size
+
+
+def _delete_if_unused(path):
+    """Remove path unless another process holds a lock on it"""
+    if fcntl is None:
+        os.remove(path)
+        return True
+    try:
+        with open(path, 'rb') as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            os.remove(path)
+            return True
+    except FileNotFoundError:
+        return True
+
+
+class Janitor:
+    """
+    Background cleaner for uploads/, converted/ and temp/. Every worker
+    process starts one, but only the process holding the host-wide lock
+    file sweeps; the others take over if it exits.
+    """
+
+    def __init__(self, folders, lock_path, interval=60, on_expire=None, on_sweep=None):
+        self.indexes = [FolderIndex(path, max_age, max_bytes) for path, max_age, max_bytes in folders]
+        self.lock_path = lock_path
+        self.interval = interval
+        self.on_expire = on_expire
+        self.on_sweep = on_sweep
+        self._lock_handle = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        """Refresh the indexes and sweep every folder; returns files deleted"""
+        now = time.time()
+        deleted = 0
+        for index in self.indexes:
+            try:
+                index.refresh()
+                deleted += index.sweep(now, self._deleted)
+            except Exception as e:
+                logger.error(f"Janitor error in {index.path}: {e}")
+        if self.on_sweep:
+            try:
+                self.on_sweep()
+            except Exception as e:
+                logger.error(f"Janitor error after sweep: {e}")
+        return deleted
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._acquire_host_lock():
+                self.run_once()
+            self._stop.wait(self.interval)
+
+    def _acquire_host_lock(self):
+        if self._lock_handle is not None or fcntl is None:
+            return True
+        handle = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._lock_handle = handle
+        logger.info("Janitor running in process %s", os.getpid())
+        return True
+
+    def _deleted(self, path, reason):
+        logger.info("Janitor removed %s (%s)", path, reason)
+        match = FILE_ID_PATTERN.match(os.path.basename(path))
+        if match and self.on_expire:
+            self.on_expire(match.group(1), path)
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def start_janitor(app, storage=None, blobs=None):
+    """
+    Create and start the janitor from app config and environment. With a
+    blob store, upload blobs whose names have all been swept go too; with
+    storage, conversion records past HISTORY_RETENTION_DAYS.
+    """
+    hour = 3600
+    megabyte = 1024 * 1024
+    folders = [
+        (app.config['UPLOAD_FOLDER'],
+         _env_number('UPLOAD_MAX_AGE_HOURS', 24) * hour,
+         _env_number('UPLOAD_QUOTA_MB', 2048) * megabyte),
+        (app.config['CONVERTED_FOLDER'],
+         _env_number('CONVERTED_MAX_AGE_HOURS', 72) * hour,
+         _env_number('CONVERTED_QUOTA_MB', 4096) * megabyte),
+        (app.config['TEMP_FOLDER'],
+         _env_number('TEMP_MAX_AGE_HOURS', 1) * hour,
+         _env_number('TEMP_QUOTA_MB', 1024) * megabyte),
+    ]
+    if storage is not None:
+        # Batch manifests only list converted files, so they expire with them
+        folders.append((storage.batches_dir, _env_number('CONVERTED_MAX_AGE_HOURS', 72) * hour, None))
+
+    def mark_expired(file_id, path):
+        if storage is not None and os.path.dirname(path) == app.config['CONVERTED_FOLDER']:
+            storage.mark_expired(file_id)
+
+    retention_days = _env_number('HISTORY_RETENTION_DAYS', 365)
+
+    def after_sweep():
+        if blobs is not None:
+            blobs.collect()
+        if storage is not None and retention_days > 0:
+            storage.prune_history(retention_days)
+
+    janitor = Janitor(
+        folders,
+        lock_path=os.path.join(app.config['TEMP_FOLDER'], '.janitor.lock'),
+        interval=_env_number('JANITOR_INTERVAL_SECONDS', 60),
+        on_expire=mark_expired,
+        on_sweep=after_sweep,
+    )
+    janitor.start()
+    return janitor
@@ -0,0 +1,148 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+from tracing import current_trace
+
+# Third-party loggers that flood DEBUG/INFO; LOG_LEVELS overrides these
+DEFAULT_LEVELS = {'PIL': 'WARNING', 'PyPDF2': 'WARNING', 'fontTools': 'WARNING'}
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_handlers = []
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the listener thread without formatting them. The
+    message is only built (getMessage) when a handler writes it, off the
+    request thread. A full queue drops the record instead of blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Tag records with the conversion being traced on this request
+        trace = current_trace()
+        if trace is not None and 'file_id' in trace.attributes and not hasattr(record, 'file_id'):
+            record.file_id = trace.attributes['file_id']
+        # Tracebacks pin their frames; render now so they can be released
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped and not self.queue.full():
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': 'Dropped %s log records, the log queue was full', 'args': (self.dropped,),
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec):
+    """'converter=DEBUG,PIL=WARNING' -> {'converter': 'DEBUG', 'PIL': 'WARNING'}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """
+    Route all logging through a bounded queue drained by a background
+    listener that owns the file and console handlers.
+
+    Environment: LOG_LEVEL (root level, default INFO), LOG_LEVELS
+    (per-logger overrides), LOG_FORMAT (json or text), LOG_FILE
+    (default app.log, empty to disable) and LOG_QUEUE_SIZE.
+    """
+    if os.environ.get('LOG_FORMAT', 'json').lower() == 'text':
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s')
+    else:
+        formatter = JsonFormatter()
+
+    _handlers.clear()
+    log_file = os.environ.get('LOG_FILE', 'app.log')
+    if log_file:
+        _handlers.append(logging.FileHandler(log_file))
+    _handlers.append(logging.StreamHandler())
+    for handler in _handlers:
+        handler.setFormatter(formatter)
+
+    queue_size = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(parse_levels(os.environ.get('LOG_LEVELS')))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener(queue_handler.queue)
+    atexit.register(stop_logging)
+
+    def restart_in_child():
+        # A forked worker (gunicorn --preload) does not inherit the listener
+        # thread, and the parent's queue may have been locked mid-fork
+        queue_handler.queue = queue.Queue(maxsize=queue_size)
+        _start_listener(queue_handler.queue)
+
+    os.register_at_fork(after_in_child=restart_in_child)
+
+
+def _start_listener(log_queue):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,157 @@
+import functools
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+
+# Must be imported after PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py
+# does it) so every worker writes its samples to the shared directory
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import generate_latest, multiprocess
+
+from tracing import span
+
+# Conversions range from a few milliseconds (text) to the LibreOffice timeout
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONVERSIONS = Counter(
+    'fily_conversions_total', 'Converter calls by outcome',
+    ['converter', 'extension', 'status'])
+CONVERSION_DURATION = Histogram(
+    'fily_conversion_duration_seconds', 'Wall time spent in a converter',
+    ['converter', 'extension'], buckets=DURATION_BUCKETS)
+INPUT_BYTES = Counter(
+    'fily_conversion_input_bytes_total', 'Bytes read by converters', ['converter', 'extension'])
+OUTPUT_BYTES = Counter(
+    'fily_conversion_output_bytes_total', 'Bytes written by successful conversions', ['converter', 'extension'])
+IN_PROGRESS = Gauge(
+    'fily_conversions_in_progress', 'Conversions currently running across all workers',
+    ['converter'], multiprocess_mode='livesum')
+FALLBACKS = Counter(
+    'fily_converter_fallbacks_total', 'Conversions served by a pure-Python fallback', ['converter'])
+LIBREOFFICE_DURATION = Histogram(
+    'fily_libreoffice_duration_seconds', 'Wall time of LibreOffice subprocesses', buckets=DURATION_BUCKETS)
+LIBREOFFICE_TIMEOUTS = Counter(
+    'fily_libreoffice_timeouts_total', 'LibreOffice subprocesses killed by the timeout')
+DOCX_COMPLEX = Counter(
+    'fily_docx_complex_total', 'DOCX files sent to LibreOffice instead of the native renderer', ['reason'])
+SANDBOX_VIOLATIONS = Counter(
+    'fily_sandbox_limit_violations_total', 'Converter subprocesses stopped by a resource limit', ['limit'])
+LANE_WAITING = Gauge(
+    'fily_scheduler_waiting', 'Jobs waiting for a slot, per scheduler lane',
+    ['lane'], multiprocess_mode='livesum')
+LANE_WAIT = Histogram(
+    'fily_scheduler_wait_seconds', 'Time jobs waited for a scheduler slot', ['lane'], buckets=DURATION_BUCKETS)
+PREVIEWS = Counter(
+    'fily_previews_total', 'Preview requests by outcome (hit, generated, failed)', ['result'])
+ADMISSION_REJECTED = Counter(
+    'fily_admission_rejected_total', 'Uploads refused with a 503 before their body was read', ['reason'])
+UPLOAD_BLOBS = Counter(
+    'fily_upload_blobs_total', 'Stored uploads by outcome (new content, duplicate linked to a stored blob)',
+    ['result'])
+UPLOAD_BYTES_DEDUPLICATED = Counter(
+    'fily_upload_deduplicated_bytes_total', 'Upload bytes not stored again because the content was already stored')
+STORAGE_WRITE_DURATION = Histogram(
+    'fily_storage_write_seconds', 'Time to persist a storage file', ['file'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower().lstrip('.') or 'none'
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+# labels() takes a lock and builds a key on every call, so the labelled
+# children are looked up once per (converter, extension) and reused
+_children = {}
+
+
+def _series(name, extension):
+    series = _children.get((name, extension))
+    if series is None:
+        series = _children[(name, extension)] = (
+            CONVERSION_DURATION.labels(name, extension),
+            CONVERSIONS.labels(name, extension, 'success'),
+            CONVERSIONS.labels(name, extension, 'failure'),
+            INPUT_BYTES.labels(name, extension),
+            OUTPUT_BYTES.labels(name, extension),
+        )
+    return series
+
+
+def instrument(func):
+    """
+    Record count, duration and bytes for a converter. The first argument
+    is an input path or a list of them; the output is the second argument,
+    or the path returned alongside the success flag (convert_image_format).
+    """
+    name = func.__name__
+    in_progress = IN_PROGRESS.labels(name)
+
+    @functools.wraps(func)
+    def wrapper(input_path, *args, **kwargs):
+        inputs = input_path if isinstance(input_path, (list, tuple)) else [input_path]
+        extension = _extension(inputs[0]) if inputs else 'none'
+        in_progress.inc()
+        start = time.perf_counter()
+        result = False
+        try:
+            with span(name):
+                result = func(input_path, *args, **kwargs)
+            return result
+        finally:
+            duration, succeeded, failed, input_bytes, output_bytes = _series(name, extension)
+            duration.observe(time.perf_counter() - start)
+            in_progress.dec()
+            success, output_path = result, args[0] if args else kwargs.get('output_path')
+            if isinstance(result, tuple):
+                success, output_path = result
+            input_bytes.inc(sum(_size(path) for path in inputs))
+            if success:
+                succeeded.inc()
+                output_bytes.inc(_size(output_path))
+            else:
+                failed.inc()
+
+    return wrapper
+
+
+@contextmanager
+def track_libreoffice():
+    """Time a LibreOffice subprocess and count it if it times out"""
+    start = time.perf_counter()
+    try:
+        with span('libreoffice'):
+            yield
+    except subprocess.TimeoutExpired:
+        LIBREOFFICE_TIMEOUTS.inc()
+        raise
+    finally:
+        LIBREOFFICE_DURATION.observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_storage_write(filepath):
+    start = time.perf_counter()
+    try:
+        with span(f"write {os.path.basename(filepath)}"):
+            yield
+    finally:
+        STORAGE_WRITE_DURATION.labels(os.path.basename(filepath)).observe(time.perf_counter() - start)
+
+
+def render():
+    """Return (body, content type) for the /metrics endpoint"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Merge the per-process files written by every gunicorn worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,418 @@
+import hashlib
+import logging
+import os
+import struct
+import time
+from hashlib import md5
+from io import BytesIO
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+)
+
+logger = logging.getLogger(__name__)
+
+# Dictionary types that are safe to share between pages of different inputs
+SHAREABLE_DICT_TYPES = {'/Font', '/FontDescriptor', '/ExtGState', '/Encoding'}
+
+PDF_HEADER = b"%PDF-1.7"
+
+# Catalog entries copied by add_reader(document=True); they are lost if only the pages are copied
+DOCUMENT_KEYS = ('/Outlines', '/AcroForm', '/Names', '/PageLabels', '/PageMode', '/ViewerPreferences', '/Lang')
+
+# Filters whose output is raw samples that Pillow can read directly
+LOSSLESS_FILTERS = {'/FlateDecode', '/LZWDecode', '/ASCII85Decode', '/ASCIIHexDecode'}
+
+
+class StreamingPdfWriter:
+    """Write a PDF incrementally, one input document at a time.
+
+    Objects cloned from an input are flushed to disk as soon as that input
+    has been added, so memory stays bounded by the largest single input
+    rather than the size of the whole output. Identical resource streams
+    (fonts, images, shared letterheads) are written once and referenced by
+    every page that uses them.
+    """
+
+    def __init__(self, output_path, password=None, deduplicate=True):
+        self.output_path = output_path
+        self.deduplicate = deduplicate
+        self.writer = PdfWriter()
+        if password:
+            self.writer.encrypt(password)
+
+        self.pages_written = 0
+        self.bytes_saved = 0
+        self.objects_deduplicated = 0
+        self.start_time = time.monotonic()
+
+        # Objects that keep changing until the end and are written by close()
+        self._deferred = {self.writer._pages.idnum, self.writer._info.idnum, self.writer._root.idnum}
+        if password:
+            self._deferred.add(self.writer._encrypt.idnum)
+
+        self._positions = {}  # idnum -> byte offset in output
+        self._flushed = len(self.writer._objects)
+        self._canonical = {}  # content key -> idnum
+        self._stream = open(output_path, 'wb')
+        self._stream.write(PDF_HEADER + b"\n%\xE2\xE3\xCF\xD3\n")
+
+    def add_reader(self, reader, page_indices=None, document=False):
+        """Add pages of an opened PdfReader and flush them to disk
+
+        With document=True (all pages only) the outline, form, names, page
+        labels and document info are copied too, so a rewrite of a single
+        document keeps its bookmarks and form fields.
+        """
+        indices = range(len(reader.pages)) if page_indices is None else page_indices
+        added = 0
+        for page_num in indices:
+            self.writer.add_page(reader.pages[page_num])
+            added += 1
+        if document and page_indices is None:
+            self._copy_catalog(reader)
+
+        # The writer keys its clone cache by id(reader); drop it so a later
+        # reader allocated at the same address does not reuse stale mappings
+        self.writer._id_translated.pop(id(reader), None)
+        self.pages_written += added
+        self.flush()
+        return added
+
+    def _copy_catalog(self, reader):
+        # Cloned while the translation cache still maps the reader's pages
+        # to the pages just added, so destinations point at the copies
+        root = reader.trailer['/Root'].get_object()
+        for key in DOCUMENT_KEYS:
+            if key in root:
+                self.writer._root_object[NameObject(key)] = root.raw_get(key).clone(self.writer)
+        info = reader.trailer.get('/Info')
+        if info is not None:
+            target = self.writer._info.get_object()
+            for key, value in info.get_object().items():
+                target[NameObject(key)] = value.clone(self.writer)
+
+    def flush(self):
+        """Deduplicate and write every object added since the last flush"""
+        objects = self.writer._objects
+        new_ids = [i + 1 for i in range(self._flushed, len(objects))
+                   if i + 1 not in self._deferred]
+
+        if self.deduplicate:
+            remap = self._deduplicate(new_ids)
+            if remap:
+                for idnum in new_ids:
+                    if idnum not in remap:
+                        _rewrite_references(objects[idnum - 1], remap, self.writer)
+        else:
+            remap = {}
+
+        for idnum in new_ids:
+            if idnum in remap:
+                objects[idnum - 1] = NullObject()
+                continue
+            self._write_object(idnum, objects[idnum - 1])
+            # Release the written object; only its offset is kept
+            objects[idnum - 1] = NullObject()
+
+        self._flushed = len(objects)
+
+    def close(self):
+        """Write the remaining structural objects, xref table and trailer"""
+        self.flush()
+        for idnum in sorted(self._deferred):
+            self._write_object(idnum, self.writer._objects[idnum - 1])
+
+        stream = self._stream
+        xref_location = stream.tell()
+        size = len(self.writer._objects) + 1
+        stream.write(b"xref\n")
+        stream.write(f"0 {size}\n".encode())
+        stream.write(b"0000000000 65535 f \n")
+        for idnum in range(1, size):
+            offset = self._positions.get(idnum)
+            if offset is None:
+                stream.write(b"0000000000 00000 f \n")
+            else:
+                stream.write(f"{offset:0>10} 00000 n \n".encode())
+
+        self.writer._write_trailer(stream)
+        stream.write(f"\nstartxref\n{xref_location}\n%%EOF\n".encode())
+        stream.close()
+
+    def abort(self):
+        """Close the output stream without finishing the document and remove the partial file"""
+        if not self._stream.closed:
+            self._stream.close()
+        try:
+            os.remove(self.output_path)
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self):
+        """Return throughput and deduplication figures for this merge"""
+        elapsed = time.monotonic() - self.start_time
+        return {
+            'pages': self.pages_written,
+            'seconds': round(elapsed, 4),
+            'pages_per_second': round(self.pages_written / elapsed, 2) if elapsed > 0 else None,
+            'bytes_saved': self.bytes_saved,
+            'objects_deduplicated': self.objects_deduplicated,
+        }
+
+    def _write_object(self, idnum, obj):
+        stream = self._stream
+        self._positions[idnum] = stream.tell()
+        stream.write(f"{idnum} 0 obj\n".encode())
+        obj.write_to_stream(stream, self._object_key(idnum))
+        stream.write(b"\nendobj\n")
+
+    def _object_key(self, idnum):
+        """Per-object RC4 key, derived the same way PdfWriter does it"""
+        writer = self.writer
+        if not hasattr(writer, '_encrypt') or idnum == writer._encrypt.idnum:
+            return None
+        key = writer._encrypt_key + struct.pack("<i", idnum)[:3] + struct.pack("<i", 0)[:2]
+        return md5(key).digest()[: min(16, len(writer._encrypt_key) + 5)]
+
+    def _deduplicate(self, new_ids):
+        """Map duplicate idnums in new_ids to an equivalent canonical idnum"""
+        objects = self.writer._objects
+        candidates = [idnum for idnum in new_ids if _is_shareable(objects[idnum - 1])]
+        remap = {}
+
+        # Keys depend on what referenced objects resolved to, so repeat until
+        # nothing new collapses (e.g. an image whose /SMask was a duplicate)
+        changed = True
+        while changed:
+            changed = False
+            seen = {}
+            for idnum in candidates:
+                if idnum in remap:
+                    continue
+                key = _content_key(objects[idnum - 1], remap)
+                target = self._canonical.get(key, seen.get(key))
+                if target is not None:
+                    remap[idnum] = target
+                    changed = True
+                else:
+                    seen[key] = idnum
+
+        for idnum, target in remap.items():
+            while target in remap:
+                target = remap[target]
+            remap[idnum] = target
+
+        for idnum in candidates:
+            if idnum in remap:
+                obj = objects[idnum - 1]
+                self.bytes_saved += len(obj._data or b'') if isinstance(obj, StreamObject) else 0
+                self.objects_deduplicated += 1
+            else:
+                self._canonical[_content_key(objects[idnum - 1], remap)] = idnum
+
+        return remap
+
+
+def forget_parsed_objects(reader):
+    """
+    Drop the objects a PdfReader has parsed and cached. Its pages stay
+    usable (their objects are read from the file again when needed), so a
+    reader walked part by part holds about one part's objects at a time.
+    """
+    reader.resolved_objects.clear()
+
+
+def optimize_pdf(input_path, output_path, image_dpi=None, jpeg_quality=85, password=None):
+    """Rewrite a PDF with smaller images, compressed content and no unused objects
+
+    Images larger than the page at image_dpi are downsampled and re-encoded
+    as JPEG. Content streams without a filter are Flate-compressed. Only
+    objects reachable from the pages and the document catalog (outline,
+    form, names, page labels, info) are copied, and identical streams are
+    stored once. Returns a dict describing what was changed.
+    """
+    result = {'images_downsampled': 0, 'streams_compressed': 0}
+
+    with open(input_path, 'rb') as pdf_file:
+        reader = PdfReader(pdf_file)
+        seen_images = set()
+
+        for page in reader.pages:
+            if _has_unfiltered_content(page):
+                try:
+                    page.compress_content_streams()
+                    result['streams_compressed'] += 1
+                except Exception as e:
+                    logger.warning(f"Could not compress content stream: {str(e)}")
+
+            if image_dpi:
+                max_width = float(page.mediabox.width) / 72 * image_dpi
+                max_height = float(page.mediabox.height) / 72 * image_dpi
+                for image in _page_images(page):
+                    if image.indirect_reference.idnum in seen_images:
+                        continue
+                    seen_images.add(image.indirect_reference.idnum)
+                    if _downsample_image(image, max_width, max_height, jpeg_quality):
+                        result['images_downsampled'] += 1
+
+        writer = StreamingPdfWriter(output_path, password=password)
+        try:
+            writer.add_reader(reader, document=True)
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+    result['bytes_saved'] = writer.bytes_saved
+    return result
+
+
+def _has_unfiltered_content(page):
+    """True if any content stream of the page (/Contents may be an array) is stored uncompressed"""
+    contents = page.get('/Contents')
+    if contents is None:
+        return False
+    contents = contents.get_object()
+    streams = contents if isinstance(contents, ArrayObject) else [contents]
+    return any('/Filter' not in stream.get_object() for stream in streams)
+
+
+def _page_images(page):
+    """Yield the image XObjects referenced directly by a page"""
+    resources = page.get('/Resources')
+    if resources is None:
+        return
+    xobjects = resources.get_object().get('/XObject')
+    if xobjects is None:
+        return
+    for ref in xobjects.get_object().values():
+        if not isinstance(ref, IndirectObject):
+            continue
+        obj = ref.get_object()
+        if isinstance(obj, StreamObject) and obj.get('/Subtype') == '/Image':
+            yield obj
+
+
+def _downsample_image(image, max_width, max_height, jpeg_quality):
+    """Replace an image stream with a smaller JPEG if it exceeds the target size"""
+    from PIL import Image
+
+    width, height = int(image['/Width']), int(image['/Height'])
+    scale = min(max_width / width, max_height / height)
+    if scale >= 1 or '/SMask' in image or '/Mask' in image or image.get('/ImageMask'):
+        return False
+
+    mode = _image_mode(image)
+    if mode is None:
+        return False
+
+    try:
+        filters = image.get('/Filter')
+        if filters is None:
+            filters = []
+        elif not isinstance(filters, ArrayObject):
+            filters = [filters]
+
+        if filters and filters[-1] == '/DCTDecode':
+            img = Image.open(BytesIO(image.get_data()))
+            img.draft(mode, (int(width * scale), int(height * scale)))
+            img = img.convert(mode)
+        elif set(filters) <= LOSSLESS_FILTERS and image.get('/BitsPerComponent', 8) == 8:
+            img = Image.frombytes(mode, (width, height), image.get_data())
+        else:
+            return False
+
+        img = img.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=jpeg_quality, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not downsample image: {str(e)}")
+        return False
+
+    data = buffer.getvalue()
+    if len(data) >= len(image._data):
+        return False
+
+    image._data = data
+    image.decoded_self = None
+    image[NameObject('/Filter')] = NameObject('/DCTDecode')
+    image[NameObject('/Width')] = NumberObject(img.width)
+    image[NameObject('/Height')] = NumberObject(img.height)
+    image[NameObject('/BitsPerComponent')] = NumberObject(8)
+    image[NameObject('/ColorSpace')] = NameObject('/DeviceRGB' if mode == 'RGB' else '/DeviceGray')
+    for key in ('/DecodeParms', '/Decode'):
+        if key in image:
+            del image[key]
+    return True
+
+
+def _image_mode(image):
+    """Map an image colour space to a Pillow mode, or None if unsupported"""
+    color_space = image.get('/ColorSpace')
+    if isinstance(color_space, IndirectObject):
+        color_space = color_space.get_object()
+    if isinstance(color_space, ArrayObject) and color_space and color_space[0] == '/ICCBased':
+        components = color_space[1].get_object().get('/N')
+        return {1: 'L', 3: 'RGB'}.get(components)
+    return {'/DeviceRGB': 'RGB', '/DeviceGray': 'L'}.get(color_space)
+
+
+def _is_shareable(obj):
+    if isinstance(obj, StreamObject):
+        return True
+    return isinstance(obj, DictionaryObject) and obj.get('/Type') in SHAREABLE_DICT_TYPES
+
+
+def _content_key(obj, remap):
+    """Hash an object's content with references resolved through remap"""
+    digest = hashlib.sha256()
+    _feed_digest(digest, obj, remap)
+    if isinstance(obj, StreamObject):
+        digest.update(b'stream')
+        digest.update(obj._data or b'')
+    return digest.digest()
+
+
+def _feed_digest(digest, obj, remap):
+    if isinstance(obj, IndirectObject):
+        digest.update(f"R{remap.get(obj.idnum, obj.idnum)};".encode())
+    elif isinstance(obj, DictionaryObject):
+        digest.update(b'<<')
+        for key in sorted(obj.keys()):
+            if key == '/Length':
+                continue
+            digest.update(str(key).encode())
+            _feed_digest(digest, obj[key], remap)
+        digest.update(b'>>')
+    elif isinstance(obj, ArrayObject):
+        digest.update(b'[')
+        for item in obj:
+            _feed_digest(digest, item, remap)
+        digest.update(b']')
+    else:
+        digest.update(f"{type(obj).__name__}:{obj!r};".encode())
+
+
+def _rewrite_references(obj, remap, writer):
+    """Point references to duplicate objects at their canonical copy"""
+    if isinstance(obj, DictionaryObject):
+        items = obj.items()
+    elif isinstance(obj, ArrayObject):
+        items = enumerate(obj)
+    else:
+        return
+
+    for key, value in list(items):
+        if isinstance(value, IndirectObject):
+            if value.idnum in remap:
+                obj[key] = IndirectObject(remap[value.idnum], 0, writer)
+        else:
+            _rewrite_references(value, remap, writer)
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from metrics import PREVIEWS
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1024 * 1024
+# Bump when preview output changes, so cached previews are not served stale
+PREVIEW_VERSION = 1
+
+# About one page of input for each kind of converter
+TEXT_BYTES = 4 * 1024
+TEXT_LINES = 60
+TABLE_ROWS = 40
+DOCX_BLOCKS = 60
+THUMBNAIL_SIZE = (800, 800)
+# Preformatted converters do not wrap, so minified JSON or XML would run
+# off the page as a single line
+WRAP_COLUMNS = 100
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp'}
+TEXT_EXTENSIONS = {'.txt', '.md', '.html', '.htm'}
+PREFORMATTED_EXTENSIONS = {'.xml', '.json', '.py', '.js', '.css'}
+LIBREOFFICE_EXTENSIONS = {'.doc', '.ppt', '.pptx', '.rtf', '.odt', '.ods', '.odp'}
+SUPPORTED_EXTENSIONS = (IMAGE_EXTENSIONS | TEXT_EXTENSIONS | PREFORMATTED_EXTENSIONS | LIBREOFFICE_EXTENSIONS
+                        | {'.pdf', '.csv', '.xlsx', '.xls', '.docx'})
+MIME_TYPES = {'.pdf': 'application/pdf', '.jpg': 'image/jpeg', '.png': 'image/png'}
+
+
+class PreviewUnavailable(Exception):
+    """No preview can be made for this file"""
+
+
+def _head(input_path, output_path, wrap=False):
+    """Copy about a page of a text file, cut at a line boundary"""
+    with open(input_path, 'rb') as f:
+        data = f.read(TEXT_BYTES)
+        cut = len(data) == TEXT_BYTES and f.read(1)
+    if cut and b'\n' in data:
+        data = data[:data.rindex(b'\n')]
+    # A multi-byte character may be split at the cut
+    lines = data.decode('utf-8', errors='ignore').splitlines()
+    if wrap:
+        lines = [line[i:i + WRAP_COLUMNS] for line in lines for i in range(0, max(len(line), 1), WRAP_COLUMNS)]
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines[:TEXT_LINES]))
+    return bool(cut) or len(lines) > TEXT_LINES
+
+
+def _first_page(input_path, output_path):
+    """Write the first page of a PDF; only that page's objects are read"""
+    from PyPDF2 import PdfReader
+    from pdf_tools import StreamingPdfWriter
+
+    with open(input_path, 'rb') as f:
+        reader = PdfReader(f)
+        if reader.is_encrypted:
+            raise PreviewUnavailable('PDF is password protected')
+        writer = StreamingPdfWriter(output_path, deduplicate=False)
+        try:
+            writer.add_reader(reader, [0])
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+
+
+def _native_docx(input_path):
+    # The path may lack the extension (chunked uploads), so not docx_fast_path_reason()
+    from converter import DOCX_FAST_PATH
+    from docx_renderer import unsupported_feature
+
+    return DOCX_FAST_PATH and unsupported_feature(input_path) is None
+
+
+def _thumbnail(input_path, output_path):
+    """Reduced-size copy of an image; JPEGs are scaled down while decoding"""
+    from PIL import Image, ImageOps
+
+    with Image.open(input_path) as img:
+        # draft() only applies to JPEG, where it decodes at 1/2, 1/4 or 1/8 scale
+        img.draft('RGB', THUMBNAIL_SIZE)
+        img.thumbnail(THUMBNAIL_SIZE)
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img.convert('RGBA').save(output_path, 'PNG', optimize=True)
+            return 'image/png'
+        img.convert('RGB').save(output_path, 'JPEG', quality=80)
+        return 'image/jpeg'
+
+
+def render_preview(input_path, extension, output_path):
+    """
+    Write a preview of input_path to output_path and return its MIME type:
+    a thumbnail for images, else a one-page PDF made by the usual converter
+    from about a page's worth of the input.
+    """
+    import converter
+
+    extension = extension.lower()
+    if extension in IMAGE_EXTENSIONS:
+        return _thumbnail(input_path, output_path)
+    if extension == '.pdf':
+        _first_page(input_path, output_path)
+        return 'application/pdf'
+
+    work_dir = tempfile.mkdtemp(prefix='.preview-', dir=os.path.dirname(output_path))
+    try:
+        pdf_path = os.path.join(work_dir, 'preview.pdf')
+        if extension in TEXT_EXTENSIONS or extension in PREFORMATTED_EXTENSIONS:
+            head_path = os.path.join(work_dir, 'head' + extension)
+            cut = _head(input_path, head_path, wrap=extension in PREFORMATTED_EXTENSIONS)
+            if extension == '.json' and cut:
+                # A truncated document does not parse; show the source instead
+                success = converter.convert_xml_to_pdf(head_path, pdf_path)
+            else:
+                success = converter.convert_to_pdf(head_path, pdf_path, os.path.basename(head_path))
+        elif extension == '.csv':
+            success = converter.convert_csv_to_pdf(input_path, pdf_path, max_rows=TABLE_ROWS)
+        elif extension in ('.xlsx', '.xls'):
+            success = converter.convert_sheet_to_pdf(input_path, pdf_path, max_rows=TABLE_ROWS)
+        elif extension == '.docx' and _native_docx(input_path):
+            from docx_renderer import render_docx
+            success = render_docx(input_path, pdf_path, max_blocks=DOCX_BLOCKS)
+        elif extension in LIBREOFFICE_EXTENSIONS or extension == '.docx':
+            # LibreOffice needs the real extension to pick an import filter
+            named_path = os.path.join(work_dir, 'input' + extension)
+            try:
+                os.link(input_path, named_path)
+            except OSError:
+                shutil.copyfile(input_path, named_path)
+            success = converter.run_libreoffice(named_path, pdf_path, page_range='1')
+        else:
+            raise PreviewUnavailable(f'No preview for {extension or "files without an extension"}')
+        if not success or not os.path.exists(pdf_path):
+            raise PreviewUnavailable('Preview could not be rendered')
+        _first_page(pdf_path, output_path)
+        return 'application/pdf'
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def preview_kind(input_path, extension):
+    """Scheduler key: LibreOffice previews queue like conversions, the rest as 'preview'"""
+    extension = extension.lower()
+    if extension in LIBREOFFICE_EXTENSIONS or (extension == '.docx' and not _native_docx(input_path)):
+        return extension.lstrip('.')
+    return 'preview'
+
+
+class PreviewCache:
+    """
+    Previews stored by the SHA-256 of the input (plus its extension), so a
+    file uploaded again or viewed again is served from disk. The cache is
+    trimmed to max_bytes, least recently served first.
+    """
+
+    def __init__(self, directory, max_bytes, hash_cache_size=1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_cache_size = hash_cache_size
+        self._hashes = OrderedDict()  # (path, size, mtime_ns) -> hex digest
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def digest(self, path):
+        """SHA-256 of a file, remembered while the file is unchanged"""
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+            if digest is not None:
+                self._hashes.move_to_end(key)
+                return digest
+        with open(path, 'rb') as f:
+            digest = hashlib.file_digest(f, 'sha256').hexdigest()
+        with self._lock:
+            self._hashes[key] = digest
+            while len(self._hashes) > self.hash_cache_size:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def _key(self, input_path, extension):
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise PreviewUnavailable(f'No preview for {extension or "files without an extension"}')
+        key = f"{self.digest(input_path)}-v{PREVIEW_VERSION}{extension.replace('.', '-')}"
+        return key, os.path.join(self.directory, key[:2])
+
+    def lookup(self, input_path, extension):
+        """(path, MIME type) of a cached preview, or None"""
+        key, shard = self._key(input_path, extension.lower())
+        for suffix, mimetype in MIME_TYPES.items():
+            path = os.path.join(shard, key + suffix)
+            if os.path.exists(path):
+                os.utime(path)
+                PREVIEWS.labels('hit').inc()
+                return path, mimetype
+        return None
+
+    def render(self, input_path, extension):
+        """Render and cache a preview; returns (path, MIME type)"""
+        key, shard = self._key(input_path, extension.lower())
+        os.makedirs(shard, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=shard)
+        os.close(fd)
+        try:
+            mimetype = render_preview(input_path, extension, tmp_path)
+        except Exception:
+            os.remove(tmp_path)
+            PREVIEWS.labels('failed').inc()
+            raise
+        suffix = next(suffix for suffix, known in MIME_TYPES.items() if known == mimetype)
+        path = os.path.join(shard, key + suffix)
+        os.replace(tmp_path, path)
+        PREVIEWS.labels('generated').inc()
+        self.trim()
+        return path, mimetype
+
+    def trim(self):
+        """Remove the least recently served previews beyond max_bytes"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def create_previews(app):
+    """Build the preview cache from app config and environment"""
+    return PreviewCache(
+        os.path.join(app.config['TEMP_FOLDER'], '.previews'),
+        max_bytes=int(_env_number('PREVIEW_CACHE_MB', 256) * MEGABYTE),
+    )
@@ -0,0 +1,304 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SESSION_NAME = 'session.json'
+SESSION_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{6}$')
+# Files a profiled conversion leaves in its session directory
+PROFILE_SUFFIXES = ('.pstats', '.collapsed', '.alloc.collapsed', '.tracemalloc', '.json')
+MAX_DURATION_SECONDS = 24 * 3600
+# Frames kept per allocation; deeper stacks cost tracemalloc more memory
+MEMORY_FRAMES = 25
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every `interval` seconds from a
+    background thread and counts identical stacks, in the collapsed
+    format flamegraph.pl, speedscope and inferno read. Unlike cProfile,
+    the counts are wall time, so waits on LibreOffice or a lane show up.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _allocation_stacks(snapshot):
+    """Live bytes by allocating stack, in the collapsed format"""
+    lines = []
+    for statistic in snapshot.statistics('traceback'):
+        stack = ';'.join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in statistic.traceback)
+        lines.append(f"{stack} {statistic.size}\n")
+    return ''.join(lines)
+
+
+class Profiler:
+    """
+    On-demand profiling of live conversions, armed for every worker
+    process at once. The armed session is a JSON file in `directory`;
+    profile() checks for it with a single stat(), so with no session a
+    conversion runs exactly as it would without the profiler. Sessions
+    profile up to `count` matching conversions, each with probability
+    `sample_rate`, until they expire. The budget is shared by all workers
+    under a file lock. One conversion per process is profiled at a time,
+    because tracemalloc traces the whole process.
+    """
+
+    def __init__(self, directory, sample_interval=0.005, keep_sessions=5):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.keep_sessions = keep_sessions
+        self.session_path = os.path.join(directory, SESSION_NAME)
+        self._lock_path = os.path.join(directory, '.session.lock')
+        self._busy = threading.Lock()
+        self._cached = (None, None)  # (mtime_ns, session) of the last session file read
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, count=10, sample_rate=1.0, extension=None, conversion_type=None, memory=False,
+              duration=600):
+        """Arm a session, replacing any armed one; returns the session"""
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise ValueError('count must be a positive integer')
+        if not 0 < sample_rate <= 1:
+            raise ValueError('sample_rate must be in (0, 1]')
+        if not 0 < duration <= MAX_DURATION_SECONDS:
+            raise ValueError(f'duration must be between 1 and {MAX_DURATION_SECONDS} seconds')
+        now = time.time()
+        session = {
+            'id': f"{datetime.now():%Y%m%d-%H%M%S}-{os.urandom(3).hex()}",
+            'count': count,
+            'remaining': count,
+            'sample_rate': sample_rate,
+            'extension': extension.lower().lstrip('.') if extension else None,
+            'conversion_type': conversion_type or None,
+            'memory': bool(memory),
+            'started_at': now,
+            'expires_at': now + duration,
+        }
+        os.makedirs(os.path.join(self.directory, session['id']))
+        with self._locked():
+            self._write(session)
+        self._prune()
+        logger.info("Profiling session %s armed: %s", session['id'], session)
+        return session
+
+    def stop(self):
+        """Disarm the current session; returns it, or None if none was armed"""
+        with self._locked():
+            session = self._read()
+            self._remove()
+        if session:
+            logger.info("Profiling session %s stopped", session['id'])
+        return session
+
+    def current(self):
+        """The armed session, or None; an expired session is disarmed"""
+        session = self._read()
+        if session and time.time() >= session['expires_at']:
+            with self._locked():
+                if self._read() == session:
+                    self._remove()
+            return None
+        return session
+
+    def sessions(self):
+        """[{id, profiles: [summary of each profiled conversion]}], newest first"""
+        result = []
+        for session_id in self._session_ids():
+            profiles = []
+            directory = os.path.join(self.directory, session_id)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.json'):
+                    try:
+                        with open(os.path.join(directory, name), encoding='utf-8') as f:
+                            profiles.append(json.load(f))
+                    except (OSError, ValueError):
+                        continue
+            result.append({'id': session_id, 'profiles': profiles})
+        return result
+
+    def profile_path(self, session_id, name):
+        """Path of a downloadable profile file; ValueError for anything else"""
+        if (not SESSION_ID_PATTERN.match(session_id) or os.path.basename(name) != name
+                or name.startswith('.') or not name.endswith(PROFILE_SUFFIXES)):
+            raise ValueError('Not a profile file')
+        return os.path.join(self.directory, session_id, name)
+
+    def profile(self, label, extension, conversion_type):
+        """Context manager for one conversion: profiles it if the armed session picks it"""
+        try:
+            mtime = os.stat(self.session_path).st_mtime_ns
+        except FileNotFoundError:
+            return nullcontext()
+        return self._claim(mtime, label, extension, conversion_type) or nullcontext()
+
+    def _claim(self, mtime, label, extension, conversion_type):
+        if self._cached[0] != mtime:
+            self._cached = (mtime, self._read())
+        session = self._cached[1]
+        if session and time.time() >= session['expires_at']:
+            # Disarm, so later conversions stop at the stat() again
+            self.current()
+            return None
+        if not session or not self._matches(session, extension, conversion_type):
+            return None
+        if random.random() >= session['sample_rate'] or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            with self._locked():
+                # Another worker may have used up the budget since the cached read
+                session = self._read()
+                if (not session or time.time() >= session['expires_at'] or session['remaining'] < 1
+                        or not self._matches(session, extension, conversion_type)):
+                    self._busy.release()
+                    return None
+                session['remaining'] -= 1
+                if session['remaining']:
+                    self._write(session)
+                else:
+                    self._remove()
+        except Exception:
+            self._busy.release()
+            raise
+        return self._run(session, label, extension, conversion_type)
+
+    @staticmethod
+    def _matches(session, extension, conversion_type):
+        return ((not session['extension'] or session['extension'] == (extension or '').lower())
+                and (not session['conversion_type'] or session['conversion_type'] == conversion_type))
+
+    @contextmanager
+    def _run(self, session, label, extension, conversion_type):
+        memory = session['memory'] and not tracemalloc.is_tracing()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        profile = cProfile.Profile()
+        snapshot = peak = None
+        try:
+            if memory:
+                tracemalloc.start(MEMORY_FRAMES)
+            sampler.start()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                seconds = time.perf_counter() - start
+                sampler.stop()
+                if memory:
+                    snapshot = tracemalloc.take_snapshot().filter_traces(
+                        [tracemalloc.Filter(False, tracemalloc.__file__)])
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                # Saved when the conversion raised too; those are often the ones worth a look
+                self._save(session['id'], label, profile, sampler, snapshot, {
+                    'name': label, 'extension': extension, 'conversion_type': conversion_type,
+                    'seconds': round(seconds, 4), 'samples': sum(sampler.stacks.values()),
+                    'peak_traced_bytes': peak, 'pid': os.getpid(), 'created_at': datetime.now().isoformat(),
+                })
+        finally:
+            self._busy.release()
+
+    def _save(self, session_id, label, profile, sampler, snapshot, summary):
+        base = os.path.join(self.directory, session_id, label)
+        try:
+            profile.dump_stats(base + '.pstats')
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+            files = [label + '.pstats', label + '.collapsed']
+            if snapshot is not None:
+                snapshot.dump(base + '.tracemalloc')
+                with open(base + '.alloc.collapsed', 'w', encoding='utf-8') as f:
+                    f.write(_allocation_stacks(snapshot))
+                files += [label + '.tracemalloc', label + '.alloc.collapsed']
+            summary['files'] = files
+            # Written last, so a listed profile has all its files
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump(summary, f)
+        except OSError as e:
+            # A full disk must not fail the conversion that was profiled
+            logger.warning("Could not save profile %s of session %s: %s", label, session_id, e)
+            return
+        logger.info("Profiled %s for session %s (%.2fs)", label, session_id, summary['seconds'])
+
+    def _session_ids(self):
+        return sorted((name for name in os.listdir(self.directory) if SESSION_ID_PATTERN.match(name)),
+                      reverse=True)
+
+    def _prune(self):
+        for session_id in self._session_ids()[self.keep_sessions:]:
+            shutil.rmtree(os.path.join(self.directory, session_id), ignore_errors=True)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _read(self):
+        try:
+            with open(self.session_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, session):
+        partial = os.path.join(self.directory, f".{SESSION_NAME}.part")
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(session, f)
+        os.replace(partial, self.session_path)
+
+    def _remove(self):
+        try:
+            os.remove(self.session_path)
+        except FileNotFoundError:
+            pass
+
+
+def create_profiler(app):
+    """Profiles live in temp/.profiles; the dot keeps the janitor's temp sweep away from them"""
+    return Profiler(os.path.join(app.config['TEMP_FOLDER'], '.profiles'))
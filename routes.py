@@ -1,13 +1,93 @@
 import os
+import hmac
 import uuid
+import shutil
+import tempfile
 import json
 import logging
 from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from contextlib import ExitStack
+from functools import wraps
+from flask import (Response, g, render_template, request, redirect, url_for, flash, jsonify, send_file, session,
+                   stream_with_context)
 from werkzeug.utils import secure_filename
 from app import app
-from converter import convert_to_pdf, convert_image_format, merge_pdfs, convert_multiple_images_to_pdf
+from converter import (convert_to_pdf, convert_image_format, conversion_kind, merge_pdfs,
+                       convert_multiple_images_to_pdf, parse_page_range, split_pdf, ALLOWED_EXTENSIONS)
 from storage import storage
+from utils import extract_document_metadata
+from janitor import in_use, reserve, touch
+from archive import stream_zip, unique_names
+import metrics
+from tracing import begin_trace, end_trace
+from scheduler import LaneTimeout, create_scheduler
+from admission import create_admission
+from chunked_upload import ChunkedUploadError, create_chunked_uploads
+from preview import PreviewUnavailable, create_previews, preview_kind
+from blobstore import create_blob_store
+from profiling import create_profiler
+
+logger = logging.getLogger(__name__)
+
+# Light and heavy conversion lanes shared by all worker processes
+scheduler = create_scheduler(app, storage)
+# Host-wide limits on uploads in flight, checked before the body is read
+admission = create_admission(app, scheduler)
+# Resumable uploads sent in chunks, assembled under temp/
+chunked_uploads = create_chunked_uploads(app)
+# First-page previews and thumbnails, cached by content hash
+previews = create_previews(app)
+# Upload contents stored once by SHA-256, upload names are hardlinks to them
+blobs = create_blob_store(app)
+# Admin-armed cProfile/tracemalloc sessions over live conversions
+profiler = create_profiler(app)
+
+@app.before_request
+def admit_upload():
+    """Refuse uploads and upload chunks with a 503 while the host is at its limits"""
+    if request.endpoint in ('upload_files', 'put_upload_chunk'):
+        size = request.content_length or 0
+    elif request.endpoint == 'complete_chunked_upload':
+        try:
+            size = chunked_uploads.load(request.view_args['upload_id'])['size']
+        except ChunkedUploadError:
+            return None
+    else:
+        return None
+    ticket, reason = admission.admit(size)
+    if ticket is None:
+        retry_after = admission.retry_after_seconds()
+        logger.warning("Upload refused (%s limit), retry in %ss", reason, retry_after)
+        return jsonify({
+            'success': False,
+            'error': 'Server is busy, please retry shortly',
+            'reason': reason,
+            'retry_after': retry_after,
+            'queue': scheduler.queue_depth(),
+        }), 503, {'Retry-After': str(retry_after)}
+    g.admission_ticket = ticket
+    return None
+
+@app.after_request
+def add_queue_depth(response):
+    if request.endpoint in ('upload_files', 'complete_chunked_upload'):
+        response.headers['X-Queue-Depth'] = str(sum(scheduler.queue_depth().values()))
+    return response
+
+@app.teardown_request
+def release_upload(error=None):
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        admission.release(ticket)
+    reservations = g.pop('reservations', None)
+    if reservations is not None:
+        reservations.close()
+
+def reserve_for_request(*prefixes):
+    """Keep the janitor away from these paths (see janitor.reserve) until the request ends"""
+    if 'reservations' not in g:
+        g.reservations = ExitStack()
+    g.reservations.enter_context(reserve(*prefixes))
 
 @app.route('/privacy')
 def privacy():
@@ -56,34 +136,19 @@ def api_stats():
 def update_stats(files_processed=1):
     """Update conversion statistics"""
     try:
-        stats_file = os.path.join('data', 'stats.json')
-        if os.path.exists(stats_file):
-            with open(stats_file, 'r') as f:
-                stats = json.load(f)
-        else:
-            stats = {
-                'total_conversions': 0,
-                'total_files_processed': 0,
-                'uptime_percentage': 99.8
-            }
-            os.makedirs('data', exist_ok=True)
-        
-        stats['total_conversions'] += 1
-        stats['total_files_processed'] += files_processed
-        
-        with open(stats_file, 'w') as f:
-            json.dump(stats, f)
+        storage.count_processed(files_processed)
     except Exception as e:
-        logging.error(f"Failed to update stats: {e}")
+        logger.error(f"Failed to update stats: {e}")
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {
-    'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 
-    'txt', 'rtf', 'odt', 'ods', 'odp', 'csv',
-    'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'tif', 'webp', 
-    'ico', 'tga', 'jp2', 'jpeg2000', 'eps', 'svg', 'psd',
-    'md', 'html', 'pdf'
-}
+def failure_message(failure):
+    """User-facing message for a conversion failure class"""
+    if failure.startswith('limit:'):
+        return 'Document exceeded the converter resource limits'
+    if failure == 'timeout':
+        return 'Conversion timed out'
+    if failure == 'page_range':
+        return 'The requested pages are not in the document'
+    return 'Conversion failed'
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -93,8 +158,144 @@ def allowed_file(filename):
 @app.route('/')
 def index():
     """Main page with file upload interface"""
-    recent_conversions = storage.get_recent_conversions(5)
-    return render_template('index.html', recent_conversions=recent_conversions)
+    # Recent conversions are fetched by the page itself from /api/recent-conversions
+    return render_template('index.html')
+
+def convert_stored_file(original_path, file_id, filename, conversion_type, options, trace, batch_id=None,
+                        batch_files=None, content_sha256=None):
+    """
+    Convert one stored upload and record the outcome. options holds the
+    form fields (quality, custom_name, password, target_format,
+    image_quality, page_range, sheet); batch_id groups the records of one request, and
+    a successful output is appended to batch_files for its /download/batch manifest.
+    content_sha256 names the upload's blob, released when the record is deleted.
+    Returns the entry for the response's results list.
+    """
+    file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'unknown'
+    quality = options.get('quality', 'high')
+    custom_name = options.get('custom_name', '')
+    output_password = options.get('password') or None
+    page_range = options.get('page_range') or None
+    sheet = options.get('sheet') or None
+    converted_folder = app.config['CONVERTED_FOLDER']
+    # Covers the output under any extension, LibreOffice's intermediate PDF (named after the
+    # upload) and the .opt/.pages rewrites, until the record is stored
+    reserve_for_request(os.path.join(converted_folder, os.path.splitext(custom_name)[0] if custom_name else file_id),
+                        os.path.join(converted_folder, file_id))
+    try:
+        conversion_stats = {}
+        
+        # Handle different conversion types
+        if conversion_type == 'image-converter':
+            # Image format conversion
+            target_format = options.get('target_format', 'jpg')
+            img_quality = int(options.get('image_quality', 95))
+            output_filename = custom_name if custom_name else f"{file_id}_converted"
+            converted_path = os.path.join(app.config['CONVERTED_FOLDER'], output_filename)
+            with (in_use(original_path), scheduler.slot(file_extension, os.path.getsize(original_path)),
+                  profiler.profile(file_id, file_extension, conversion_type)):
+                success, final_path = convert_image_format(original_path, converted_path, target_format,
+                                                           quality=img_quality)
+            if success and final_path:
+                converted_path = final_path
+        else:
+            # Regular PDF conversion
+            output_filename = custom_name if custom_name else f"{file_id}_converted.pdf"
+            converted_path = os.path.join(app.config['CONVERTED_FOLDER'], output_filename)
+            # Simple .docx files skip LibreOffice, so they are costed and queued apart
+            kind = conversion_kind(original_path)
+            conversion_stats['conversion_kind'] = kind
+            with (in_use(original_path), scheduler.slot(kind, os.path.getsize(original_path)),
+                  profiler.profile(file_id, file_extension, conversion_type)):
+                success = convert_to_pdf(original_path, converted_path, filename, password=output_password,
+                                         quality=quality, stats=conversion_stats, page_range=page_range,
+                                         sheet=sheet)
+        
+        if success and os.path.exists(converted_path):
+            # Store conversion record
+            conversion_data = {
+                'file_id': file_id,
+                'original_filename': filename,
+                'file_extension': file_extension,
+                'file_size': os.path.getsize(original_path),
+                'conversion_type': conversion_type,
+                'quality_setting': quality,
+                'status': 'completed',
+                'converted_path': converted_path,
+                'batch_id': batch_id,
+                'content_sha256': content_sha256,
+                'created_at': datetime.now().isoformat()
+            }
+            if page_range or sheet:
+                conversion_data.update(page_range=page_range, sheet=sheet)
+            word_count = conversion_stats.pop('word_count', None)
+            conversion_data.update(conversion_stats)
+            with trace.span('metadata'):
+                conversion_data['metadata'] = extract_document_metadata(original_path, converted_path,
+                                                                        output_password, word_count)
+            # The storage write itself only shows in the slow log and exported trace
+            conversion_data['trace'] = trace.to_dict()
+            with trace.span('storage_write'):
+                storage.add_conversion(conversion_data)
+            
+            # Update statistics
+            update_stats(1)
+            
+            logger.info("Successfully converted %s to PDF", filename)
+            if batch_files is not None:
+                batch_files.append({
+                    'file_id': file_id,
+                    'name': os.path.splitext(filename)[0] + os.path.splitext(converted_path)[1],
+                    'path': converted_path,
+                })
+            
+            return {
+                'success': True,
+                'filename': filename,
+                'download_url': url_for('download_file', file_id=file_id),
+                'file_id': file_id
+            }
+        
+        # Store failed conversion
+        failure = conversion_stats.get('failure', 'error')
+        conversion_data = {
+            'file_id': file_id,
+            'original_filename': filename,
+            'file_extension': file_extension,
+            'file_size': os.path.getsize(original_path),
+            'conversion_type': conversion_type,
+            'quality_setting': quality,
+            'status': 'failed',
+            'failure': failure,
+            'error_message': failure_message(failure),
+            'content_sha256': content_sha256,
+            'created_at': datetime.now().isoformat()
+        }
+        conversion_data['trace'] = trace.to_dict()
+        with trace.span('storage_write'):
+            storage.add_conversion(conversion_data)
+        
+        return {
+            'success': False,
+            'filename': filename,
+            'error': conversion_data['error_message']
+        }
+    
+    except LaneTimeout as e:
+        logger.warning("Conversion of %s not started: %s", filename, e)
+        return {
+            'success': False,
+            'filename': filename,
+            'error': 'Server is busy, please retry shortly',
+            'retry_after': admission.retry_after_seconds()
+        }
+    except Exception as e:
+        logger.error(f"Error processing file {filename}: {str(e)}")
+        return {
+            'success': False,
+            'filename': filename,
+            'error': str(e)
+        }
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
@@ -106,24 +307,40 @@ def upload_files():
     conversion_type = request.form.get('conversion_type', 'document-to-pdf')
     quality = request.form.get('quality', 'high')
     custom_name = request.form.get('custom_name', '')
+    output_password = request.form.get('password') or None
+    try:
+        pages = parse_page_range(request.form.get('page_range'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     if not files or all(file.filename == '' for file in files):
         return jsonify({'success': False, 'error': 'No files selected'})
     
     results = []
     uploaded_files = []  # Keep track of uploaded files for batch processing
+    batch_id = str(uuid.uuid4())  # Lets all outputs be fetched as one ZIP
+    batch_files = []
     
     for file in files:
         if file and allowed_file(file.filename):
             try:
+                # Stage timings for this file, stored with its record
+                trace = begin_trace('upload', conversion_type=conversion_type)
+                
                 # Generate unique filename
                 file_id = str(uuid.uuid4())
+                trace.attributes['file_id'] = file_id
                 filename = secure_filename(file.filename or 'unknown_file')
                 file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'unknown'
                 
                 # Save original file
                 original_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_id}_{filename}")
-                file.save(original_path)
+                # Held until merge-pdf/images-to-pdf below have used every upload
+                reserve_for_request(original_path)
+                with trace.span('save_upload'):
+                    # A repeat of stored content becomes a hardlink, nothing is written
+                    content_sha256, duplicate = blobs.store(file.stream, original_path)
+                trace.attributes['duplicate_upload'] = duplicate
                 uploaded_files.append({
                     'path': original_path,
                     'id': file_id,
@@ -131,86 +348,22 @@ def upload_files():
                     'extension': file_extension
                 })
                 
-                # Handle different conversion types
-                if conversion_type == 'image-converter':
-                    # Image format conversion
-                    target_format = request.form.get('target_format', 'jpg')
-                    img_quality = int(request.form.get('image_quality', 95))
-                    output_filename = custom_name if custom_name else f"{file_id}_converted"
-                    converted_path = os.path.join(app.config['CONVERTED_FOLDER'], output_filename)
-                    success, final_path = convert_image_format(original_path, converted_path, target_format, quality=img_quality)
-                    if success and final_path:
-                        converted_path = final_path
-                elif conversion_type == 'merge-pdf':
-                    # PDF merging - skip individual processing
-                    continue
-                elif conversion_type == 'images-to-pdf':
-                    # Images to PDF - skip individual processing
-                    continue
-                else:
-                    # Regular PDF conversion
-                    output_filename = custom_name if custom_name else f"{file_id}_converted.pdf"
-                    converted_path = os.path.join(app.config['CONVERTED_FOLDER'], output_filename)
-                    success = convert_to_pdf(original_path, converted_path, filename, quality=quality)
-                
                 if conversion_type in ['merge-pdf', 'images-to-pdf']:
-                    # Skip individual file processing for batch types
+                    # Batch types are processed together below
                     continue
-                elif success and os.path.exists(converted_path):
-                    # Store conversion record
-                    conversion_data = {
-                        'file_id': file_id,
-                        'original_filename': filename,
-                        'file_extension': file_extension,
-                        'file_size': os.path.getsize(original_path),
-                        'conversion_type': conversion_type,
-                        'quality_setting': quality,
-                        'status': 'completed',
-                        'converted_path': converted_path,
-                        'created_at': datetime.now().isoformat()
-                    }
-                    storage.add_conversion(conversion_data)
-                    
-                    results.append({
-                        'success': True,
-                        'filename': filename,
-                        'download_url': url_for('download_file', file_id=file_id),
-                        'file_id': file_id
-                    })
-                    
-                    # Update statistics
-                    update_stats(1)
-                    
-                    logging.info(f"Successfully converted {filename} to PDF")
-                    
-                else:
-                    # Store failed conversion
-                    conversion_data = {
-                        'file_id': file_id,
-                        'original_filename': filename,
-                        'file_extension': file_extension,
-                        'file_size': os.path.getsize(original_path),
-                        'conversion_type': conversion_type,
-                        'quality_setting': quality,
-                        'status': 'failed',
-                        'error_message': 'Conversion failed',
-                        'created_at': datetime.now().isoformat()
-                    }
-                    storage.add_conversion(conversion_data)
-                    
-                    results.append({
-                        'success': False,
-                        'filename': filename,
-                        'error': 'Conversion failed'
-                    })
+                
+                results.append(convert_stored_file(original_path, file_id, filename, conversion_type,
+                                                   request.form, trace, batch_id, batch_files, content_sha256))
                     
             except Exception as e:
-                logging.error(f"Error processing file {file.filename}: {str(e)}")
+                logger.error(f"Error processing file {file.filename}: {str(e)}")
                 results.append({
                     'success': False,
                     'filename': file.filename,
                     'error': str(e)
                 })
+            finally:
+                end_trace(trace)
         else:
             results.append({
                 'success': False,
@@ -226,6 +379,7 @@ def upload_files():
             batch_id = str(uuid.uuid4())
             output_filename = custom_name if custom_name else f"{batch_id}_merged.pdf"
             merged_path = os.path.join(app.config['CONVERTED_FOLDER'], output_filename)
+            reserve_for_request(merged_path)
             
             # Get advanced merge settings
             file_order = request.form.get('file_order')  # Comma-separated indices
@@ -247,7 +401,14 @@ def upload_files():
                     pdf_passwords[pdf_file['path']] = password
             
             pdf_paths = [f['path'] for f in pdf_files]
-            success = merge_pdfs(pdf_paths, merged_path, file_order=order_indices, passwords=pdf_passwords)
+            merge_stats = {}
+            try:
+                with in_use(*pdf_paths), scheduler.slot('merge', sum(map(os.path.getsize, pdf_paths))):
+                    success = merge_pdfs(pdf_paths, merged_path, file_order=order_indices, passwords=pdf_passwords,
+                                         stats=merge_stats, password=output_password, pages=pages)
+            except LaneTimeout as e:
+                logger.warning("PDF merge not started: %s", e)
+                success = False
             
             if success:
                 # Update statistics for batch merge
@@ -257,7 +418,8 @@ def upload_files():
                     'success': True,
                     'filename': 'Merged PDF',
                     'download_url': url_for('download_file', file_id=batch_id),
-                    'file_id': batch_id
+                    'file_id': batch_id,
+                    'merge_stats': merge_stats
                 })
             else:
                 results.append({
@@ -279,9 +441,15 @@ def upload_files():
             batch_id = str(uuid.uuid4())
             output_filename = custom_name if custom_name else f"{batch_id}_images.pdf"
             images_pdf_path = os.path.join(app.config['CONVERTED_FOLDER'], output_filename)
+            reserve_for_request(images_pdf_path)
             
             image_paths = [f['path'] for f in image_files]
-            success = convert_multiple_images_to_pdf(image_paths, images_pdf_path, quality)
+            try:
+                with in_use(*image_paths), scheduler.slot('images', sum(map(os.path.getsize, image_paths))):
+                    success = convert_multiple_images_to_pdf(image_paths, images_pdf_path, quality, output_password)
+            except LaneTimeout as e:
+                logger.warning("Images to PDF not started: %s", e)
+                success = False
             
             if success:
                 # Update statistics for images to PDF conversion
@@ -306,7 +474,92 @@ def upload_files():
                 'error': 'No valid image files found'
             })
     
-    return jsonify({'results': results})
+    response = {'results': results}
+    if len(batch_files) > 1:
+        storage.save_batch(batch_id, batch_files)
+        response['batch_id'] = batch_id
+        response['batch_download_url'] = url_for('download_batch', batch_id=batch_id)
+    return jsonify(response)
+
+@app.route('/api/uploads', methods=['POST'])
+def create_chunked_upload():
+    """Start a chunked upload; the client then PUTs each chunk and completes it"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'success': False, 'error': 'File type not supported'}), 400
+    try:
+        meta = chunked_uploads.create(filename, int(data.get('size', 0)), data.get('chunk_size'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'size and chunk_size must be integers'}), 400
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    return jsonify({
+        'success': True,
+        **meta,
+        'complete_url': url_for('complete_chunked_upload', upload_id=meta['upload_id']),
+    }), 201
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """Store one chunk at offset index * chunk_size; chunks may arrive in any order"""
+    if request.content_length is None:
+        return jsonify({'success': False, 'error': 'Content-Length is required'}), 411
+    try:
+        chunk = chunked_uploads.write_chunk(upload_id, index, request.stream, request.content_length,
+                                            request.headers.get('X-Chunk-SHA256'))
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    return jsonify({'success': True, **chunk})
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Which chunks have arrived, so an interrupted client can resume"""
+    try:
+        return jsonify({'success': True, **chunked_uploads.status(upload_id)})
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    try:
+        chunked_uploads.abort(upload_id)
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    return jsonify({'success': True})
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Assemble the upload and convert it like a file sent to /upload"""
+    options = request.get_json(silent=True) or request.form
+    conversion_type = options.get('conversion_type', 'document-to-pdf')
+    if conversion_type in ['merge-pdf', 'images-to-pdf']:
+        return jsonify({'success': False, 'error': f'{conversion_type} needs several files, use /upload'}), 400
+    try:
+        parse_page_range(options.get('page_range'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    trace = begin_trace('upload', conversion_type=conversion_type, chunked=True)
+    try:
+        meta = chunked_uploads.load(upload_id)
+        file_id = str(uuid.uuid4())
+        trace.attributes['file_id'] = file_id
+        filename = meta['filename']
+        original_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_id}_{filename}")
+        reserve_for_request(original_path)
+        with trace.span('assemble_upload'):
+            checksum = chunked_uploads.finalize(upload_id, original_path)
+            content_sha256, duplicate = blobs.adopt(original_path)
+        trace.attributes['duplicate_upload'] = duplicate
+        result = convert_stored_file(original_path, file_id, filename, conversion_type, options, trace,
+                                     content_sha256=content_sha256)
+        result['checksum'] = checksum
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    finally:
+        end_trace(trace)
+    return jsonify({'results': [result]})
 
 @app.route('/download/<file_id>')
 def download_file(file_id):
@@ -318,14 +571,165 @@ def download_file(file_id):
             if filename.startswith(file_id):
                 file_path = os.path.join(converted_folder, filename)
                 if os.path.exists(file_path):
-                    return send_file(file_path, as_attachment=True, download_name=filename)
+                    # Keeps recently downloaded files at the back of the janitor's eviction order
+                    touch(file_path)
+                    # send_file resolves relative paths against the app root, not the cwd
+                    return send_file(os.path.abspath(file_path), as_attachment=True, download_name=filename)
         
         return jsonify({'success': False, 'error': 'File not found'}), 404
         
     except Exception as e:
-        logging.error(f"Error downloading file {file_id}: {str(e)}")
+        logger.error(f"Error downloading file {file_id}: {str(e)}")
         return jsonify({'success': False, 'error': 'Download failed'}), 500
 
+def find_upload(file_id):
+    """(path, original filename) of a stored upload or a fully received chunked upload"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    prefix = f"{file_id}_"
+    for filename in os.listdir(upload_folder):
+        if filename.startswith(prefix):
+            return os.path.join(upload_folder, filename), filename[len(prefix):]
+    return chunked_uploads.data_path(file_id)
+
+@app.route('/api/preview/<file_id>')
+def preview_file(file_id):
+    """
+    Preview of an upload, so the user can check the file before waiting for
+    its conversion: a thumbnail for images, else the first page (or rows,
+    or slide) as a PDF. Also works for a chunked upload whose chunks have
+    all arrived but which is not completed yet.
+    """
+    try:
+        path, filename = find_upload(file_id)
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    extension = os.path.splitext(filename)[1].lower()
+    try:
+        cached = previews.lookup(path, extension)
+        if cached is None:
+            with in_use(path), scheduler.slot(preview_kind(path, extension), os.path.getsize(path)):
+                cached = previews.render(path, extension)
+    except PreviewUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 415
+    except LaneTimeout:
+        retry_after = admission.retry_after_seconds()
+        return jsonify({'success': False, 'error': 'Server is busy, please retry shortly',
+                        'retry_after': retry_after}), 503, {'Retry-After': str(retry_after)}
+    except Exception as e:
+        if not os.path.exists(path):
+            # Removed by the janitor or a delete while we looked it up
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+        logger.error("Preview of %s failed: %s", file_id, e)
+        return jsonify({'success': False, 'error': 'Preview failed'}), 500
+
+    preview_path, mimetype = cached
+    stem = os.path.splitext(filename)[0]
+    # The cache key is the content hash, so the ETag lets browsers revalidate for free
+    return send_file(os.path.abspath(preview_path), mimetype=mimetype, max_age=3600,
+                     download_name=f"{stem}-preview{os.path.splitext(preview_path)[1]}",
+                     etag=os.path.basename(preview_path).split('.')[0])
+
+@app.route('/download/batch/<batch_id>')
+def download_batch(batch_id):
+    """
+    Stream every output of one upload request as a single ZIP. If any output
+    has since been removed, 410 lists what is missing and what can still be
+    fetched one by one, rather than sending an incomplete ZIP.
+    """
+    files = storage.get_batch(batch_id)
+    if not files:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    
+    # Held until the last byte is sent, so the janitor cannot remove a file mid-stream
+    locks = ExitStack()
+    locks.enter_context(in_use(*(item['path'] for item in files)))
+    missing = [item for item in files if not os.path.exists(item['path'])]
+    if missing:
+        locks.close()
+        return jsonify({
+            'success': False,
+            'error': 'Some files in this batch are no longer available',
+            'missing': [item['name'] for item in missing],
+            'available': [{'name': item['name'], 'download_url': url_for('download_file', file_id=item['file_id'])}
+                          for item in files if item not in missing],
+        }), 410
+    
+    names = unique_names([item['name'] for item in files])
+    paths = [item['path'] for item in files]
+    
+    def generate():
+        with locks:
+            for path in paths:
+                touch(path)
+            yield from stream_zip(zip(names, paths))
+    
+    return Response(stream_with_context(generate()), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="fily-{batch_id[:8]}.zip"'})
+
+@app.route('/api/split/<file_id>', methods=['POST'])
+def split_upload(file_id):
+    """
+    Split an uploaded PDF and stream the parts as a ZIP, or with
+    mode=extract send the selected pages as one PDF. Options (JSON or form):
+    mode (pages, every, ranges, bookmarks, extract), every, page_range,
+    password for the parts and input_password for an encrypted upload.
+    """
+    options = request.get_json(silent=True) or request.form
+    try:
+        path, filename = find_upload(file_id)
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    if os.path.splitext(filename)[1].lower() != '.pdf':
+        return jsonify({'success': False, 'error': 'Only PDF files can be split'}), 415
+    
+    mode = options.get('mode', 'pages')
+    stem = secure_filename(os.path.splitext(filename)[0]) or 'document'
+    work_dir = tempfile.mkdtemp(prefix='.split-', dir=app.config['TEMP_FOLDER'])
+    stats = {}
+    try:
+        every = int(options['every']) if options.get('every') else None
+        pages = parse_page_range(options.get('page_range'))
+        # Parts are written under the slot and only streamed after it is released
+        with in_use(path), scheduler.slot('split', os.path.getsize(path)):
+            parts = split_pdf(path, work_dir, mode, name=stem, every=every, pages=pages,
+                              password=options.get('password') or None,
+                              input_password=options.get('input_password') or None, stats=stats)
+    except ValueError as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except LaneTimeout:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        retry_after = admission.retry_after_seconds()
+        return jsonify({'success': False, 'error': 'Server is busy, please retry shortly',
+                        'retry_after': retry_after}), 503, {'Retry-After': str(retry_after)}
+    except Exception as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if not os.path.exists(path):
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+        logger.error("Split of %s failed: %s", file_id, e)
+        return jsonify({'success': False, 'error': 'Split failed'}), 500
+    
+    if mode == 'extract':
+        download_name, part_path = parts[0]
+        # The open handle keeps the part readable once its directory is gone
+        part = open(part_path, 'rb')
+        shutil.rmtree(work_dir, ignore_errors=True)
+        response = send_file(part, mimetype='application/pdf', as_attachment=True, download_name=download_name)
+    else:
+        names = unique_names([name for name, _ in parts])
+        paths = [part_path for _, part_path in parts]
+        
+        def generate():
+            try:
+                yield from stream_zip(zip(names, paths))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        
+        response = Response(stream_with_context(generate()), mimetype='application/zip',
+                            headers={'Content-Disposition': f'attachment; filename="{stem}-split.zip"'})
+    response.headers['X-Split-Parts'] = str(stats['parts'])
+    return response
+
 @app.route('/api/recent-conversions')
 def get_recent_conversions():
     """Get recent conversion history"""
@@ -336,12 +740,33 @@ def get_recent_conversions():
             'conversions': conversions
         })
     except Exception as e:
-        logging.error(f"Error getting recent conversions: {str(e)}")
+        logger.error(f"Error getting recent conversions: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Failed to get recent conversions'
         }), 500
 
+@app.route('/api/conversions')
+def list_conversions():
+    """
+    Conversion history, newest first, one page at a time. Filters: status,
+    extension, conversion_type, since/until (ISO date or time), min_size and
+    max_size (bytes); pass next_cursor back as cursor for the next page.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', 20)), 1), 100)
+        sizes = {key: int(args[key]) for key in ('min_size', 'max_size') if args.get(key)}
+        conversions, next_cursor = storage.query_conversions(
+            limit=limit, cursor=args.get('cursor'), status=args.get('status'), extension=args.get('extension'),
+            conversion_type=args.get('conversion_type'), since=args.get('since'), until=args.get('until'), **sizes)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error("Error listing conversions: %s", e)
+        return jsonify({'success': False, 'error': 'Failed to list conversions'}), 500
+    return jsonify({'success': True, 'conversions': conversions, 'next_cursor': next_cursor})
+
 @app.route('/api/stats')
 def get_stats():
     """Get conversion statistics"""
@@ -352,7 +777,7 @@ def get_stats():
             'stats': stats
         })
     except Exception as e:
-        logging.error(f"Error getting stats: {str(e)}")
+        logger.error(f"Error getting stats: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Failed to get statistics'
@@ -396,6 +821,74 @@ def get_supported_formats():
         "categories": len(formats)
     })
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint, aggregated over all worker processes"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+def admin_required(view):
+    """Require `Authorization: Bearer <ADMIN_TOKEN>`; without ADMIN_TOKEN the admin API does not exist"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config.get('ADMIN_TOKEN')
+        if not token:
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return jsonify({'success': False, 'error': 'Admin token required'}), 401, {'WWW-Authenticate': 'Bearer'}
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/admin/profiling', methods=['POST'])
+@admin_required
+def start_profiling():
+    """
+    Arm a profiling session for all workers. Options (JSON): count (default
+    10), sample_rate (0-1, default 1), extension, conversion_type, memory
+    (also trace allocations) and duration_seconds (default 600).
+    """
+    options = request.get_json(silent=True) or {}
+    try:
+        session = profiler.start(count=int(options.get('count', 10)),
+                                 sample_rate=float(options.get('sample_rate', 1.0)),
+                                 extension=options.get('extension') or None,
+                                 conversion_type=options.get('conversion_type') or None,
+                                 memory=bool(options.get('memory')),
+                                 duration=float(options.get('duration_seconds', 600)))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'session': session}), 201
+
+@app.route('/api/admin/profiling', methods=['GET'])
+@admin_required
+def profiling_status():
+    """The armed session and the profiles of recent sessions"""
+    return jsonify({'success': True, 'active': profiler.current(), 'sessions': profiler.sessions()})
+
+@app.route('/api/admin/profiling', methods=['DELETE'])
+@admin_required
+def stop_profiling():
+    return jsonify({'success': True, 'stopped': profiler.stop()})
+
+@app.route('/api/admin/profiling/<session_id>/<name>')
+@admin_required
+def download_profile(session_id, name):
+    """One profile file: .pstats, .collapsed, .alloc.collapsed, .tracemalloc or the .json summary"""
+    try:
+        path = profiler.profile_path(session_id, name)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=name,
+                     mimetype='text/plain' if name.endswith('.collapsed') else 'application/octet-stream')
+
+@app.route('/api/queue')
+def queue_status():
+    """Current load and admission limits, for clients deciding when to upload"""
+    return jsonify({'success': True, **admission.status()})
+
 @app.route('/api/delete-conversion/<file_id>', methods=['DELETE'])
 def delete_conversion(file_id):
     """Delete a conversion record and associated files"""
@@ -411,10 +904,12 @@ def delete_conversion(file_id):
                         if os.path.exists(file_path):
                             os.remove(file_path)
                             files_deleted += 1
-                            logging.info(f"Deleted file: {file_path}")
+                            logger.info("Deleted file: %s", file_path)
         
-        # Remove from storage records
-        storage.delete_conversion(file_id)
+        # Remove from storage records, then the upload's blob unless another upload shares it
+        for record in storage.delete_conversion(file_id) or []:
+            if record.get('content_sha256'):
+                blobs.release(record['content_sha256'])
         
         return jsonify({
             'success': True,
@@ -423,7 +918,7 @@ def delete_conversion(file_id):
         })
         
     except Exception as e:
-        logging.error(f"Error deleting conversion {file_id}: {str(e)}")
+        logger.error(f"Error deleting conversion {file_id}: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Failed to delete file: {str(e)}'
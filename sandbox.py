@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+
+from metrics import SANDBOX_VIOLATIONS
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1024 * 1024
+
+# Messages a process prints when an allocation or open() hits its rlimit
+MEMORY_ERRORS = re.compile(r'bad_alloc|MemoryError|Cannot allocate memory|[Oo]ut of memory')
+OPEN_FILE_ERRORS = re.compile(r'Too many open files')
+# Processes that ignore SIGXFSZ get EFBIG instead
+OUTPUT_SIZE_ERRORS = re.compile(r'File too large')
+
+
+class ResourceLimitExceeded(Exception):
+    """The sandboxed process was stopped by one of its resource limits"""
+
+    def __init__(self, limit, message):
+        super().__init__(message)
+        self.limit = limit
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def default_limits():
+    """Limits for converter subprocesses, from the environment"""
+    return {
+        'memory_mb': _env_int('SANDBOX_MEMORY_MB', 4096),
+        'cpu_seconds': _env_int('SANDBOX_CPU_SECONDS', 60),
+        'open_files': _env_int('SANDBOX_MAX_OPEN_FILES', 1024),
+        'output_mb': _env_int('SANDBOX_MAX_OUTPUT_MB', 512),
+    }
+
+
+LIMITS = default_limits()
+
+
+def _prlimit_prefix(limits):
+    """
+    prlimit(1) command prefix applying the limits; a limit of 0 leaves that
+    resource alone. util-linux's prlimit sets them on itself and execs the
+    command, so no Python code (fork hooks, logging, allocation) runs in
+    the child between fork and exec as it would with preexec_fn.
+    """
+    prlimit = shutil.which('prlimit')
+    if prlimit is None:
+        logger.warning("prlimit not found, converter subprocesses run without resource limits")
+        return []
+    prefix = [prlimit, '--core=0']
+    if limits['memory_mb']:
+        prefix.append(f"--as={limits['memory_mb'] * MEGABYTE}")
+    if limits['cpu_seconds']:
+        # SIGXCPU at the soft limit, so it is told apart from other kills
+        prefix.append(f"--cpu={limits['cpu_seconds']}:{limits['cpu_seconds'] + 5}")
+    if limits['open_files']:
+        prefix.append(f"--nofile={limits['open_files']}")
+    if limits['output_mb']:
+        prefix.append(f"--fsize={limits['output_mb'] * MEGABYTE}")
+    return prefix + ['--']
+
+
+def _kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _signalled(returncode, signum):
+    # Killed directly (-N) or reported by a wrapper shell (128 + N)
+    return returncode in (-signum, 128 + signum)
+
+
+def _violated_limit(returncode, stderr):
+    if returncode == 0:
+        return None
+    if _signalled(returncode, signal.SIGXCPU):
+        return 'cpu'
+    if _signalled(returncode, signal.SIGXFSZ):
+        return 'output_size'
+    if stderr and MEMORY_ERRORS.search(stderr):
+        return 'memory'
+    if stderr and OPEN_FILE_ERRORS.search(stderr):
+        return 'open_files'
+    if stderr and OUTPUT_SIZE_ERRORS.search(stderr):
+        return 'output_size'
+    return None
+
+
+def run_sandboxed(cmd, timeout, limits=None):
+    """
+    Run cmd under rlimits (applied by prlimit) in a new session, and so its
+    own process group. The whole group is killed when the command exits or
+    times out, so helpers it spawned are not left behind. Returns a
+    CompletedProcess; raises FileNotFoundError, subprocess.TimeoutExpired
+    or ResourceLimitExceeded.
+    """
+    limits = LIMITS if limits is None else limits
+    if shutil.which(cmd[0]) is None:
+        # prlimit would report it as an ordinary failure
+        raise FileNotFoundError(f"No such file or directory: '{cmd[0]}'")
+    # Output goes to files, not pipes: a leftover child holding a pipe
+    # open would otherwise keep us waiting after the command has exited
+    with tempfile.TemporaryFile('w+', errors='replace') as out, \
+            tempfile.TemporaryFile('w+', errors='replace') as err:
+        process = subprocess.Popen(_prlimit_prefix(limits) + cmd, stdout=out, stderr=err,
+                                   start_new_session=True)
+        try:
+            process.wait(timeout=timeout)
+        finally:
+            _kill_group(process.pid)
+            process.wait()
+        out.seek(0)
+        err.seek(0)
+        stdout, stderr = out.read(), err.read()
+
+    limit = _violated_limit(process.returncode, stderr)
+    if limit:
+        SANDBOX_VIOLATIONS.labels(limit).inc()
+        logger.warning("%s stopped by its %s limit (exit %s)", cmd[0], limit, process.returncode)
+        raise ResourceLimitExceeded(limit, f"{cmd[0]} exceeded its {limit} limit")
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
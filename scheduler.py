@@ -0,0 +1,313 @@
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+from metrics import LANE_WAIT, LANE_WAITING
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Extensions converted by a LibreOffice subprocess
+LIBREOFFICE_EXTENSIONS = {'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'rtf', 'odt', 'ods', 'odp'}
+
+# (fixed seconds, seconds per MB) used until an extension has enough history
+PRIOR_COSTS = {
+    'libreoffice': (2.0, 1.0),
+    'image': (0.05, 0.05),
+    'pdf': (0.02, 0.05),
+    'text': (0.05, 0.3),
+}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
+
+MEGABYTE = 1024 * 1024
+
+# Slot file held by the current thread, for per-slot resources
+_held = threading.local()
+
+
+def current_slot():
+    """
+    Path of the slot file the current thread holds, or None. Only one job
+    on the host holds a slot at a time, so it can key reusable resources.
+    """
+    return getattr(_held, 'slot', None)
+
+
+class LaneTimeout(Exception):
+    """No slot in the lane became free within the wait limit"""
+
+
+class LaneFull(LaneTimeout):
+    """The lane already has its maximum number of waiters"""
+
+
+def _prior(extension):
+    if extension in LIBREOFFICE_EXTENSIONS:
+        return PRIOR_COSTS['libreoffice']
+    if extension in IMAGE_EXTENSIONS:
+        return PRIOR_COSTS['image']
+    if extension == 'pdf':
+        return PRIOR_COSTS['pdf']
+    return PRIOR_COSTS['text']
+
+
+def _record_seconds(record):
+    """Conversion time of a stored record, from its trace"""
+    trace = record.get('trace') or {}
+    for item in trace.get('spans', []):
+        if item['depth'] == 0 and item['name'].startswith('convert'):
+            return item['duration_ms'] / 1000
+    return None
+
+
+class CostModel:
+    """
+    Expected seconds for a job as fixed + rate * size. Both are fitted per
+    extension from recent conversion records once there are min_samples of
+    them; before that a per-family prior is used. Each refresh rebuilds the
+    samples from the history, which has every process's conversions;
+    observe() adds this process's own ones in between.
+    """
+
+    def __init__(self, storage=None, refresh_interval=60, min_samples=5, max_samples=200):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.samples = self._empty_samples()  # extension -> (MB, seconds)
+        self._fits = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _empty_samples(self):
+        return defaultdict(lambda: deque(maxlen=self.max_samples))
+
+    def observe(self, extension, size_bytes, seconds):
+        with self._lock:
+            self.samples[extension].append((size_bytes / MEGABYTE, seconds))
+            self._fits.pop(extension, None)
+
+    def estimate(self, extension, size_bytes):
+        self._maybe_refresh()
+        fixed, rate = self._fit(extension)
+        return fixed + rate * size_bytes / MEGABYTE
+
+    def _fit(self, extension):
+        with self._lock:
+            fit = self._fits.get(extension)
+            if fit is not None:
+                return fit
+            samples = list(self.samples.get(extension, ()))
+            if len(samples) < self.min_samples:
+                fit = _prior(extension)
+            else:
+                # The fastest run approximates the fixed cost; the rest scales with size
+                fixed = min(seconds for _, seconds in samples)
+                rate = statistics.median((seconds - fixed) / max(size, 0.01) for size, seconds in samples)
+                fit = (fixed, rate)
+            self._fits[extension] = fit
+            return fit
+
+    def _maybe_refresh(self):
+        if self.storage is None:
+            return
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_interval:
+            return
+        self._loaded_at = now
+        try:
+            records = self.storage.get_recent_conversions(limit=100)
+        except Exception as e:
+            logger.warning("Could not load conversion history: %s", e)
+            return
+        # Replaced rather than appended to: the same records come back until newer ones push them out
+        samples = self._empty_samples()
+        for record in reversed(records):
+            seconds = _record_seconds(record)
+            if record.get('status') == 'completed' and seconds is not None and record.get('file_size'):
+                kind = record.get('conversion_kind') or record.get('file_extension', '')
+                samples[kind].append((record['file_size'] / MEGABYTE, seconds))
+        with self._lock:
+            self.samples = samples
+            self._fits.clear()
+
+
+class Lane:
+    """
+    A host-wide pool of `slots` flock-ed slot files shared by every worker
+    process. Waiters register a ticket and the ticket with the lowest
+    expected cost (minus time already waited, so big jobs are not starved)
+    takes the next free slot. With max_waiting set, a job that would have
+    to queue behind that many others is refused instead.
+    """
+
+    def __init__(self, name, directory, slots, aging=1.0, poll_interval=0.02, max_waiting=None):
+        self.name = name
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.aging = aging
+        self.poll_interval = poll_interval
+        self.slot_dir = os.path.join(directory, name)
+        self.waiting_dir = os.path.join(self.slot_dir, 'waiting')
+        os.makedirs(self.waiting_dir, exist_ok=True)
+
+    @contextmanager
+    def acquire(self, cost, timeout=None):
+        if fcntl is None:
+            yield
+            return
+        if self.max_waiting is not None and self.waiting() >= self.max_waiting:
+            raise LaneFull(f"{self.name} lane queue is full ({self.max_waiting} waiting)")
+        ticket = self._enter(cost)
+        LANE_WAITING.labels(self.name).inc()
+        start = time.monotonic()
+        try:
+            slot = self._wait_for_slot(ticket, start, timeout)
+        finally:
+            LANE_WAITING.labels(self.name).dec()
+            self._leave(ticket)
+            LANE_WAIT.labels(self.name).observe(time.monotonic() - start)
+        outer, _held.slot = current_slot(), slot.name
+        try:
+            yield
+        finally:
+            _held.slot = outer
+            slot.close()
+
+    def waiting(self):
+        return sum(1 for name in os.listdir(self.waiting_dir) if not name.startswith('.'))
+
+    def _enter(self, cost):
+        name = f"{cost:014.4f}-{time.time():.6f}-{os.getpid()}-{threading.get_ident()}"
+        path = os.path.join(self.waiting_dir, name)
+        # Held while waiting, so a crashed waiter's ticket can be detected;
+        # locked before it becomes visible so it never looks abandoned
+        handle = open(os.path.join(self.waiting_dir, f".{name}"), 'w')
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        os.rename(handle.name, path)
+        return name, handle
+
+    def _leave(self, ticket):
+        name, handle = ticket
+        try:
+            os.remove(os.path.join(self.waiting_dir, name))
+        except FileNotFoundError:
+            pass
+        handle.close()
+
+    def _wait_for_slot(self, ticket, start, timeout):
+        while True:
+            if self._is_next(ticket[0]):
+                slot = self._try_slot()
+                if slot is not None:
+                    return slot
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise LaneTimeout(f"No {self.name} slot free after {timeout}s")
+            time.sleep(self.poll_interval)
+
+    def _is_next(self, own_name):
+        now = time.time()
+        best_name, best_priority = None, None
+        for name in os.listdir(self.waiting_dir):
+            if name.startswith('.'):
+                continue
+            try:
+                cost, created = (float(part) for part in name.split('-')[:2])
+            except ValueError:
+                continue
+            priority = cost - self.aging * (now - created)
+            if best_priority is None or priority < best_priority:
+                best_name, best_priority = name, priority
+        if best_name is None or best_name == own_name:
+            return True
+        if self._is_abandoned(best_name):
+            return self._is_next(own_name)
+        return False
+
+    def _is_abandoned(self, name):
+        """True (and the ticket removed) if its owner no longer holds it"""
+        path = os.path.join(self.waiting_dir, name)
+        try:
+            with open(path) as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                os.remove(path)
+                return True
+        except FileNotFoundError:
+            return True
+
+    def _try_slot(self):
+        for index in range(self.slots):
+            handle = open(os.path.join(self.slot_dir, f"slot-{index}"), 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return handle
+            except BlockingIOError:
+                handle.close()
+        return None
+
+
+class Scheduler:
+    """Route conversions to the light or heavy lane by their expected cost"""
+
+    def __init__(self, directory, light_slots, heavy_slots, heavy_threshold=2.0, wait_timeout=None,
+                 storage=None, max_heavy_waiting=None):
+        self.lanes = {
+            'light': Lane('light', directory, light_slots),
+            'heavy': Lane('heavy', directory, heavy_slots, max_waiting=max_heavy_waiting),
+        }
+        self.heavy_threshold = heavy_threshold
+        self.wait_timeout = wait_timeout
+        self.cost_model = CostModel(storage)
+
+    def classify(self, extension, size_bytes):
+        """Return (lane name, expected seconds)"""
+        extension = extension.lower()
+        cost = self.cost_model.estimate(extension, size_bytes)
+        heavy = extension in LIBREOFFICE_EXTENSIONS or cost >= self.heavy_threshold
+        return ('heavy' if heavy else 'light'), cost
+
+    @contextmanager
+    def slot(self, extension, size_bytes):
+        """Wait for a slot in the job's lane, run the body, record its time"""
+        lane, cost = self.classify(extension, size_bytes)
+        with ExitStack() as stack:
+            with span(f"queue {lane}"):
+                stack.enter_context(self.lanes[lane].acquire(cost, self.wait_timeout))
+            start = time.perf_counter()
+            yield lane
+            self.cost_model.observe(extension.lower(), size_bytes, time.perf_counter() - start)
+
+    def queue_depth(self):
+        return {name: lane.waiting() for name, lane in self.lanes.items()}
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def create_scheduler(app, storage=None):
+    """Build the scheduler from app config and environment"""
+    cpus = os.cpu_count() or 2
+    heavy_slots = int(_env_number('HEAVY_LANE_SLOTS', max(1, cpus // 2)))
+    return Scheduler(
+        os.path.join(app.config['TEMP_FOLDER'], '.lanes'),
+        light_slots=int(_env_number('LIGHT_LANE_SLOTS', cpus)),
+        heavy_slots=heavy_slots,
+        heavy_threshold=_env_number('HEAVY_JOB_SECONDS', 2.0),
+        wait_timeout=_env_number('LANE_WAIT_TIMEOUT', 60),
+        storage=storage,
+        max_heavy_waiting=max(1, int(_env_number('MAX_HEAVY_WAITING', 4 * heavy_slots))),
+    )
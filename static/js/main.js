@@ -285,6 +285,8 @@ class FilyPro {
         formData.append('conversion_type', this.selectedType);
         formData.append('quality', document.getElementById('qualitySelect').value);
         formData.append('custom_name', document.getElementById('customName').value);
+        formData.append('page_range', document.getElementById('pageRange').value);
+        formData.append('sheet', document.getElementById('sheetName').value);
         
         // Add image format conversion options
         if (this.selectedType === 'image-converter') {
@@ -324,14 +326,22 @@ class FilyPro {
                 body: formData
             });
 
+            if (response.status === 503) {
+                // Server is at capacity; nothing was converted, so the files stay selected for a retry
+                const retryAfter = response.headers.get('Retry-After') || '5';
+                this.showWarning(`Server is busy. Please try again in ${retryAfter} seconds.`);
+                this.endConversion();
+                return;
+            }
+
             this.updateProgress(50, 'Converting files...');
 
             const result = await response.json();
-            
+
             this.updateProgress(100, 'Conversion completed!');
 
             if (result.results) {
-                this.handleConversionResults(result.results);
+                this.handleConversionResults(result.results, result.batch_download_url);
             }
 
         } catch (error) {
@@ -340,19 +350,24 @@ class FilyPro {
         }
 
         setTimeout(() => {
-            this.isConverting = false;
-            this.convertButton.disabled = false;
-            this.progressSection.style.display = 'none';
+            this.endConversion();
             this.loadRecentConversions();
         }, 2000);
     }
 
+    endConversion() {
+        this.isConverting = false;
+        this.convertButton.disabled = false;
+        this.progressSection.style.display = 'none';
+        this.updateProgress(0, '');
+    }
+
     updateProgress(percent, text) {
         this.progressBar.style.width = percent + '%';
         this.progressText.textContent = text;
     }
 
-    handleConversionResults(results) {
+    handleConversionResults(results, batchDownloadUrl) {
         const successCount = results.filter(r => r.success).length;
         const totalCount = results.length;
 
@@ -370,6 +385,11 @@ class FilyPro {
         } else {
             this.showError('All conversions failed. Please check your files and try again.');
         }
+
+        // Several outputs come down as one ZIP instead of one request each
+        if (successCount > 1 && batchDownloadUrl) {
+            window.open(batchDownloadUrl, '_blank');
+        }
     }
 
     showSuccess(message) {
@@ -1,8 +1,41 @@
+import base64
 import json
 import logging
 import os
-from datetime import datetime
-from typing import Dict, List, Any
+import sqlite3
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+from metrics import track_storage_write
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS conversions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT,
+    created_at TEXT NOT NULL,
+    status TEXT,
+    file_extension TEXT,
+    conversion_type TEXT,
+    file_size INTEGER,
+    page_count INTEGER,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversions_created ON conversions (created_at, seq);
+CREATE INDEX IF NOT EXISTS conversions_status ON conversions (status, created_at, seq);
+CREATE INDEX IF NOT EXISTS conversions_extension ON conversions (file_extension, created_at, seq);
+CREATE INDEX IF NOT EXISTS conversions_type ON conversions (conversion_type, created_at, seq);
+CREATE INDEX IF NOT EXISTS conversions_file_id ON conversions (file_id);
+'''
 
 class LocalStorage:
     """Simple file-based storage for conversion history and stats"""
@@ -12,16 +45,21 @@ class LocalStorage:
         os.makedirs(self.data_dir, exist_ok=True)
         
         # Storage files
-        self.conversions_file = os.path.join(self.data_dir, 'conversions.json')
+        self.conversions_file = os.path.join(self.data_dir, 'conversions.json')  # before history.db, migrated once
+        # Conversion records, indexed for paging and filtering newest first
+        self.history_file = os.path.join(self.data_dir, 'history.db')
         self.stats_file = os.path.join(self.data_dir, 'stats.json')
+        self.lock_file = os.path.join(self.data_dir, '.storage.lock')
+        # One manifest per multi-file upload, removed by the janitor with the outputs
+        self.batches_dir = os.path.join(self.data_dir, 'batches')
+        os.makedirs(self.batches_dir, exist_ok=True)
         
         # Initialize files if they don't exist
         self._init_storage()
     
     def _init_storage(self):
         """Initialize storage files with empty data"""
-        if not os.path.exists(self.conversions_file):
-            self._save_json(self.conversions_file, [])
+        self._init_history()
         
         if not os.path.exists(self.stats_file):
             self._save_json(self.stats_file, {
@@ -32,6 +70,72 @@ class LocalStorage:
                 'last_updated': datetime.now().isoformat()
             })
     
+    def _init_history(self):
+        """Create the history index and import the records of conversions.json once"""
+        with self._history(write=True) as db:
+            # executescript() would commit the open transaction first
+            for statement in HISTORY_SCHEMA.split(';'):
+                if statement.strip():
+                    db.execute(statement)
+            if db.execute('PRAGMA user_version').fetchone()[0] == 0:
+                records = self._load_json(self.conversions_file)
+                for record in records:
+                    record.setdefault('created_at', datetime.now().isoformat())
+                    self._insert(db, record)
+                db.execute('PRAGMA user_version = 1')
+                if records:
+                    logger.info("Imported %s conversion record(s) from %s", len(records), self.conversions_file)
+        # Readers do not block the writer, and a write commits without rewriting the file
+        with self._history() as db:
+            db.execute('PRAGMA journal_mode = WAL')
+    
+    @contextmanager
+    def _history(self, write=False):
+        """
+        Connection to the history index. With write=True the block runs in
+        one transaction that holds the write lock from its first statement,
+        so a read-modify-write cannot interleave with another writer.
+        """
+        db = sqlite3.connect(self.history_file, timeout=30, isolation_level=None)
+        try:
+            if not write:
+                yield db
+                return
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _insert(db, record):
+        cursor = db.execute(
+            'INSERT INTO conversions (file_id, created_at, status, file_extension, conversion_type, file_size, '
+            'page_count, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (record.get('file_id'), record['created_at'], record.get('status'), record.get('file_extension'),
+             record.get('conversion_type'), record.get('file_size'),
+             (record.get('metadata') or {}).get('page_count'), json.dumps(record, ensure_ascii=False)))
+        return cursor.lastrowid
+    
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the host-wide storage lock for a read-modify-write. Request
+        threads, every worker and the janitor (in the gunicorn master under
+        preload) all write these files, so unlocked updates would lose records.
+        """
+        if fcntl is None:
+            yield
+            return
+        # A fresh open file per holder, so threads of one process exclude each other too
+        with open(self.lock_file, 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+    
     def _load_json(self, filepath: str) -> Any:
         """Load JSON data from file"""
         try:
@@ -41,44 +145,128 @@ class LocalStorage:
             return [] if 'conversions' in filepath else {}
     
     def _save_json(self, filepath: str, data: Any):
-        """Save JSON data to file"""
+        """Save JSON data to file, replacing it whole so readers never see a partial file"""
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with track_storage_write(filepath):
+                fd, tmp_path = tempfile.mkstemp(prefix='.', dir=self.data_dir)
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, indent=2, ensure_ascii=False)
+                    os.replace(tmp_path, filepath)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
         except Exception as e:
             print(f"Error saving {filepath}: {e}")
     
     def add_conversion(self, conversion_data: Dict[str, Any]):
         """Add a new conversion record"""
-        conversions = self._load_json(self.conversions_file)
-        
         # Add timestamp if not provided
         conversion_data['created_at'] = conversion_data.get('created_at', datetime.now().isoformat())
-        conversion_data['id'] = len(conversions) + 1
-        
-        conversions.append(conversion_data)
+        with track_storage_write(self.history_file), self._history(write=True) as db:
+            conversion_data['id'] = self._insert(db, conversion_data)
+        with self._locked():
+            self._update_stats(conversion_data)
+    
+    def get_recent_conversions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get recent conversion records, newest first"""
+        return self.query_conversions(limit=limit)[0]
+    
+    def query_conversions(self, limit: int = 20, cursor: Optional[str] = None, status: Optional[str] = None,
+                          extension: Optional[str] = None, conversion_type: Optional[str] = None,
+                          since: Optional[str] = None, until: Optional[str] = None,
+                          min_size: Optional[int] = None, max_size: Optional[int] = None):
+        """
+        One page of conversion records, newest first, and the cursor of the
+        next page (None on the last one). since/until are ISO dates or
+        times, a date-only until includes that whole day. The page is read
+        from the index matching the filters in created_at order, so its cost
+        follows the page size; the size bounds are checked row by row.
+        Raises ValueError for a malformed cursor or date.
+        """
+        where, params = [], []
+        for column, value in (('status', status), ('file_extension', extension and extension.lower()),
+                              ('conversion_type', conversion_type)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            where.append('created_at >= ?')
+            params.append(_iso_bound(since))
+        if until:
+            where.append('created_at < ?')
+            params.append(_iso_bound(until, end=True))
+        if min_size is not None:
+            where.append('file_size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            where.append('file_size <= ?')
+            params.append(max_size)
+        if cursor:
+            where.append('(created_at, seq) < (?, ?)')
+            params.extend(_decode_cursor(cursor))
         
-        # Keep only last 100 conversions to prevent file from getting too large
-        if len(conversions) > 100:
-            conversions = conversions[-100:]
+        sql = 'SELECT seq, created_at, record FROM conversions'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY created_at DESC, seq DESC LIMIT ?'
+        with self._history() as db:
+            rows = db.execute(sql, params + [limit + 1]).fetchall()
         
-        self._save_json(self.conversions_file, conversions)
-        self._update_stats(conversion_data)
+        records = []
+        for seq, _, record in rows[:limit]:
+            record = json.loads(record)
+            record['id'] = seq
+            records.append(record)
+        next_cursor = _encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return records, next_cursor
     
-    def get_recent_conversions(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get recent conversion records"""
-        conversions = self._load_json(self.conversions_file)
-        return conversions[-limit:] if conversions else []
+    def prune_history(self, max_age_days):
+        """Delete conversion records older than max_age_days; returns how many"""
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        with self._history(write=True) as db:
+            deleted = db.execute('DELETE FROM conversions WHERE created_at < ?', (cutoff,)).rowcount
+        if deleted:
+            logger.info("Pruned %s conversion record(s) older than %s days", deleted, max_age_days)
+        return deleted
+    
+    def save_batch(self, batch_id: str, files: List[Dict[str, Any]]):
+        """
+        Record the outputs of one upload request (file_id, name, path each),
+        kept apart from the conversion history so it survives its trimming
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=self.batches_dir)
+        with track_storage_write(self.batches_dir), os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'batch_id': batch_id, 'created_at': datetime.now().isoformat(), 'files': files}, f)
+        os.replace(tmp_path, self._batch_path(batch_id))
+    
+    def get_batch(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Outputs of one upload request in upload order, or None if unknown"""
+        try:
+            with open(self._batch_path(batch_id), 'r', encoding='utf-8') as f:
+                return json.load(f)['files']
+        except (ValueError, FileNotFoundError):
+            return None
+    
+    def _batch_path(self, batch_id):
+        # Raises ValueError for anything but a UUID, so the id cannot name another path
+        return os.path.join(self.batches_dir, f"{uuid.UUID(batch_id)}.json")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get conversion statistics"""
         stats = self._load_json(self.stats_file)
-        conversions = self._load_json(self.conversions_file)
+        with self._history() as db:
+            # Page counts are stored with each record, so no file is re-opened here
+            total, successful, failed, pages = db.execute(
+                "SELECT count(*), count(CASE WHEN status = 'completed' THEN 1 END), "
+                "count(CASE WHEN status = 'failed' THEN 1 END), coalesce(sum(page_count), 0) FROM conversions"
+            ).fetchone()
         
         # Update stats with current data
-        stats['total_conversions'] = len(conversions)
-        stats['successful_conversions'] = len([c for c in conversions if c.get('status') == 'completed'])
-        stats['failed_conversions'] = len([c for c in conversions if c.get('status') == 'failed'])
+        stats['total_conversions'] = total
+        stats['successful_conversions'] = successful
+        stats['failed_conversions'] = failed
+        stats['total_pages'] = pages
         
         # Calculate success rate
         if stats['total_conversions'] > 0:
@@ -89,7 +277,7 @@ class LocalStorage:
         return stats
     
     def _update_stats(self, conversion_data: Dict[str, Any]):
-        """Update statistics with new conversion data"""
+        """Update statistics with new conversion data; called with the storage lock held"""
         stats = self._load_json(self.stats_file)
         
         # Update popular formats
@@ -102,22 +290,61 @@ class LocalStorage:
         
         self._save_json(self.stats_file, stats)
 
+    def count_processed(self, files_processed: int = 1):
+        """Bump the request counters shown by /api/stats"""
+        with self._locked():
+            stats = self._load_json(self.stats_file)
+            stats['total_conversions'] = stats.get('total_conversions', 0) + 1
+            stats['total_files_processed'] = stats.get('total_files_processed', 0) + files_processed
+            self._save_json(self.stats_file, stats)
+
+    def mark_expired(self, file_id):
+        """Flag a conversion whose output file was removed by the janitor"""
+        with self._history(write=True) as db:
+            for seq, record in db.execute('SELECT seq, record FROM conversions WHERE file_id = ?',
+                                          (file_id,)).fetchall():
+                record = json.loads(record)
+                record['files_expired'] = True
+                record['expired_at'] = datetime.now().isoformat()
+                db.execute('UPDATE conversions SET record = ? WHERE seq = ?',
+                           (json.dumps(record, ensure_ascii=False), seq))
+
     def delete_conversion(self, file_id):
-        """Delete a conversion record from storage"""
+        """Delete the conversion records of file_id; returns the deleted records, or None on error"""
         try:
-            conversions = self._load_json(self.conversions_file)
-            # Filter out the conversion with matching file_id
-            updated_conversions = [conv for conv in conversions if conv.get('file_id') != file_id]
-            
-            # Save updated list
-            self._save_json(self.conversions_file, updated_conversions)
+            with self._history(write=True) as db:
+                deleted = [json.loads(record) for record, in db.execute(
+                    'SELECT record FROM conversions WHERE file_id = ?', (file_id,)).fetchall()]
+                db.execute('DELETE FROM conversions WHERE file_id = ?', (file_id,))
             
-            logging.info(f"Deleted conversion record for file_id: {file_id}")
-            return True
+            logger.info("Deleted conversion record for file_id: %s", file_id)
+            return deleted
             
         except Exception as e:
-            logging.error(f"Error deleting conversion record {file_id}: {str(e)}")
-            return False
+            logger.error(f"Error deleting conversion record {file_id}: {str(e)}")
+            return None
+
+def _iso_bound(value, end=False):
+    """created_at bound for an ISO date or time; a date-only end bound covers that whole day"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        # Records hold naive local times
+        moment = moment.astimezone().replace(tzinfo=None)
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment.isoformat()
+
+def _encode_cursor(created_at, seq):
+    return base64.urlsafe_b64encode(json.dumps([created_at, seq]).encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        created_at, seq = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(created_at, str) or not isinstance(seq, int):
+        raise ValueError('Invalid cursor')
+    return created_at, seq
 
 # Global storage instance
 storage = LocalStorage()
\ No newline at end of file
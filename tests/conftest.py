@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Write a PDF with one page per label; logo_path draws the same image on every page"""
+    from reportlab.pdfgen import canvas
+
+    def make(name, labels, logo_path=None):
+        path = str(tmp_path / name)
+        pdf = canvas.Canvas(path)
+        for label in labels:
+            pdf.drawString(72, 720, label)
+            if logo_path:
+                pdf.drawImage(logo_path, 72, 500, width=100, height=100)
+            pdf.showPage()
+        pdf.save()
+        return path
+
+    return make
+
+
+@pytest.fixture
+def logo(tmp_path):
+    """A small noisy PNG, so its image stream is worth deduplicating"""
+    from PIL import Image
+
+    path = str(tmp_path / 'logo.png')
+    Image.effect_noise((64, 64), 80).convert('RGB').save(path)
+    return path
+
+
+def page_texts(path, password=None):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    if password:
+        reader.decrypt(password)
+    return [page.extract_text().strip() for page in reader.pages]
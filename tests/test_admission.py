@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from admission import AdmissionController, InflightRegistry
+from scheduler import Scheduler
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def admission(tmp_path):
+    scheduler = Scheduler(str(tmp_path / 'lanes'), light_slots=1, heavy_slots=1)
+    return AdmissionController(str(tmp_path / 'inflight'), scheduler, max_requests=2, max_bytes=10 * MB,
+                               max_queued=4)
+
+
+def test_request_limit(admission):
+    first, _ = admission.admit(MB)
+    second, _ = admission.admit(MB)
+
+    assert admission.admit(MB) == (None, 'requests')
+    admission.release(first)
+    third, reason = admission.admit(MB)
+    assert reason is None
+    for ticket in (second, third):
+        admission.release(ticket)
+
+
+def test_byte_limit_applies_alongside_other_uploads(admission):
+    # A single upload larger than the limit is still let through on its own
+    alone, reason = admission.admit(20 * MB)
+    assert reason is None
+    admission.release(alone)
+
+    ticket, _ = admission.admit(6 * MB)
+    assert admission.admit(6 * MB) == (None, 'bytes')
+    admission.release(ticket)
+
+
+def test_queue_limit(admission, tmp_path):
+    lane = admission.scheduler.lanes['heavy']
+    for index in range(4):
+        open(os.path.join(lane.waiting_dir, f'{index:014.4f}-0-0-0'), 'w').close()
+
+    assert admission.admit(MB) == (None, 'queue')
+
+
+def test_tickets_of_dead_requests_are_dropped(tmp_path):
+    registry = InflightRegistry(str(tmp_path))
+    name, handle = registry.register(5 * MB)
+    # Closing the handle without removing the file is what a killed worker leaves
+    handle.close()
+
+    assert registry.totals() == (1, 5 * MB)
+    assert registry.totals(verify=True) == (0, 0)
+    assert not os.path.exists(os.path.join(str(tmp_path), name))
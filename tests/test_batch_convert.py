@@ -0,0 +1,101 @@
+import io
+import json
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from batch_convert import MANIFEST_NAME, Dispatcher, parse_limits, run
+
+
+@pytest.fixture
+def tree(tmp_path):
+    source = tmp_path / 'src'
+    (source / 'sub').mkdir(parents=True)
+    for name in ('a.txt', 'b.md', 'sub/c.txt', 'sub/c.csv'):
+        (source / name).write_text(f'{name}\n')
+    (source / '.hidden.txt').write_text('skipped')
+    return str(source), str(tmp_path / 'out')
+
+
+def statuses(results):
+    return {entry['path']: entry['status'] for entry in results}
+
+
+def test_tree_is_converted_into_mirror(tree):
+    source, output = tree
+
+    results = run(source, output, 2, {'text': 1}, progress_stream=io.StringIO())
+
+    assert set(statuses(results).values()) == {'converted'}
+    # Inputs of one directory sharing a stem keep their extension in the output name
+    for name in ('a.pdf', 'b.pdf', 'sub/c.txt.pdf', 'sub/c.csv.pdf'):
+        assert os.path.getsize(os.path.join(output, name)) > 0
+    assert not any(name.startswith('.') and name != MANIFEST_NAME for name in os.listdir(output))
+
+
+def test_rerun_skips_done_files_and_copies_moved_ones(tree):
+    source, output = tree
+    run(source, output, 1, {}, progress_stream=io.StringIO())
+    os.rename(os.path.join(source, 'a.txt'), os.path.join(source, 'moved.txt'))
+    with open(os.path.join(source, 'b.md'), 'a') as f:
+        f.write('changed\n')
+
+    results = run(source, output, 1, {}, progress_stream=io.StringIO())
+
+    assert statuses(results) == {'moved.txt': 'copied', 'b.md': 'converted'}
+    with open(os.path.join(output, MANIFEST_NAME)) as f:
+        assert len([json.loads(line) for line in f]) == 6
+
+
+def test_dead_worker_is_replaced_and_its_jobs_retried(tree, monkeypatch):
+    import converter
+
+    source, output = tree
+    for i in range(6):
+        with open(os.path.join(source, f'more{i}.txt'), 'w') as f:
+            f.write(f'{i}\n')
+    calls = output + '.calls'
+    convert_to_pdf = converter.convert_to_pdf
+
+    def crash_once(input_path, *args, **kwargs):
+        # Runs in the forked workers; the calls file survives the crash
+        if os.path.basename(input_path) == 'a.txt':
+            with open(calls, 'a') as f:
+                f.write('call\n')
+            with open(calls) as f:
+                if len(f.readlines()) == 1:
+                    os._exit(1)
+        return convert_to_pdf(input_path, *args, **kwargs)
+
+    monkeypatch.setattr(converter, 'convert_to_pdf', crash_once)
+
+    results = run(source, output, 2, {}, progress_stream=io.StringIO())
+
+    assert set(statuses(results).values()) == {'converted'}
+    assert len(results) == 10
+    with open(calls) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_late_failure_of_replaced_pool_keeps_new_pool():
+    dispatcher = Dispatcher(1, {})
+    pool = dispatcher.executor
+    stale = Future()
+    stale.set_exception(BrokenProcessPool())
+    job = {'attempts': 0}
+    dispatcher.running[stale] = ('text', job, object())
+    dispatcher.active['text'] += 1
+    try:
+        assert dispatcher.collect(timeout=1) == []
+        assert dispatcher.executor is pool
+        assert list(dispatcher.queues['text']) == [job] and job['attempts'] == 1
+    finally:
+        dispatcher.close()
+
+
+def test_parse_limits():
+    assert parse_limits(['image=2,docx=1'], 4) == {'libreoffice': 2, 'image': 2, 'docx': 1}
+    with pytest.raises(ValueError):
+        parse_limits(['image'], 4)
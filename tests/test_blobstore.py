@@ -0,0 +1,78 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from blobstore import BlobStore
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return BlobStore(str(tmp_path / '.blobs'))
+
+
+def test_repeated_upload_is_a_link_to_one_blob(blobs, tmp_path):
+    data = os.urandom(4096)
+    first, second = str(tmp_path / 'a_scan.pdf'), str(tmp_path / 'b_scan.pdf')
+
+    assert blobs.store(io.BytesIO(data), first) == (hashlib.sha256(data).hexdigest(), False)
+    digest, duplicate = blobs.store(io.BytesIO(data), second)
+
+    assert duplicate
+    assert os.stat(first).st_ino == os.stat(second).st_ino == os.stat(blobs.blob_path(digest)).st_ino
+    with open(second, 'rb') as f:
+        assert f.read() == data
+
+
+def test_unseekable_stream_and_adopted_file_are_deduplicated(blobs, tmp_path):
+    data = os.urandom(4096)
+    streamed, assembled = str(tmp_path / 'a_x.bin'), str(tmp_path / 'b_x.bin')
+    blobs.store(Unseekable(data), streamed)
+    with open(assembled, 'wb') as f:
+        f.write(data)
+
+    digest, duplicate = blobs.adopt(assembled)
+
+    assert duplicate
+    assert os.stat(assembled).st_ino == os.stat(streamed).st_ino
+    assert os.stat(blobs.blob_path(digest)).st_nlink == 3
+
+
+def test_blob_is_released_with_its_last_name(blobs, tmp_path):
+    names = [str(tmp_path / f'{i}_doc.txt') for i in range(2)]
+    for name in names:
+        digest, _ = blobs.store(io.BytesIO(b'same bytes'), name)
+
+    os.remove(names[0])
+    assert not blobs.release(digest)
+    os.remove(names[1])
+    assert blobs.release(digest)
+    assert not os.path.exists(blobs.blob_path(digest))
+
+
+def test_collect_removes_only_unreferenced_blobs(blobs, tmp_path):
+    kept, dropped = str(tmp_path / 'a_kept.txt'), str(tmp_path / 'b_dropped.txt')
+    kept_digest, _ = blobs.store(io.BytesIO(b'kept'), kept)
+    dropped_digest, _ = blobs.store(io.BytesIO(b'dropped'), dropped)
+    os.remove(dropped)
+
+    assert blobs.collect() == 1
+    assert os.path.exists(blobs.blob_path(kept_digest))
+    assert not os.path.exists(blobs.blob_path(dropped_digest))
+
+
+def test_blob_path_rejects_non_digests(blobs):
+    with pytest.raises(ValueError):
+        blobs.blob_path('../../etc/passwd')
@@ -0,0 +1,89 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from chunked_upload import ChunkedUploadError, ChunkedUploads
+
+KB = 1024
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return ChunkedUploads(str(tmp_path / 'chunks'), max_bytes=10 * 1024 * KB, chunk_size=64 * KB,
+                          max_chunk_size=1024 * KB, quota_bytes=4 * 1024 * KB, ttl_seconds=60)
+
+
+def send(uploads, upload_id, data, index, chunk_size=64 * KB, sha256=None):
+    chunk = data[index * chunk_size:(index + 1) * chunk_size]
+    return uploads.write_chunk(upload_id, index, io.BytesIO(chunk), len(chunk), sha256)
+
+
+def test_chunks_in_any_order_assemble_the_file(uploads, tmp_path):
+    data = os.urandom(150 * KB)
+    meta = uploads.create('scan.pdf', len(data))
+    assert meta['chunk_count'] == 3
+
+    for index in (2, 0, 1):
+        send(uploads, meta['upload_id'], data, index)
+    destination = str(tmp_path / 'scan.pdf')
+    checksum = uploads.finalize(meta['upload_id'], destination)
+
+    with open(destination, 'rb') as f:
+        assert f.read() == data
+    digests = b''.join(hashlib.sha256(data[i:i + 64 * KB]).digest() for i in range(0, len(data), 64 * KB))
+    assert checksum == hashlib.sha256(digests).hexdigest()
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.load(meta['upload_id'])
+    assert error.value.status == 404
+
+
+def test_status_lists_missing_chunks_for_resume(uploads):
+    data = os.urandom(150 * KB)
+    meta = uploads.create('scan.pdf', len(data))
+    send(uploads, meta['upload_id'], data, 1)
+
+    status = uploads.status(meta['upload_id'])
+
+    assert status['missing'] == [0, 2]
+    assert status['bytes_received'] == 64 * KB
+    assert not status['complete']
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.finalize(meta['upload_id'], 'unused')
+    assert error.value.status == 409
+
+
+def test_checksum_mismatch_leaves_chunk_missing(uploads):
+    data = os.urandom(100 * KB)
+    meta = uploads.create('scan.pdf', len(data))
+
+    with pytest.raises(ChunkedUploadError) as error:
+        send(uploads, meta['upload_id'], data, 0, sha256='0' * 64)
+
+    assert error.value.status == 422
+    assert uploads.status(meta['upload_id'])['missing'] == [0, 1]
+
+
+def test_wrong_chunk_length_is_rejected(uploads):
+    meta = uploads.create('scan.pdf', 100 * KB)
+
+    with pytest.raises(ChunkedUploadError):
+        uploads.write_chunk(meta['upload_id'], 1, io.BytesIO(b'x' * 10), 10)
+
+
+def test_quota_refuses_new_sessions(uploads):
+    uploads.create('big.bin', 3 * 1024 * KB)
+
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.create('more.bin', 2 * 1024 * KB)
+    assert error.value.status == 503
+
+
+def test_sweep_removes_idle_sessions(uploads):
+    meta = uploads.create('scan.pdf', 100 * KB)
+
+    uploads.sweep(now=meta['created_at'] + 3600)
+
+    with pytest.raises(ChunkedUploadError):
+        uploads.status(meta['upload_id'])
@@ -0,0 +1,200 @@
+import os
+import subprocess
+
+import pytest
+from PyPDF2 import PdfReader
+
+from conftest import page_texts
+from converter import (PageRangeError, copy_pdf_pages, convert_to_pdf, get_quality_profile, merge_pdfs,
+                       optimize_pdf_output, parse_page_range, split_pdf)
+
+
+def test_parse_page_range():
+    assert parse_page_range('1,3-5') == ((1, 1), (3, 5))
+    assert parse_page_range(' 2 - 4 ') == ((2, 4),)
+    assert parse_page_range('') is None
+    assert parse_page_range(None) is None
+
+
+@pytest.mark.parametrize('spec', ['0', '5-3', 'a', '1,,2', '-2'])
+def test_parse_page_range_rejects_malformed(spec):
+    with pytest.raises(ValueError):
+        parse_page_range(spec)
+
+
+def test_merge_selects_pages_of_merged_document(make_pdf, tmp_path):
+    inputs = [make_pdf(f'in{i}.pdf', [f'{i}-{p}' for p in range(1, 4)]) for i in range(3)]
+    output = str(tmp_path / 'merged.pdf')
+    stats = {}
+
+    assert merge_pdfs(inputs, output, pages=parse_page_range('2,4-5'), stats=stats)
+
+    assert page_texts(output) == ['0-2', '1-1', '1-2']
+    assert stats['pages'] == 3
+
+
+def test_merge_encrypts_output(make_pdf, tmp_path):
+    inputs = [make_pdf(f'in{i}.pdf', [f'doc {i}']) for i in range(2)]
+    output = str(tmp_path / 'merged.pdf')
+
+    assert merge_pdfs(inputs, output, password='s3cret')
+
+    assert PdfReader(output).is_encrypted
+    assert page_texts(output, password='s3cret') == ['doc 0', 'doc 1']
+
+
+def test_copy_pdf_pages_rejects_missing_pages(make_pdf, tmp_path):
+    source = make_pdf('two.pdf', ['one', 'two'])
+
+    with pytest.raises(PageRangeError):
+        copy_pdf_pages(source, str(tmp_path / 'out.pdf'), parse_page_range('5'))
+
+
+def test_convert_pdf_page_range(make_pdf, tmp_path):
+    source = make_pdf('five.pdf', [f'p{i}' for i in range(1, 6)])
+    output = str(tmp_path / 'out.pdf')
+
+    assert convert_to_pdf(source, output, 'five.pdf', quality='high', page_range='2,4')
+
+    assert page_texts(output) == ['p2', 'p4']
+
+
+def test_convert_text_records_word_count(tmp_path):
+    source = tmp_path / 'notes.txt'
+    source.write_text('one two three\n\nfour five')
+    stats = {}
+
+    assert convert_to_pdf(str(source), str(tmp_path / 'notes.pdf'), 'notes.txt', stats=stats)
+
+    assert stats['word_count'] == 5
+
+
+def test_page_range_has_no_word_count(tmp_path):
+    source = tmp_path / 'notes.txt'
+    source.write_text('\n'.join(f'line {i}' for i in range(200)))
+    output = str(tmp_path / 'notes.pdf')
+    stats = {}
+
+    assert convert_to_pdf(str(source), output, 'notes.txt', stats=stats, page_range='1')
+
+    assert len(PdfReader(output).pages) == 1
+    assert 'word_count' not in stats
+
+
+@pytest.mark.parametrize('mode, options, expected', [
+    ('pages', {}, [['p1'], ['p2'], ['p3'], ['p4'], ['p5']]),
+    ('every', {'every': 2}, [['p1', 'p2'], ['p3', 'p4'], ['p5']]),
+    ('ranges', {'pages': parse_page_range('2,4-9')}, [['p2'], ['p4', 'p5']]),
+    ('extract', {'pages': parse_page_range('4,1')}, [['p1', 'p4']]),
+])
+def test_split_pdf_modes(make_pdf, tmp_path, mode, options, expected):
+    source = make_pdf('five.pdf', [f'p{i}' for i in range(1, 6)])
+    stats = {}
+
+    parts = split_pdf(source, str(tmp_path), mode, name='five', stats=stats, **options)
+
+    assert [page_texts(path) for _, path in parts] == expected
+    assert stats['parts'] == len(expected)
+    assert parts[0][0].startswith('five_')
+
+
+def test_split_pdf_by_bookmarks(tmp_path):
+    from reportlab.pdfgen import canvas
+
+    source = str(tmp_path / 'book.pdf')
+    pdf = canvas.Canvas(source)
+    for page, chapter in enumerate([None, 'One', None, 'Two']):
+        pdf.drawString(72, 720, f'page {page + 1}')
+        if chapter:
+            pdf.bookmarkPage(chapter)
+            pdf.addOutlineEntry(chapter, chapter)
+        pdf.showPage()
+    pdf.save()
+
+    parts = split_pdf(source, str(tmp_path), 'bookmarks', name='book')
+
+    assert [name for name, _ in parts] == ['book_01 front matter.pdf', 'book_02 One.pdf', 'book_03 Two.pdf']
+    assert [len(page_texts(path)) for _, path in parts] == [1, 2, 1]
+
+
+def test_split_pdf_rejects_pages_beyond_document(make_pdf, tmp_path):
+    source = make_pdf('two.pdf', ['one', 'two'])
+
+    with pytest.raises(PageRangeError):
+        split_pdf(source, str(tmp_path), 'ranges', pages=parse_page_range('3-4'))
+
+
+def test_quality_profiles():
+    assert get_quality_profile('unknown') == get_quality_profile('high')
+    assert not get_quality_profile('high')['optimize']
+    assert get_quality_profile('low')['image_dpi'] < get_quality_profile('medium')['image_dpi']
+
+
+def test_optimize_output_downsamples_for_medium(make_pdf, tmp_path):
+    from PIL import Image
+
+    photo = str(tmp_path / 'photo.png')
+    Image.effect_noise((1500, 1500), 80).convert('RGB').save(photo)
+    source, output = make_pdf('photo.pdf', ['photo'], logo_path=photo), str(tmp_path / 'out.pdf')
+    stats = {}
+
+    assert optimize_pdf_output(source, output, 'medium', stats=stats)
+
+    assert stats['images_downsampled'] == 1
+    assert stats['output_size'] == os.path.getsize(output) < stats['unoptimized_size']
+    assert page_texts(output) == ['photo']
+
+
+def test_optimize_output_keeps_original_when_not_smaller(make_pdf, tmp_path, monkeypatch):
+    import pdf_tools
+
+    def bloated(input_path, output_path, *args):
+        with open(input_path, 'rb') as source, open(output_path, 'wb') as f:
+            f.write(source.read() + b'%' * 10000)
+        return {'images_downsampled': 0}
+
+    monkeypatch.setattr(pdf_tools, 'optimize_pdf', bloated)
+    source, output = make_pdf('text.pdf', ['text']), str(tmp_path / 'out.pdf')
+
+    assert optimize_pdf_output(source, output, 'low')
+
+    with open(source, 'rb') as a, open(output, 'rb') as b:
+        assert a.read() == b.read()
+    assert not os.path.exists(output + '.opt')
+
+
+@pytest.mark.parametrize('optimizer_fails', [False, True])
+def test_optimize_output_encrypts(make_pdf, tmp_path, monkeypatch, optimizer_fails):
+    import pdf_tools
+
+    if optimizer_fails:
+        def broken(*args):
+            raise RuntimeError('unreadable')
+        monkeypatch.setattr(pdf_tools, 'optimize_pdf', broken)
+    source, output = make_pdf('text.pdf', ['secret page']), str(tmp_path / 'out.pdf')
+
+    assert optimize_pdf_output(source, output, 'medium', password='pw')
+
+    assert PdfReader(output).is_encrypted
+    assert page_texts(output, password='pw') == ['secret page']
+
+
+@pytest.mark.parametrize('name', ['report.doc', 'sheet.xlsx'])
+def test_libreoffice_timeout_is_not_retried_in_process(tmp_path, monkeypatch, name):
+    import converter
+
+    def timed_out(*args, **kwargs):
+        raise subprocess.TimeoutExpired('soffice', 1)
+
+    def fallback(*args, **kwargs):
+        raise AssertionError('fallback has no limits')
+
+    monkeypatch.setattr(converter, 'run_libreoffice', timed_out)
+    monkeypatch.setattr(converter, 'convert_word_fallback', fallback)
+    monkeypatch.setattr(converter, 'convert_excel_fallback', fallback)
+    source = tmp_path / name
+    source.write_bytes(b'stub')
+    stats = {}
+
+    assert not convert_to_pdf(str(source), str(tmp_path / 'out.pdf'), name, stats=stats)
+    assert stats['failure'] == 'timeout'
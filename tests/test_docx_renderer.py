@@ -0,0 +1,114 @@
+import zipfile
+
+import pytest
+from PyPDF2 import PdfReader
+
+from conftest import page_texts
+from docx_renderer import render_docx, unsupported_feature
+
+
+@pytest.fixture
+def make_docx(tmp_path):
+    """Save a python-docx Document built by `build`; body_xml is spliced into the body as raw markup"""
+    from docx import Document
+
+    def make(build, body_xml=None, name='doc.docx'):
+        document = Document()
+        build(document)
+        path = str(tmp_path / name)
+        document.save(path)
+        if body_xml:
+            with zipfile.ZipFile(path) as package:
+                parts = {item: package.read(item) for item in package.namelist()}
+            parts['word/document.xml'] = parts['word/document.xml'].replace(b'<w:sectPr', body_xml + b'<w:sectPr', 1)
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+                for item, data in parts.items():
+                    package.writestr(item, data)
+        return path
+
+    return make
+
+
+def report(logo):
+    def build(document):
+        document.add_heading('Quarterly Report', level=1)
+        document.add_paragraph('Sales grew in every region.')
+        for item in ('First point', 'Second point'):
+            document.add_paragraph(item, style='List Bullet')
+        table = document.add_table(rows=2, cols=2)
+        for row, values in zip(table.rows, (('Region', 'Total'), ('North', '42'))):
+            for cell, value in zip(row.cells, values):
+                cell.text = value
+        document.add_picture(logo)
+        document.add_paragraph('Image caption')
+    return build
+
+
+def test_simple_document_is_rendered(make_docx, logo, tmp_path):
+    source, output = make_docx(report(logo)), str(tmp_path / 'out.pdf')
+    stats = {}
+
+    assert unsupported_feature(source) is None
+    assert render_docx(source, output, stats=stats)
+
+    text = page_texts(output)[0]
+    for expected in ('Quarterly Report', 'Sales grew', 'First point', 'Second point', 'Region', 'North', '42',
+                     'Image caption'):
+        assert expected in text
+    assert stats['word_count'] == 17
+    resources = PdfReader(output).pages[0]['/Resources']
+    assert any(item.get_object()['/Subtype'] == '/Image' for item in resources['/XObject'].values())
+
+
+def merged_cells(document):
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).merge(table.cell(0, 1))
+
+
+def non_latin(document):
+    document.add_paragraph('Отчёт за квартал')
+
+
+def plain(document):
+    document.add_paragraph('Body text')
+
+
+@pytest.mark.parametrize('build, body_xml, reason', [
+    (merged_cells, None, 'merged cells'),
+    (non_latin, None, 'non-Latin text'),
+    (plain, b'<w:p><w:ins w:id="1" w:author="A" w:date="2024-01-01T00:00:00Z"><w:r><w:t>new</w:t></w:r>'
+            b'</w:ins></w:p>', 'tracked changes'),
+    (plain, b'<w:p><w:r><w:pict><v:shape><v:textbox><w:txbxContent><w:p><w:r><w:t>boxed</w:t></w:r></w:p>'
+            b'</w:txbxContent></v:textbox></v:shape></w:pict></w:r></w:p>', 'text box'),
+])
+def test_unsupported_features_go_to_libreoffice(make_docx, build, body_xml, reason):
+    assert unsupported_feature(make_docx(build, body_xml)) == reason
+
+
+def test_page_field_in_footer_is_numbered_per_page(make_docx, tmp_path):
+    from docx.enum.text import WD_BREAK
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+
+    def build(document):
+        document.add_paragraph('First page')
+        document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        document.add_paragraph('Second page')
+        footer = document.sections[0].footer.paragraphs[0]
+        footer.add_run('Page ')
+        for xml in (f'<w:r {nsdecls("w")}><w:fldChar w:fldCharType="begin"/></w:r>',
+                    f'<w:r {nsdecls("w")}><w:instrText xml:space="preserve"> PAGE </w:instrText></w:r>',
+                    f'<w:r {nsdecls("w")}><w:fldChar w:fldCharType="separate"/></w:r>',
+                    f'<w:r {nsdecls("w")}><w:t>9</w:t></w:r>',
+                    f'<w:r {nsdecls("w")}><w:fldChar w:fldCharType="end"/></w:r>'):
+            footer._p.append(parse_xml(xml))
+
+    source, output = make_docx(build), str(tmp_path / 'out.pdf')
+
+    assert unsupported_feature(source) is None
+    assert render_docx(source, output)
+
+    texts = page_texts(output)
+    assert len(texts) == 2
+    assert 'Page 1' in texts[0] and 'Page 2' in texts[1]
+    assert 'Page 9' not in ''.join(texts)
@@ -0,0 +1,96 @@
+import json
+import os
+import time
+
+import pytest
+
+from hotfolder import STATE_NAME, HotFolder
+
+
+@pytest.fixture
+def folders(tmp_path):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    return inbox, tmp_path / 'out'
+
+
+def serve_until(hotfolder, condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'hot folder did not finish in time'
+        hotfolder.run_once()
+
+
+def idle(hotfolder):
+    return not hotfolder.candidates and not hotfolder.dispatcher.busy()
+
+
+@pytest.mark.parametrize('polling', [True, False])
+def test_dropped_files_are_published_once_settled(folders, polling):
+    inbox, output = folders
+    hotfolder = HotFolder([str(inbox)], str(output), 1, {}, settle=0.2, poll_interval=0.05, polling=polling)
+    try:
+        hotfolder.run_once()
+        (inbox / 'notes.txt').write_text('hello\n')
+        (inbox / 'upload.txt.part').write_text('still copying')
+        (inbox / 'broken.png').write_bytes(b'not an image')
+
+        serve_until(hotfolder, lambda: len(hotfolder.manifest.entries) == 2)
+    finally:
+        hotfolder.close()
+
+    assert os.path.getsize(output / 'done' / 'inbox' / 'notes.pdf') > 0
+    assert (output / 'failed' / 'inbox' / 'broken.png').read_bytes() == b'not an image'
+    report = json.loads((output / 'failed' / 'inbox' / 'broken.png.error.json').read_text())
+    assert report['status'] == 'failed'
+    assert not any(name.startswith('.') for name in os.listdir(output / 'done' / 'inbox'))
+
+
+def test_file_being_written_waits_until_it_settles(folders):
+    inbox, output = folders
+    hotfolder = HotFolder([str(inbox)], str(output), 1, {}, settle=0.5, poll_interval=0.05, polling=True)
+    try:
+        with open(inbox / 'growing.txt', 'w') as f:
+            for _ in range(6):
+                f.write('line\n')
+                f.flush()
+                os.utime(f.name)
+                hotfolder.run_once()
+                time.sleep(0.1)
+                assert not hotfolder.queued
+        serve_until(hotfolder, lambda: hotfolder.manifest.entries)
+    finally:
+        hotfolder.close()
+
+    assert hotfolder.manifest.entries['inbox/growing.txt']['size'] == 30
+
+
+def test_restart_does_not_reprocess(folders):
+    inbox, output = folders
+    (inbox / 'a.txt').write_text('a\n')
+    (inbox / 'gone.txt').write_text('gone\n')
+    first = HotFolder([str(inbox)], str(output), 1, {}, settle=0.1, poll_interval=0.05, polling=True)
+    try:
+        serve_until(first, lambda: len(first.manifest.entries) == 2)
+    finally:
+        first.close()
+    os.remove(inbox / 'gone.txt')
+
+    second = HotFolder([str(inbox)], str(output), 1, {}, settle=0.1, poll_interval=0.05, polling=True)
+    try:
+        second.run_once()
+        time.sleep(0.2)
+        second.run_once()
+        assert idle(second) and not second.queued
+    finally:
+        second.close()
+    with open(output / STATE_NAME) as f:
+        assert [json.loads(line)['path'] for line in f] == ['inbox/a.txt']
+
+
+def test_input_folders_need_distinct_names(tmp_path):
+    for parent in ('x', 'y'):
+        (tmp_path / parent / 'inbox').mkdir(parents=True)
+
+    with pytest.raises(ValueError):
+        HotFolder([str(tmp_path / 'x' / 'inbox'), str(tmp_path / 'y' / 'inbox')], str(tmp_path / 'out'), 1, {})
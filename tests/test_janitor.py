@@ -0,0 +1,124 @@
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import janitor
+from janitor import RESERVATIONS_DIR, FolderIndex, in_use, reserve, start_janitor, touch
+
+
+def make_file(folder, name, age, size=100):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def sweep(index):
+    deleted = []
+    index.refresh()
+    index.sweep(time.time(), lambda path, reason: deleted.append((os.path.basename(path), reason)))
+    return deleted
+
+
+def test_files_past_max_age_expire(tmp_path):
+    make_file(tmp_path, 'old.pdf', age=7200)
+    make_file(tmp_path, 'new.pdf', age=60)
+    make_file(tmp_path, '.hidden', age=7200)
+
+    assert sweep(FolderIndex(str(tmp_path), 3600, None)) == [('old.pdf', 'expired')]
+    assert sorted(os.listdir(tmp_path)) == ['.hidden', 'new.pdf']
+
+
+def test_least_recently_used_go_first_over_quota(tmp_path):
+    for name, age in (('a', 300), ('b', 200), ('c', 100), ('d', 10)):
+        make_file(tmp_path, name, age)
+    index = FolderIndex(str(tmp_path), None, 250)
+    index.refresh()
+    # Downloaded after it was indexed: the sweep sees the new access time
+    touch(os.path.join(tmp_path, 'a'))
+
+    assert sweep(index) == [('b', 'quota'), ('c', 'quota')]
+    assert sorted(os.listdir(tmp_path)) == ['a', 'd']
+    assert index.total_bytes == 200
+
+
+def test_hardlinked_names_count_once(tmp_path):
+    make_file(tmp_path, 'a', age=300)
+    os.link(tmp_path / 'a', tmp_path / 'b')
+    make_file(tmp_path, 'c', age=100)
+    index = FolderIndex(str(tmp_path), None, 250)
+
+    assert sweep(index) == []
+    assert index.total_bytes == 200
+
+    # Space only comes back once every name of the shared file is gone
+    index.max_bytes = 150
+    assert sorted(sweep(index)) == [('a', 'quota'), ('b', 'quota')]
+    assert index.total_bytes == 100
+
+
+def test_file_in_use_is_retried_on_next_sweep(tmp_path):
+    path = make_file(tmp_path, 'busy.pdf', age=7200)
+    index = FolderIndex(str(tmp_path), 3600, None)
+
+    with in_use(path):
+        assert sweep(index) == []
+    assert os.path.exists(path)
+
+    assert sweep(index) == [('busy.pdf', 'expired')]
+
+
+def test_reserved_prefix_is_skipped(tmp_path):
+    make_file(tmp_path, 'job_converted.pdf', age=7200)
+    make_file(tmp_path, 'other.pdf', age=7200)
+    # Left behind by a process that died mid-job
+    os.makedirs(tmp_path / RESERVATIONS_DIR)
+    (tmp_path / RESERVATIONS_DIR / 'dead~other').touch()
+    index = FolderIndex(str(tmp_path), 3600, None)
+
+    with reserve(os.path.join(tmp_path, 'job')):
+        assert sweep(index) == [('other.pdf', 'expired')]
+    assert os.listdir(tmp_path / RESERVATIONS_DIR) == []
+
+    assert sweep(index) == [('job_converted.pdf', 'expired')]
+
+
+class FakeStorage:
+    def __init__(self, batches_dir):
+        self.batches_dir = batches_dir
+        self.expired = []
+
+    def mark_expired(self, file_id):
+        self.expired.append(file_id)
+
+    def prune_history(self, max_age_days):
+        pass
+
+
+def test_only_converted_files_expire_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(janitor.Janitor, 'start', lambda self: None)
+    config = {}
+    for key, name in (('UPLOAD_FOLDER', 'uploads'), ('CONVERTED_FOLDER', 'converted'), ('TEMP_FOLDER', 'temp')):
+        config[key] = str(tmp_path / name)
+        os.makedirs(config[key])
+    storage = FakeStorage(str(tmp_path / 'batches'))
+    os.makedirs(storage.batches_dir)
+    upload_id, converted_id = str(uuid.uuid4()), str(uuid.uuid4())
+    make_file(config['UPLOAD_FOLDER'], f'{upload_id}_report.docx', age=200 * 3600)
+    make_file(config['CONVERTED_FOLDER'], f'{converted_id}_converted.pdf', age=200 * 3600)
+
+    assert start_janitor(SimpleNamespace(config=config), storage).run_once() == 2
+    assert storage.expired == [converted_id]
+
+
+def test_reservation_is_released_on_error(tmp_path):
+    with pytest.raises(RuntimeError), reserve(os.path.join(tmp_path, 'job')):
+        assert janitor._held_reservations(str(tmp_path)) == ['job']
+        raise RuntimeError
+
+    assert janitor._held_reservations(str(tmp_path)) == []
@@ -0,0 +1,153 @@
+import os
+
+import pytest
+from PyPDF2 import PdfReader
+
+from conftest import page_texts
+from pdf_tools import StreamingPdfWriter, optimize_pdf
+
+
+def test_merge_keeps_pages_in_order(make_pdf, tmp_path):
+    first = make_pdf('first.pdf', ['a1', 'a2'])
+    second = make_pdf('second.pdf', ['b1'])
+    output = str(tmp_path / 'merged.pdf')
+
+    writer = StreamingPdfWriter(output)
+    for path in (first, second):
+        writer.add_reader(PdfReader(path))
+    writer.close()
+
+    assert page_texts(output) == ['a1', 'a2', 'b1']
+    assert writer.get_stats()['pages'] == 3
+
+
+def test_merge_writes_shared_images_once(make_pdf, logo, tmp_path):
+    inputs = [make_pdf(f'in{i}.pdf', [f'page {i}'], logo_path=logo) for i in range(3)]
+    outputs, stats = {}, {}
+    for deduplicate in (True, False):
+        outputs[deduplicate] = str(tmp_path / f'merged-{deduplicate}.pdf')
+        writer = StreamingPdfWriter(outputs[deduplicate], deduplicate=deduplicate)
+        for path in inputs:
+            writer.add_reader(PdfReader(path))
+        writer.close()
+        stats[deduplicate] = writer.get_stats()
+
+    assert page_texts(outputs[True]) == ['page 0', 'page 1', 'page 2']
+    # The image of the second and third input collapses onto the first's
+    assert stats[True]['objects_deduplicated'] >= 2
+    assert stats[True]['bytes_saved'] > 0
+    assert stats[False]['objects_deduplicated'] == 0
+    assert os.path.getsize(outputs[True]) < os.path.getsize(outputs[False])
+
+
+def test_encrypted_output_round_trips(make_pdf, logo, tmp_path):
+    inputs = [make_pdf(f'in{i}.pdf', [f'secret {i}'], logo_path=logo) for i in range(2)]
+    output = str(tmp_path / 'locked.pdf')
+
+    writer = StreamingPdfWriter(output, password='hunter2')
+    for path in inputs:
+        writer.add_reader(PdfReader(path))
+    writer.close()
+
+    reader = PdfReader(output)
+    assert reader.is_encrypted
+    assert reader.decrypt('wrong') == 0
+    assert PdfReader(output).decrypt('hunter2') != 0
+    assert page_texts(output, password='hunter2') == ['secret 0', 'secret 1']
+
+
+def test_page_selection_reads_only_requested_pages(make_pdf, tmp_path):
+    source = make_pdf('five.pdf', [f'p{i}' for i in range(1, 6)])
+    output = str(tmp_path / 'some.pdf')
+
+    writer = StreamingPdfWriter(output)
+    added = writer.add_reader(PdfReader(source), [1, 3, 4])
+    writer.close()
+
+    assert added == 3
+    assert page_texts(output) == ['p2', 'p4', 'p5']
+
+
+def test_abort_removes_the_partial_document(make_pdf, tmp_path):
+    output = str(tmp_path / 'aborted.pdf')
+    writer = StreamingPdfWriter(output)
+    writer.add_reader(PdfReader(make_pdf('in.pdf', ['x'])))
+    writer.abort()
+
+    assert not os.path.exists(output)
+
+
+@pytest.fixture
+def photo(tmp_path):
+    from PIL import Image
+
+    path = str(tmp_path / 'photo.png')
+    Image.effect_noise((1200, 1200), 80).convert('RGB').save(path)
+    return path
+
+
+def test_optimize_downsamples_large_images(tmp_path, photo):
+    from reportlab.pdfgen import canvas
+
+    source, output = str(tmp_path / 'photo.pdf'), str(tmp_path / 'small.pdf')
+    pdf = canvas.Canvas(source)
+    pdf.drawImage(photo, 72, 200, width=300, height=300)
+    pdf.showPage()
+    pdf.save()
+
+    result = optimize_pdf(source, output, image_dpi=96, jpeg_quality=60)
+
+    assert result['images_downsampled'] == 1
+    image = next(iter(PdfReader(output).pages[0]['/Resources']['/XObject'].values())).get_object()
+    assert image['/Width'] < 1200 and image['/Filter'] == '/DCTDecode'
+    assert os.path.getsize(output) < os.path.getsize(source)
+
+
+def test_optimize_keeps_outline_form_and_info(tmp_path):
+    from reportlab.pdfgen import canvas
+
+    source, output = str(tmp_path / 'doc.pdf'), str(tmp_path / 'opt.pdf')
+    pdf = canvas.Canvas(source)
+    pdf.setTitle('Handbook')
+    for index in range(2):
+        pdf.drawString(72, 720, f'chapter {index}')
+        pdf.bookmarkPage(f'c{index}')
+        pdf.addOutlineEntry(f'Chapter {index}', f'c{index}')
+        if index == 1:
+            pdf.acroForm.textfield(name='signature', x=72, y=600)
+        pdf.showPage()
+    pdf.save()
+
+    optimize_pdf(source, output, image_dpi=96)
+
+    reader = PdfReader(output)
+    assert [(item.title, reader.get_destination_page_number(item)) for item in reader.outline] == \
+        [('Chapter 0', 0), ('Chapter 1', 1)]
+    assert list(reader.get_fields()) == ['signature']
+    assert reader.metadata.title == 'Handbook'
+
+
+def test_optimize_compresses_only_unfiltered_content(make_pdf, tmp_path):
+    from PyPDF2 import PdfWriter
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, NameObject
+
+    def two_stream_pdf(name, compressed):
+        """A page whose /Contents is an array of two streams"""
+        writer = PdfWriter()
+        page = writer.add_page(PdfReader(make_pdf(f'{name}-source.pdf', ['text'])).pages[0])
+        data = page.get_contents().get_data()
+        streams = []
+        for _ in range(2):
+            stream = DecodedStreamObject()
+            stream.set_data(data)
+            streams.append(writer._add_object(stream.flate_encode() if compressed else stream))
+        page[NameObject('/Contents')] = ArrayObject(streams)
+        path = str(tmp_path / f'{name}.pdf')
+        with open(path, 'wb') as f:
+            writer.write(f)
+        return path
+
+    assert optimize_pdf(two_stream_pdf('packed', True), str(tmp_path / 'a.pdf'))['streams_compressed'] == 0
+    result = optimize_pdf(two_stream_pdf('raw', False), str(tmp_path / 'b.pdf'))
+    assert result['streams_compressed'] == 1
+    assert page_texts(str(tmp_path / 'b.pdf')) == ['text\ntext']
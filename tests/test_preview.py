@@ -0,0 +1,82 @@
+import hashlib
+import os
+import shutil
+import time
+
+import pytest
+from PyPDF2 import PdfReader
+
+from conftest import page_texts
+from preview import PreviewCache, PreviewUnavailable, render_preview
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    def make(name, lines):
+        path = tmp_path / name
+        path.write_text(''.join(f'{line}\n' for line in lines))
+        return str(path)
+
+    return make
+
+
+def test_cache_miss_then_hit_keyed_by_content(tmp_path, text_file):
+    cache = PreviewCache(str(tmp_path / 'previews'), max_bytes=10 * 1024 * 1024)
+    source = text_file('notes.txt', ['hello'])
+
+    assert cache.lookup(source, '.txt') is None
+    path, mimetype = cache.render(source, '.txt')
+
+    assert mimetype == 'application/pdf'
+    # The same content under another name is served from the cache
+    copy = str(tmp_path / 'copy.txt')
+    shutil.copyfile(source, copy)
+    assert cache.lookup(copy, '.TXT') == (path, mimetype)
+    # The routes use the key as the ETag: content hash, preview version and extension
+    with open(source, 'rb') as f:
+        assert os.path.basename(path).split('.')[0] == f"{hashlib.sha256(f.read()).hexdigest()}-v1-txt"
+    assert cache.lookup(source, '.md') is None
+
+
+def test_trim_removes_least_recently_served_first(tmp_path, text_file):
+    cache = PreviewCache(str(tmp_path / 'previews'), max_bytes=10 * 1024 * 1024)
+    paths = {}
+    for age, name in ((300, 'a'), (200, 'b'), (100, 'c')):
+        source = text_file(f'{name}.txt', [name])
+        paths[name] = (source, cache.render(source, '.txt')[0])
+        os.utime(paths[name][1], (time.time() - age, time.time() - age))
+    # Served again, so now the most recently used
+    cache.lookup(paths['a'][0], '.txt')
+
+    cache.max_bytes = os.path.getsize(paths['a'][1])
+    cache.trim()
+
+    assert [name for name, (_, path) in paths.items() if os.path.exists(path)] == ['a']
+
+
+@pytest.mark.parametrize('extension', ['.txt', '.csv', '.pdf'])
+def test_preview_is_one_page(tmp_path, text_file, make_pdf, extension):
+    if extension == '.pdf':
+        source = make_pdf('long.pdf', ['first', 'second', 'third'])
+    elif extension == '.csv':
+        source = text_file('long.csv', ['id,name'] + [f'{i},row {i}' for i in range(1000)])
+    else:
+        source = text_file('long.txt', [f'line {i}' for i in range(1000)])
+    output = str(tmp_path / 'preview.pdf')
+
+    assert render_preview(source, extension, output) == 'application/pdf'
+
+    assert len(PdfReader(output).pages) == 1
+    assert page_texts(output)[0].startswith({'.pdf': 'first', '.csv': 'id', '.txt': 'line 0'}[extension])
+    assert not any(name.startswith('.preview-') for name in os.listdir(tmp_path))
+
+
+def test_unsupported_extension_has_no_preview(tmp_path):
+    source = tmp_path / 'archive.zip'
+    source.write_bytes(b'PK')
+    cache = PreviewCache(str(tmp_path / 'previews'), max_bytes=1024)
+
+    with pytest.raises(PreviewUnavailable):
+        render_preview(str(source), '.zip', str(tmp_path / 'preview.pdf'))
+    with pytest.raises(PreviewUnavailable):
+        cache.lookup(str(source), '.zip')
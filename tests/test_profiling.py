@@ -0,0 +1,78 @@
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+import pytest
+
+from profiling import Profiler
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return Profiler(str(tmp_path / '.profiles'), sample_interval=0.001)
+
+
+def busy_conversion():
+    deadline = time.perf_counter() + 0.05
+    data = []
+    while time.perf_counter() < deadline:
+        data.append(bytearray(1024))
+    return data
+
+
+def test_no_session_means_no_profiling(profiler):
+    assert isinstance(profiler.profile('id-1', 'txt', 'document-to-pdf'), nullcontext)
+
+
+def test_session_profiles_next_matching_conversions(profiler):
+    session = profiler.start(count=2, extension='TXT')
+    for label, extension in (('a', 'png'), ('b', 'txt'), ('c', 'txt'), ('d', 'txt')):
+        with profiler.profile(label, extension, 'document-to-pdf'):
+            busy_conversion()
+
+    assert profiler.current() is None
+    [listed] = profiler.sessions()
+    assert listed['id'] == session['id']
+    assert [profile['name'] for profile in listed['profiles']] == ['b', 'c']
+
+    stats = pstats.Stats(profiler.profile_path(session['id'], 'b.pstats'))
+    assert any(function[2] == 'busy_conversion' for function in stats.stats)
+    with open(profiler.profile_path(session['id'], 'b.collapsed')) as f:
+        stack, count = f.readline().rsplit(' ', 1)
+    assert 'busy_conversion' in stack and int(count) > 0
+
+
+def test_memory_session_saves_allocation_snapshot(profiler):
+    session = profiler.start(count=1, memory=True)
+    with profiler.profile('m', 'pdf', 'document-to-pdf'):
+        kept = busy_conversion()
+
+    assert not tracemalloc.is_tracing()
+    snapshot = tracemalloc.Snapshot.load(profiler.profile_path(session['id'], 'm.tracemalloc'))
+    assert sum(stat.size for stat in snapshot.statistics('filename')) >= len(kept) * 1024
+    with open(profiler.profile_path(session['id'], 'm.alloc.collapsed')) as f:
+        assert 'test_profiling.py' in f.read()
+
+
+def test_expired_or_stopped_session_is_disarmed(profiler):
+    profiler.start(count=5, duration=0.01)
+    time.sleep(0.02)
+    with profiler.profile('late', 'txt', 'document-to-pdf'):
+        pass
+
+    assert not os.path.exists(profiler.session_path)
+    profiler.start(count=5, conversion_type='image-converter')
+    assert profiler.stop()['conversion_type'] == 'image-converter'
+    assert isinstance(profiler.profile('x', 'png', 'image-converter'), nullcontext)
+
+
+def test_only_profile_files_can_be_downloaded(profiler):
+    session = profiler.start()
+    for session_id, name in ((session['id'], '../session.json'), ('..', 'a.pstats'),
+                             (session['id'], 'a.txt')):
+        with pytest.raises(ValueError):
+            profiler.profile_path(session_id, name)
+    with pytest.raises(ValueError):
+        profiler.start(count=0)
@@ -0,0 +1,60 @@
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from sandbox import ResourceLimitExceeded, run_sandboxed
+
+pytestmark = pytest.mark.skipif(shutil.which('prlimit') is None, reason='needs prlimit')
+
+NO_LIMITS = {'memory_mb': 0, 'cpu_seconds': 0, 'open_files': 0, 'output_mb': 0}
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+def gone(pid, timeout=5):
+    """True once pid has exited (a zombie waiting for init counts as exited)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                if f.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                    return True
+        except FileNotFoundError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_cpu_hog_is_stopped_by_cpu_limit():
+    with pytest.raises(ResourceLimitExceeded) as error:
+        run_sandboxed(python('while True: pass'), timeout=30, limits=dict(NO_LIMITS, cpu_seconds=1))
+
+    assert error.value.limit == 'cpu'
+
+
+def test_memory_hog_is_stopped_by_memory_limit():
+    with pytest.raises(ResourceLimitExceeded) as error:
+        run_sandboxed(python('x = bytearray(1024 ** 3)'), timeout=30, limits=dict(NO_LIMITS, memory_mb=256))
+
+    assert error.value.limit == 'memory'
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    pid_file = tmp_path / 'child.pid'
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_sandboxed(['sh', '-c', f'sleep 60 & echo $! > {pid_file}; wait'], timeout=1, limits=NO_LIMITS)
+
+    assert gone(int(pid_file.read_text()))
+
+
+def test_helpers_left_behind_are_killed(tmp_path):
+    result = run_sandboxed(['sh', '-c', 'sleep 60 & echo $!'], timeout=10, limits=NO_LIMITS)
+
+    assert result.returncode == 0
+    assert gone(int(result.stdout))
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import CostModel, Lane, LaneFull, LaneTimeout, Scheduler, current_slot
+
+
+def test_lane_runs_at_most_slots_jobs(tmp_path):
+    lane = Lane('test', str(tmp_path), slots=2, poll_interval=0.005)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def job():
+        with lane.acquire(cost=1.0, timeout=5):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=job) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+
+
+def test_cheapest_waiting_job_goes_first(tmp_path):
+    lane = Lane('test', str(tmp_path), slots=1, aging=0, poll_interval=0.005)
+    order = []
+
+    def job(cost):
+        with lane.acquire(cost=cost, timeout=5):
+            order.append(cost)
+
+    with lane.acquire(cost=0, timeout=1):
+        threads = [threading.Thread(target=job, args=(cost,)) for cost in (30.0, 10.0, 20.0)]
+        for thread in threads:
+            thread.start()
+        while lane.waiting() < 3:
+            time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+
+    assert order == [10.0, 20.0, 30.0]
+
+
+def test_wait_timeout_and_full_queue(tmp_path):
+    lane = Lane('test', str(tmp_path), slots=1, poll_interval=0.005, max_waiting=1)
+
+    with lane.acquire(cost=1.0):
+        with pytest.raises(LaneTimeout):
+            with lane.acquire(cost=1.0, timeout=0.05):
+                pass
+        waiter = threading.Thread(target=lambda: pytest.raises(LaneTimeout, _hold, lane, 0.5))
+        waiter.start()
+        while lane.waiting() < 1:
+            time.sleep(0.005)
+        with pytest.raises(LaneFull):
+            _hold(lane, 0.05)
+        waiter.join()
+
+
+def _hold(lane, timeout):
+    with lane.acquire(cost=1.0, timeout=timeout):
+        pass
+
+
+def test_current_slot_is_held_slot_file(tmp_path):
+    lane = Lane('test', str(tmp_path), slots=2)
+
+    assert current_slot() is None
+    with lane.acquire(cost=1.0):
+        slot = current_slot()
+        assert slot.endswith('slot-0')
+        with lane.acquire(cost=1.0):
+            assert current_slot().endswith('slot-1')
+        assert current_slot() == slot
+    assert current_slot() is None
+
+
+def test_libreoffice_formats_use_heavy_lane(tmp_path):
+    scheduler = Scheduler(str(tmp_path), light_slots=2, heavy_slots=1, heavy_threshold=2.0)
+
+    assert scheduler.classify('docx', 10_000)[0] == 'heavy'
+    assert scheduler.classify('txt', 10_000)[0] == 'light'
+    assert scheduler.classify('docx-native', 10_000)[0] == 'light'
+
+
+def test_cost_model_learns_from_observations(tmp_path):
+    scheduler = Scheduler(str(tmp_path), light_slots=2, heavy_slots=1, heavy_threshold=2.0)
+    for _ in range(5):
+        scheduler.cost_model.observe('png', 1024 * 1024, 5.0)
+
+    assert scheduler.classify('png', 1024 * 1024) == ('heavy', pytest.approx(5.0))
+
+
+class FakeHistory:
+    def __init__(self, records):
+        self.records = records
+
+    def get_recent_conversions(self, limit=10):
+        return self.records[:limit]
+
+
+def _record(seconds):
+    return {'status': 'completed', 'file_extension': 'png', 'file_size': 1024 * 1024,
+            'trace': {'spans': [{'depth': 0, 'name': 'convert', 'duration_ms': seconds * 1000}]}}
+
+
+def test_cost_model_counts_each_history_record_once():
+    history = FakeHistory([_record(1.0)] * 5)
+    model = CostModel(history, refresh_interval=0)
+    for _ in range(3):
+        assert model.estimate('png', 1024 * 1024) == pytest.approx(1.0)
+
+    assert len(model.samples['png']) == 5
+    history.records = [_record(3.0)] * 5 + history.records
+    assert model.estimate('png', 1024 * 1024) == pytest.approx(2.0)
+    assert len(model.samples['png']) == 10
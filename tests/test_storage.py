@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+from storage import LocalStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return LocalStorage()
+
+
+def add(storage, index, **fields):
+    record = {'file_id': f'id-{index}', 'created_at': f'2026-01-{index:02d}T12:00:00', 'status': 'completed',
+              'file_extension': 'pdf', 'conversion_type': 'document-to-pdf', 'file_size': index * 100}
+    record.update(fields)
+    storage.add_conversion(record)
+
+
+def test_pages_follow_the_cursor_newest_first(storage):
+    for index in range(1, 8):
+        add(storage, index)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = storage.query_conversions(limit=3, cursor=cursor)
+        seen.extend(record['file_id'] for record in page)
+        if cursor is None:
+            break
+
+    assert seen == [f'id-{index}' for index in range(7, 0, -1)]
+
+
+def test_filters_combine(storage):
+    add(storage, 1, status='failed')
+    add(storage, 2, file_extension='docx')
+    add(storage, 3, file_extension='docx', status='failed')
+    add(storage, 4, file_extension='docx', conversion_type='image-converter')
+    add(storage, 5)
+
+    def ids(**filters):
+        return [record['file_id'] for record in storage.query_conversions(**filters)[0]]
+
+    assert ids(status='failed') == ['id-3', 'id-1']
+    assert ids(extension='DOCX', conversion_type='document-to-pdf') == ['id-3', 'id-2']
+    assert ids(since='2026-01-02', until='2026-01-04') == ['id-4', 'id-3', 'id-2']
+    assert ids(min_size=200, max_size=300) == ['id-3', 'id-2']
+
+
+def test_history_is_not_capped(storage):
+    for index in range(1, 31):
+        add(storage, 1, file_id=f'id-{index}')
+    for index in range(31, 151):
+        add(storage, 2, file_id=f'id-{index}')
+
+    assert storage.get_stats()['total_conversions'] == 150
+    assert len(storage.query_conversions(limit=100, since='2026-01-01', until='2026-01-01')[0]) == 30
+
+
+def test_expire_and_delete_by_file_id(storage):
+    add(storage, 1)
+    add(storage, 2)
+
+    storage.mark_expired('id-1')
+    deleted = storage.delete_conversion('id-1')
+
+    assert [record['files_expired'] for record in deleted] == [True]
+    assert [record['file_id'] for record in storage.get_recent_conversions()] == ['id-2']
+
+
+def test_bad_cursor_is_rejected(storage):
+    with pytest.raises(ValueError):
+        storage.query_conversions(cursor='not-a-cursor')
+
+
+def test_records_of_conversions_json_are_imported_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    with open(os.path.join('data', 'conversions.json'), 'w') as f:
+        json.dump([{'file_id': 'old', 'created_at': '2025-01-01T00:00:00', 'status': 'completed'}], f)
+
+    LocalStorage()
+    storage = LocalStorage()
+
+    assert [record['file_id'] for record in storage.get_recent_conversions()] == ['old']
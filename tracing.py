@@ -0,0 +1,127 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Conversions slower than this log their full stage breakdown
+SLOW_THRESHOLD_MS = float(os.environ.get('SLOW_CONVERSION_MS', 5000))
+# When set, every finished trace is also written here in Chrome trace format
+TRACE_EXPORT_DIR = os.environ.get('TRACE_EXPORT_DIR')
+
+logger = logging.getLogger(__name__)
+slow_log = logging.getLogger('slow_requests')
+
+_current = contextvars.ContextVar('fily_trace', default=None)
+
+
+class Trace:
+    """Nested stage timings for one conversion, on the monotonic clock"""
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.spans = []  # [name, depth, start, end] in seconds since self.start
+        self.depth = 0
+        self.start = time.perf_counter()
+        self.end = None
+        self._token = None
+
+    @contextmanager
+    def span(self, name):
+        record = [name, self.depth, time.perf_counter() - self.start, None]
+        self.spans.append(record)
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            record[3] = time.perf_counter() - self.start
+
+    def total_ms(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self):
+        """Finished spans only, so it can be stored while a span is still open"""
+        return {
+            'total_ms': round(self.total_ms(), 3),
+            'spans': [
+                {'name': name, 'depth': depth, 'start_ms': round(start * 1000, 3),
+                 'duration_ms': round((end - start) * 1000, 3)}
+                for name, depth, start, end in self.spans if end is not None
+            ],
+        }
+
+    def breakdown(self):
+        lines = [f"{self.name} {self.total_ms():.1f}ms {self.attributes}"]
+        for name, depth, start, end in self.spans:
+            duration = f"{(end - start) * 1000:.1f}ms" if end is not None else 'unfinished'
+            lines.append(f"{'  ' * (depth + 1)}{name}: {duration}")
+        return '\n'.join(lines)
+
+    def to_chrome_trace(self):
+        """Trace Event Format, viewable in chrome://tracing or Perfetto"""
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [{'name': self.name, 'ph': 'X', 'ts': 0, 'dur': self.total_ms() * 1000,
+                   'pid': pid, 'tid': tid, 'args': self.attributes}]
+        for name, _, start, end in self.spans:
+            if end is not None:
+                events.append({'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                               'pid': pid, 'tid': tid})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def begin_trace(name, **attributes):
+    """Start a trace and make it current for span() calls in this context"""
+    trace = Trace(name, **attributes)
+    trace._token = _current.set(trace)
+    return trace
+
+
+def end_trace(trace):
+    """Stop a trace started with begin_trace, then log or export it"""
+    trace.end = time.perf_counter()
+    if trace._token is not None:
+        _current.reset(trace._token)
+        trace._token = None
+
+    if trace.total_ms() >= SLOW_THRESHOLD_MS:
+        slow_log.warning(f"Slow conversion:\n{trace.breakdown()}")
+
+    if TRACE_EXPORT_DIR:
+        label = trace.attributes.get('file_id') or f"{os.getpid()}-{int(time.time() * 1000)}"
+        try:
+            os.makedirs(TRACE_EXPORT_DIR, exist_ok=True)
+            with open(os.path.join(TRACE_EXPORT_DIR, f"{label}.trace.json"), 'w') as f:
+                json.dump(trace.to_chrome_trace(), f)
+        except OSError as e:
+            logger.warning(f"Could not export trace {label}: {e}")
+
+
+def current_trace():
+    """The trace active in this context, or None"""
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Time a stage of the current trace; does nothing outside a trace"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+def traced(func):
+    """Record every call of func as a span named after it"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
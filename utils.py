@@ -7,6 +7,8 @@ from pathlib import Path
 import logging
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 
 def calculate_file_hash(file_path):
     """Calculate SHA-256 hash of a file"""
@@ -17,7 +19,7 @@ def calculate_file_hash(file_path):
                 hash_sha256.update(chunk)
         return hash_sha256.hexdigest()
     except Exception as e:
-        logging.error(f"Error calculating hash for {file_path}: {e}")
+        logger.error(f"Error calculating hash for {file_path}: {e}")
         return None
 
 
@@ -42,7 +44,7 @@ def get_image_dimensions(file_path):
         with Image.open(file_path) as img:
             return f"{img.width}x{img.height}"
     except Exception as e:
-        logging.error(f"Error getting image dimensions for {file_path}: {e}")
+        logger.error(f"Error getting image dimensions for {file_path}: {e}")
         return None
 
 
@@ -69,7 +71,7 @@ def count_document_pages(file_path):
             return len(prs.slides)
         
     except Exception as e:
-        logging.error(f"Error counting pages for {file_path}: {e}")
+        logger.error(f"Error counting pages for {file_path}: {e}")
     
     return None
 
@@ -93,11 +95,64 @@ def count_words_in_text(file_path):
             return word_count
         
     except Exception as e:
-        logging.error(f"Error counting words for {file_path}: {e}")
+        logger.error(f"Error counting words for {file_path}: {e}")
     
     return None
 
 
+def extract_document_metadata(source_path, output_path=None, password=None, word_count=None):
+    """
+    Collect page count, word count, dimensions and MIME type in one pass.
+    Page count and page size come from the produced PDF when there is one,
+    so no source format has to be re-parsed to estimate them, and the word
+    count is the one the converter tallied while it held the text (None for
+    formats it never reads as text). The result is meant to be stored on
+    the conversion record. password is needed to read the page count of an
+    encrypted output.
+    """
+    metadata = {
+        'mime_type': get_file_mime_type(source_path),
+        'page_count': None,
+        'word_count': word_count,
+        'dimensions': None,
+    }
+    file_extension = Path(source_path).suffix.lower()
+    
+    try:
+        if metadata['mime_type'].startswith('image/'):
+            # Image.open only reads the header, pixels are never decoded
+            with Image.open(source_path) as img:
+                metadata['dimensions'] = f"{img.width}x{img.height}"
+                metadata['page_count'] = getattr(img, 'n_frames', 1)
+    
+    except Exception as e:
+        logger.error(f"Error reading metadata from {source_path}: {e}")
+    
+    pdf_path = output_path if output_path and Path(output_path).suffix.lower() == '.pdf' else None
+    if pdf_path is None and file_extension == '.pdf':
+        pdf_path = source_path
+    
+    if pdf_path and os.path.exists(pdf_path):
+        try:
+            import PyPDF2
+            with open(pdf_path, 'rb') as file:
+                reader = PyPDF2.PdfReader(file)
+                if reader.is_encrypted and password:
+                    reader.decrypt(password)
+                if not reader.is_encrypted or password:
+                    metadata['page_count'] = len(reader.pages)
+                    if metadata['dimensions'] is None and metadata['page_count']:
+                        box = reader.pages[0].mediabox
+                        metadata['dimensions'] = f"{round(float(box.width))}x{round(float(box.height))}pt"
+        except Exception as e:
+            logger.error(f"Error reading PDF metadata from {pdf_path}: {e}")
+    
+    elif output_path and os.path.exists(output_path) and metadata['dimensions'] is None:
+        metadata['dimensions'] = get_image_dimensions(output_path)
+    
+    return metadata
+
+
 def cleanup_old_files(folder_path, max_age_hours=24):
     """Clean up files older than specified hours"""
     try:
@@ -109,10 +164,10 @@ def cleanup_old_files(folder_path, max_age_hours=24):
                 file_age = current_time - datetime.fromtimestamp(file_path.stat().st_mtime)
                 if file_age > max_age:
                     file_path.unlink()
-                    logging.info(f"Cleaned up old file: {file_path}")
+                    logger.info("Cleaned up old file: %s", file_path)
         
     except Exception as e:
-        logging.error(f"Error during cleanup of {folder_path}: {e}")
+        logger.error(f"Error during cleanup of {folder_path}: {e}")
 
 
 def format_file_size(size_bytes):
@@ -164,7 +219,7 @@ def validate_file_security(file_path):
         return True, "File validation passed"
         
     except Exception as e:
-        logging.error(f"Error validating file {file_path}: {e}")
+        logger.error(f"Error validating file {file_path}: {e}")
         return False, "File validation failed"
 
 
@@ -0,0 +1,84 @@
+import logging
+import os
+import time
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+
+def _import_libraries():
+    """The converters import these lazily; load them once, before fork"""
+    import docx  # noqa: F401
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+    import pptx  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import reportlab.lib.pdfencrypt  # noqa: F401
+    import reportlab.pdfgen.canvas  # noqa: F401
+    import reportlab.platypus  # noqa: F401
+    from PIL import Image
+
+    # Registers every Pillow format plugin instead of on the first open()
+    Image.init()
+    import pdf_tools  # noqa: F401
+
+
+def _build_styles():
+    from reportlab.pdfbase import pdfmetrics
+
+    from converter import get_styles, get_table_style
+
+    get_styles()
+    get_table_style()
+    # Standard fonts load their AFM metrics on first use
+    for font in ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique', 'Courier', 'Times-Roman'):
+        pdfmetrics.getFont(font)
+
+
+def _init_libmagic():
+    import magic
+
+    magic.from_buffer(b'%PDF-1.4\n', mime=True)
+
+
+def _render_sample():
+    """Build a small in-memory PDF to run reportlab's first-use setup"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Paragraph, Preformatted, SimpleDocTemplate, Table
+
+    from converter import get_styles, get_table_style
+
+    styles = get_styles()
+    table = Table([['a', 'b'], [1, 2]])
+    table.setStyle(get_table_style())
+    doc = SimpleDocTemplate(BytesIO(), pagesize=letter)
+    doc.build([Paragraph('Warm-up', styles['Heading1']), Paragraph('text', styles['Normal']),
+               Preformatted('code', styles['Code']), table])
+
+
+STEPS = [
+    ('imports', _import_libraries),
+    ('styles', _build_styles),
+    ('libmagic', _init_libmagic),
+    ('render', _render_sample),
+]
+
+
+def warm_up():
+    """
+    Run every warm-up step and return {step: milliseconds}. Under gunicorn
+    --preload this runs in the master, so workers share the result through
+    copy-on-write instead of each paying for it on its first request.
+    """
+    timings = {}
+    start = time.perf_counter()
+    for name, step in STEPS:
+        step_start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        timings[name] = round((time.perf_counter() - step_start) * 1000, 1)
+    timings['total'] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info("Warm-up finished in %sms in process %s: %s", timings['total'], os.getpid(), timings)
+    return timings